@@ -1,6 +1,19 @@
-from .core.flask_service import FlaskWebService
-from .core.fastapi_service import FastAPIWebService
-from .apps.image_processor import ImageProcessor
-from .apps.data_analyzer import DataAnalyzer
+import importlib
 
-__all__ = ['FlaskWebService', 'FastAPIWebService', 'ImageProcessor', 'DataAnalyzer'] 
\ No newline at end of file
+# Exported names and their modules, imported on first access (PEP 562) so
+# importing the package does not load every web framework and app dependency
+_EXPORTS = {
+    'FlaskWebService': '.core.flask_service',
+    'FastAPIWebService': '.core.fastapi_service',
+    'ImageProcessor': '.apps.image_processor',
+    'DataAnalyzer': '.apps.data_analyzer'
+}
+
+__all__ = ['FlaskWebService', 'FastAPIWebService', 'ImageProcessor', 'DataAnalyzer']
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,5 +1,16 @@
-from .image_processor import ImageProcessor
-from .data_analyzer import DataAnalyzer
+import importlib
 
-__all__ = ['ImageProcessor', 'DataAnalyzer'] 
+# Imported on first access (PEP 562): each app pulls in its own heavy dependencies
+_EXPORTS = {
+    'ImageProcessor': '.image_processor',
+    'DataAnalyzer': '.data_analyzer'
+}
 
+__all__ = ['ImageProcessor', 'DataAnalyzer']
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
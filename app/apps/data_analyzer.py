@@ -1,31 +1,45 @@
-import time
-import threading
-from typing import Dict, Any, List
-import base64
-from io import BytesIO
+from typing import Dict, Any, List, Optional
+import hashlib
 import os
 import json
 
-import matplotlib
-matplotlib.use('Agg')  # Set the backend to non-interactive Agg
-import matplotlib.pyplot as plt
 import numpy as np
 
 from app.core.base_app import BaseApp
+from app.core.cancellation import AppCancelledError
+from app.core.datasets import detect_format, iter_chunks
+from app.core.rendering import HISTOGRAM_RENDERERS, render_histogram
+from app.core.result_cache import file_digest
+from app.core.statistics import METRICS, StreamingStatistics, describe
+
+# dtypes inline values can be stored as
+VALUE_DTYPES = {"float32": np.float32, "float64": np.float64}
 
 class DataAnalyzer(BaseApp):
-    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str):
-        super().__init__(app_id, app_dir, config_dir, intermediate_dir, output_dir)
+    # The analysis reads its data from the config files and writes its
+    # results to the runtime directories, so it can run in a worker process
+    process_safe = True
+    progress_attrs = ("progress", "analysis_results")
+    result_attrs = ("current_plot", "preview_version", "data_file")
+    transient_attrs = ("analysis_future", "config_data_analyzer", "raw_data")
+    cache_attrs = ("analysis_results", "current_plot", "data_file")
+    
+    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str, **kwargs):
+        super().__init__(app_id, app_dir, config_dir, intermediate_dir, output_dir, **kwargs)
         self.required_configs = ["data", "analysis"]
         self.config_data_analyzer = None
-        self.analysis_thread = None
+        self.analysis_future = None
         self.raw_data = None
+        # Name of the file the dataset was read from: an input, or the saved inline values
+        self.data_file = None
         self.analysis_results = None
         self.progress = 0
         self.current_plot = None
+        self.preview_version = 0
         
     def validate_configs(self) -> bool:
-        if self.configs is None or self.configs.get("default") is None:
+        # Re-read from disk if a previous run released the config
+        if not self.get_config("default"):
             return False
 
         self.config_data_analyzer = self.configs["default"]
@@ -36,7 +50,13 @@ class DataAnalyzer(BaseApp):
             
         # Validate data configuration
         data_config = self.config_data_analyzer["data"]
-        if "values" not in data_config or not isinstance(data_config["values"], list):
+        if isinstance(data_config.get("file"), str):
+            # A data file uploaded to the input directory, read in chunks
+            if detect_format(data_config["file"], data_config.get("format")) is None:
+                return False
+        elif not isinstance(data_config.get("values"), list):
+            return False
+        if data_config.get("dtype", "float64") not in VALUE_DTYPES:
             return False
             
         # Validate analysis configuration
@@ -44,81 +64,185 @@ class DataAnalyzer(BaseApp):
         if "metrics" not in analysis_config or not isinstance(analysis_config["metrics"], list):
             return False
             
-        valid_metrics = {"mean", "median", "std", "histogram"}
-        if not all(metric in valid_metrics for metric in analysis_config["metrics"]):
+        if not all(metric in METRICS for metric in analysis_config["metrics"]):
+            return False
+            
+        percentiles = analysis_config.get("percentiles", [25, 75])
+        if not isinstance(percentiles, list) or not all(
+            isinstance(p, (int, float)) and not isinstance(p, bool) and 0 <= p <= 100 for p in percentiles
+        ):
+            return False
+            
+        if analysis_config.get("renderer", "figure") not in HISTOGRAM_RENDERERS:
             return False
             
         return True
         
-    def _create_histogram(self, data: np.ndarray) -> str:
-        """Create histogram and return as base64 encoded string"""
+    def _create_histogram(self, counts: np.ndarray, edges: np.ndarray, renderer: str = "figure") -> Optional[str]:
+        """Plot histogram bin counts and return the name of the saved plot file"""
         try:
-            # Create a new figure with specified backend
-            fig = plt.figure(figsize=(10, 6))
-            plt.hist(data, bins=30, edgecolor='black')
-            plt.title('Data Distribution Histogram')
-            plt.xlabel('Value')
-            plt.ylabel('Frequency')
-            
-            # Save plot to memory and file
-            buffer = BytesIO()
-            fig.savefig(buffer, format='png', bbox_inches='tight')
-            plt.close(fig)  # Explicitly close the figure
-            
-            # Save plot to file
-            self.save_output_file("histogram.png", buffer.getvalue())
-            
-            return base64.b64encode(buffer.getvalue()).decode()
+            image = render_histogram(counts, edges, renderer, title='Data Distribution Histogram',
+                                     xlabel='Value', ylabel='Frequency')
+            self.save_output_file("histogram.png", image)
+            
+            return "histogram.png"
         except Exception as e:
             print(f"Error creating histogram: {str(e)}")
             return None
         
+    def _save_values(self, values: List[float], dtype: str = "float64") -> np.ndarray:
+        """Save inline values to raw_data.npy and get them as a read-only memory-mapped array
+        
+        The config holding the values is released, so the dataset is never
+        held as a Python list and an array at the same time.
+        """
+        self.data_file = "raw_data.npy"
+        data_path = os.path.join(self.intermediate_dir, self.data_file)
+        # Replaced rather than rewritten in place: the file may be linked from the result cache
+        temp_path = os.path.join(self.intermediate_dir, ".raw_data.npy.tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, np.asarray(values, dtype=VALUE_DTYPES[dtype]))
+        os.replace(temp_path, data_path)
+        self._record_file(data_path)
+        self.configs.pop("default", None)
+        self.config_data_analyzer = None
+        return np.load(data_path, mmap_mode="r")
+        
+    def _analyze_values(self, data_config: Dict[str, Any], metrics: List[str], percentiles: List[float]):
+        """Compute the metrics of an inline dataset; returns its data info and histogram"""
+        if len(data_config["values"]) == 0:
+            raise ValueError("No values in data.values")
+        with self._stage("load_data"):
+            self.raw_data = self._save_values(data_config["values"], data_config.get("dtype", "float64"))
+        self.progress = 20
+        
+        # All metrics and the histogram bin counts in one fused pass
+        with self._stage("statistics"):
+            results, histogram, stats = describe(self.raw_data, metrics, percentiles, bins=30)
+            self.analysis_results.update(results)
+        self.progress = 80
+        
+        data_info = {
+            "sample_size": stats.count,
+            "data_range": [stats.min, stats.max],
+            "dtype": str(self.raw_data.dtype)
+        }
+        # The report only reads the saved results
+        self.raw_data = None
+        return data_info, histogram
+        
+    def _analyze_file(self, data_config: Dict[str, Any], metrics: List[str], percentiles: List[float]):
+        """Compute the metrics of an uploaded data file in one streaming pass
+        
+        Memory stays bounded by the chunk size and the quantile sample,
+        whatever the size of the file; progress follows the bytes read.
+        Returns the data info and histogram.
+        """
+        data_path = self.resolve_input_file(data_config["file"])
+        if data_path is None:
+            raise ValueError(f"Input file not found: {data_config['file']}")
+        self.data_file = data_config["file"]
+        data_format = detect_format(data_config["file"], data_config.get("format"))
+        total_bytes = os.path.getsize(data_path) or 1
+        
+        statistics = StreamingStatistics(metrics, percentiles, bins=30)
+        with self._stage("ingest"):
+            chunks = iter_chunks(data_path, data_format, data_config.get("chunk_size", 4 * 1024 * 1024),
+                                 data_config.get("column"))
+            for chunk, consumed in chunks:
+                self.check_cancelled()
+                statistics.update(chunk)
+                progress = 80 * consumed // total_bytes
+                if progress != self.progress:
+                    self.progress = progress
+        results, histogram, stats = statistics.result()
+        if stats.count == 0:
+            raise ValueError(f"No values in {data_config['file']}")
+        self.analysis_results.update(results)
+        self.progress = 80
+        
+        data_info = {
+            "sample_size": stats.count,
+            "data_range": [stats.min, stats.max],
+            "bytes": total_bytes
+        }
+        if not statistics.exact:
+            data_info["approximate"] = [metric for metric in ("median", "percentiles") if metric in results]
+        return data_info, histogram
+        
+    def _cache_key(self, data_config: Dict[str, Any], analysis_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Digest of the dataset and the parameters, which determine every result of a run"""
+        data_key = {name: value for name, value in data_config.items() if name not in ("file", "values")}
+        if "file" in data_config:
+            data_path = self.resolve_input_file(data_config["file"])
+            if data_path is None:
+                raise ValueError(f"Input file not found: {data_config['file']}")
+            data_key["sha256"] = file_digest(data_path)
+        else:
+            # The values as stored, so equal datasets match whatever their JSON spelling
+            values = np.asarray(data_config["values"], dtype=VALUE_DTYPES[data_config.get("dtype", "float64")])
+            data_key["sha256"] = hashlib.sha256(values.tobytes()).hexdigest()
+        return {"data": data_key, "analysis": analysis_config}
+        
+    def result_files(self) -> List[str]:
+        """The files of the completed run; outputs of earlier runs may remain"""
+        files = [os.path.join("intermediate", "partial_results.json"), os.path.join("output", "analysis_results.json")]
+        if self.data_file == "raw_data.npy":
+            files.append(os.path.join("intermediate", "raw_data.npy"))
+        if self.current_plot:
+            files.append(os.path.join("output", self.current_plot))
+        return files
+        
     def _analyze_data(self):
         """Analyze data in background thread"""
         try:
-            # Get data and save it
-            self.raw_data = np.array(self.config_data_analyzer["data"]["values"])
-            self.save_intermediate_file("raw_data.json", self.raw_data.tolist())
-            self.progress = 20
+            if not self.validate_configs():
+                raise ValueError("Configuration validation failed")
+                
+            metrics = self.config_data_analyzer["analysis"]["metrics"]
+            percentiles = self.config_data_analyzer["analysis"].get("percentiles", [25, 75])
+            renderer = self.config_data_analyzer["analysis"].get("renderer", "figure")
+            data_config = self.config_data_analyzer["data"]
             
+            if self._restore_cached_result(lambda: self._cache_key(data_config, self.config_data_analyzer["analysis"])):
+                if self.current_plot:
+                    self.preview_version += 1
+                self.progress = 100
+                return
+                
             # Initialize results
             self.analysis_results = {}
-            metrics = self.config_data_analyzer["analysis"]["metrics"]
             
-            # Calculate basic statistics
-            if "mean" in metrics:
-                self.analysis_results["mean"] = float(np.mean(self.raw_data))
-                self.progress = 40
-                
-            if "median" in metrics:
-                self.analysis_results["median"] = float(np.median(self.raw_data))
-                self.progress = 60
-                
-            if "std" in metrics:
-                self.analysis_results["std"] = float(np.std(self.raw_data))
-                self.progress = 80
+            if "file" in data_config:
+                data_info, histogram = self._analyze_file(data_config, metrics, percentiles)
+            else:
+                data_info, histogram = self._analyze_values(data_config, metrics, percentiles)
                 
             # Save intermediate results
             self.save_intermediate_file("partial_results.json", self.analysis_results)
             
             # Generate histogram
-            if "histogram" in metrics:
-                self.current_plot = self._create_histogram(self.raw_data)
-                
+            if histogram is not None:
+                with self._stage("histogram"):
+                    self.current_plot = self._create_histogram(*histogram, renderer)
+                    self.preview_version += 1
+                    
             # Save final results
-            self.save_output_file("analysis_results.json", {
-                "data_info": {
-                    "sample_size": len(self.raw_data),
-                    "data_range": [float(np.min(self.raw_data)), float(np.max(self.raw_data))]
-                },
-                "analysis_results": self.analysis_results,
-                "processing_time": "2 seconds"
-            })
-            
-            # Simulate processing time
-            time.sleep(2)
+            with self._stage("save_results"):
+                self.save_output_file("analysis_results.json", {
+                    "data_info": data_info,
+                    "analysis_results": self.analysis_results,
+                    "processing_time": self.processing_time,
+                    "stage_timings": self.stage_timings
+                })
+                # Completion waits until every result is on disk
+                self.flush()
+            self._store_result()
             self.progress = 100
             
+        except AppCancelledError:
+            # stop() resets the state of a cancelled run
+            pass
         except Exception as e:
             self.progress = -1
             # Save error information
@@ -131,9 +255,11 @@ class DataAnalyzer(BaseApp):
         if self.is_running:
             raise RuntimeError("Application is already running")
             
+        if self.analysis_future and not self.analysis_future.done():
+            raise RuntimeError("Previous run is still stopping")
+            
         self.progress = 0
-        self.analysis_thread = threading.Thread(target=self._analyze_data)
-        self.analysis_thread.start()
+        self.analysis_future = self._submit_work(self._analyze_data)
         self.is_running = True
         
     def stop(self) -> None:
@@ -141,27 +267,35 @@ class DataAnalyzer(BaseApp):
         if not self.is_running:
             raise RuntimeError("Application is not running")
             
-        if self.analysis_thread and self.analysis_thread.is_alive():
-            self.analysis_thread.join(timeout=1)
+        # Abort the analysis at its next stage boundary
+        self._cancel_work(self.analysis_future)
+        completed = self.progress == 100
+        
+        # Release the loaded data, and partial results of an aborted run
+        self.raw_data = None
+        if not completed:
+            self.analysis_results = None
+            self.current_plot = None
             
         self.is_running = False
         self.progress = 0
         
-    def get_status(self) -> Dict[str, Any]:
+    def get_status(self, preview_version: Optional[int] = None) -> Dict[str, Any]:
         """Get analysis status"""
         status = {
             "progress": self.progress,
             "is_running": self.is_running,
-            "app_type": "data_analyzer"
+            "app_type": "data_analyzer",
+            "preview_version": self.preview_version
         }
         
         # If there are partial results, add to status
         if self.analysis_results:
             status["partial_results"] = self.analysis_results
             
-        # If there's a plot, add to status
-        if self.current_plot:
-            status["plot"] = self.current_plot
+        # If there's a plot the client doesn't have yet, add its URL to status
+        if self.current_plot and preview_version != self.preview_version:
+            status["plot_url"] = f"{self.file_url(self.current_plot)}?v={self.preview_version}"
             
         return status
         
@@ -169,21 +303,22 @@ class DataAnalyzer(BaseApp):
         """Get analysis report"""
         if not self.analysis_results or self.progress < 100:
             return {"error": "Analysis not completed"}
+        self.flush()
             
         # Load final results
         results_path = os.path.join(self.output_dir, "analysis_results.json")
         with open(results_path, "r") as f:
             results = json.load(f)
+        results["processing_time"] = self.processing_time
+        results["stage_timings"] = self.stage_timings
             
-        # Load histogram if exists
-        histogram_path = os.path.join(self.output_dir, "histogram.png")
-        if os.path.exists(histogram_path):
-            with open(histogram_path, "rb") as f:
-                results["plot"] = base64.b64encode(f.read()).decode()
+        # Reference the histogram if it exists
+        if self.resolve_file("histogram.png"):
+            results["plot_url"] = self.file_url("histogram.png")
                 
         # Add output files information
         results["output_files"] = {
-            "data": "raw_data.json",
+            "data": self.data_file,
             "results": "analysis_results.json",
             "plot": "histogram.png",
             "intermediate_files": [
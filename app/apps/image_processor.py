@@ -1,23 +1,62 @@
-import time
-import threading
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import base64
+import hashlib
 from io import BytesIO
 import os
+import shutil
 
-from PIL import Image, ImageEnhance
+from PIL import Image
 
-from app.core.base_app import BaseApp
+from app.core.base_app import ARTIFACT_POLICIES, BaseApp
+from app.core.cancellation import AppCancelledError
+from app.core.imaging import adjust_brightness, adjust_contrast, adjust_sharpness, adjust_tone
+from app.core.result_cache import file_digest
+
+# Intermediate image of each enhancement stage, in pipeline order
+STAGE_IMAGES = (
+    ("brightness", "brightness_adjusted"),
+    ("contrast", "contrast_adjusted"),
+    ("sharpness", "sharpness_adjusted")
+)
+
+# Names of the images each stage of the pipeline produces, the last one being its output
+STAGE_FILES = {
+    "decode": ("original",),
+    "brightness": ("brightness_adjusted",),
+    "contrast": ("contrast_adjusted",),
+    "tone": ("brightness_adjusted", "contrast_adjusted"),
+    "sharpness": ("sharpness_adjusted",)
+}
+# Progress once each stage has run
+STAGE_PROGRESS = {"decode": 20, "brightness": 40, "contrast": 60, "tone": 60, "sharpness": 80}
+# Decoded pixels of the stage outputs each application keeps memoized
+MEMO_MAX_BYTES = 64 * 1024 * 1024
 
 class ImageProcessor(BaseApp):
-    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str):
-        super().__init__(app_id, app_dir, config_dir, intermediate_dir, output_dir)
+    # The pipeline reads its input from the config files and writes every
+    # result to the runtime directories, so it can run in a worker process
+    process_safe = True
+    progress_attrs = ("progress", "stage_timings", "preview", "preview_version")
+    result_attrs = ("run_artifacts", "run_enhancement")
+    cache_attrs = ("run_artifacts", "run_enhancement", "preview")
+    transient_attrs = ("processing_future", "config_image_processor", "current_image", "enhanced_image",
+                       "stage_outputs")
+    
+    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str, **kwargs):
+        super().__init__(app_id, app_dir, config_dir, intermediate_dir, output_dir, **kwargs)
         self.required_configs = ["input", "enhancement"]
         self.config_image_processor = None
-        self.processing_thread = None
+        self.processing_future = None
         self.current_image = None
         self.enhanced_image = None
+        self.preview = None
+        self.preview_version = 0
         self.progress = 0
+        # Artifact policy and enhancement parameters of the last run, to render on-demand files
+        self.run_artifacts = None
+        self.run_enhancement = None
+        # Output image of each stage of the last run, by stage, with the key it was computed for
+        self.stage_outputs: Dict[str, Tuple[Tuple, Image.Image]] = {}
         
     def validate_configs(self) -> bool:
         if self.configs is None or self.configs.get("default") is None:
@@ -29,9 +68,12 @@ class ImageProcessor(BaseApp):
         if not all(config in self.config_image_processor for config in self.required_configs):
             return False
             
-        # Validate input configuration
+        # Validate input configuration: inline base64 or an uploaded input file
         input_config = self.config_image_processor["input"]
-        if "image_base64" not in input_config:
+        if "image_file" in input_config:
+            if self.resolve_input_file(input_config["image_file"]) is None:
+                return False
+        elif "image_base64" not in input_config:
             return False
             
         # Validate enhancement configuration
@@ -39,59 +81,268 @@ class ImageProcessor(BaseApp):
         if not all(key in enhancement_config for key in ["brightness", "contrast", "sharpness"]):
             return False
             
+        # Optional per-app artifact policy, overriding the service default
+        if self.config_image_processor.get("artifacts", self.artifact_policy) not in ARTIFACT_POLICIES:
+            return False
+            
         return True
         
+    def _pipeline(self, input_config: Dict[str, Any], enhancement: Dict[str, Any], policy: str) -> List[Tuple[str, Any]]:
+        """The stages of a run and their parameters, in order"""
+        if policy in ("all", "thumbnails"):
+            tone = [("brightness", enhancement["brightness"]), ("contrast", enhancement["contrast"])]
+        else:
+            # No brightness image is kept, so both point operations run as one stage
+            tone = [("tone", (enhancement["brightness"], enhancement["contrast"]))]
+        return [("decode", self._input_key(input_config))] + tone + [("sharpness", enhancement["sharpness"])]
+        
+    def _input_key(self, input_config: Dict[str, Any]) -> Tuple:
+        """Identify the input image cheaply: uploads are replaced, never rewritten, so a new file is a new inode"""
+        if "image_file" in input_config:
+            stat = os.stat(self.resolve_input_file(input_config["image_file"]))
+            return ("image_file", input_config["image_file"], stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        return ("image_base64", hashlib.sha256(input_config["image_base64"].encode()).hexdigest())
+        
+    def _stage_files(self, stage: str, policy: str) -> List[str]:
+        """Intermediate files a stage saves under an artifact policy"""
+        if policy == "all":
+            return [f"{name}.jpg" for name in STAGE_FILES[stage]]
+        if policy == "thumbnails":
+            return [f"{name}_thumb.jpg" for name in STAGE_FILES[stage]]
+        if policy == "lossless-on-demand" and stage == "decode":
+            return ["original.jpg"]
+        return []
+        
+    def _reusable_stages(self, stages: List[Tuple[str, Any]], keys: List[Tuple], policy: str) -> int:
+        """Count the leading stages whose memoized output is still valid, files included"""
+        reused = 0
+        for (stage, _), key in zip(stages, keys):
+            memo = self.stage_outputs.get(stage)
+            if memo is None or memo[0] != key or not all(
+                os.path.exists(os.path.join(self.intermediate_dir, filename))
+                for filename in self._stage_files(stage, policy)
+            ):
+                break
+            reused += 1
+        return reused
+        
+    def _memoize(self, stages: List[Tuple[str, Any]], keys: List[Tuple], index: int, image: Image.Image) -> None:
+        """Memoize the output of a stage while the memoized outputs fit in MEMO_MAX_BYTES
+        
+        Reuse starts at the first stage, so once an output is left out the later
+        ones are too. The last stage's output is the enhanced image the app
+        keeps anyway, so it is not counted.
+        """
+        earlier = [self.stage_outputs.get(stage) for stage, _ in stages[:index]]
+        if any(memo is None for memo in earlier):
+            return
+        if index < len(stages) - 1:
+            if sum(self._image_bytes(memo[1]) for memo in earlier) + self._image_bytes(image) > MEMO_MAX_BYTES:
+                return
+        self.stage_outputs[stages[index][0]] = (keys[index], image)
+        
+    @staticmethod
+    def _image_bytes(image: Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+        
+    def _charge_memo(self) -> None:
+        """Count the memoized outputs of an idle app against the manager's memo budget
+        
+        The budget releases the memos of the least recently run apps beyond
+        its size. The final image is kept anyway, so it is not counted.
+        """
+        if self.memo_budget is None:
+            return
+        size = sum(self._image_bytes(image) for _, image in self.stage_outputs.values()
+                   if image is not self.enhanced_image)
+        if size:
+            self.memo_budget.charge(self.app_id, size, self._release_memo)
+            
+    def _release_memo(self) -> None:
+        self.stage_outputs = {}
+        
+    def remove_intermediate_files(self) -> int:
+        """Delete the intermediate files and release the memoized stage outputs with them"""
+        self.stage_outputs = {}
+        if self.memo_budget is not None:
+            self.memo_budget.discharge(self.app_id)
+        return super().remove_intermediate_files()
+        
+    def _run_stage(self, stage: str, params: Any, image: Optional[Image.Image],
+                   input_config: Dict[str, Any], policy: str) -> Image.Image:
+        """Compute the output image of one stage"""
+        # Each adjustment is one lookup table or convolution pass with the output of ImageEnhance
+        if stage == "decode":
+            return self._decode_input(input_config, policy)
+        if stage == "brightness":
+            return adjust_brightness(image, params)
+        if stage == "contrast":
+            return adjust_contrast(image, params)
+        if stage == "tone":
+            return adjust_tone(image, *params)
+        return adjust_sharpness(image, params)
+        
+    def _decode_input(self, input_config: Dict[str, Any], policy: str) -> Image.Image:
+        """Decode the input image, saving the original as the artifact policy says"""
+        # Originals are copied, not encoded; they are the source of on-demand files
+        keep_original = policy in ("all", "lossless-on-demand")
+        if "image_file" in input_config:
+            # Read the uploaded file directly
+            image_path = self.resolve_input_file(input_config["image_file"])
+            image = Image.open(image_path)
+            image.load()
+            
+            # Save original image
+            if keep_original:
+                original_path = os.path.join(self.intermediate_dir, "original.jpg")
+                shutil.copyfile(image_path, original_path)
+                self._record_file(original_path)
+        else:
+            # Decode base64 image
+            image_data = base64.b64decode(input_config["image_base64"])
+            image = Image.open(BytesIO(image_data))
+            
+            # Save original image
+            if keep_original:
+                self.save_intermediate_file("original.jpg", image_data)
+        if policy == "thumbnails":
+            self.save_intermediate_file("original_thumb.jpg", self._encode_thumbnail(image))
+        return image
+        
     def _process_image(self):
-        """Process image in background thread"""
+        """Process image in background thread
+        
+        The output of every stage is memoized under a key of the input and the
+        parameters of the stage and all stages before it. A re-run starts at
+        the first stage whose key changed, so changing sharpness only runs the
+        sharpness stage; the files of the stages before it are kept.
+        """
         try:
             if not self.validate_configs():
                 raise ValueError("Configuration validation failed")
                 
-            # Decode base64 image
-            image_data = base64.b64decode(self.config_image_processor["input"]["image_base64"])
-            self.current_image = Image.open(BytesIO(image_data))
-            
-            # Save original image
-            self.save_intermediate_file("original.jpg", image_data)
-            self.progress = 20
-            
-            # Apply enhancements
+            policy = self.config_image_processor.get("artifacts", self.artifact_policy)
+            input_config = self.config_image_processor["input"]
             enhancement = self.config_image_processor["enhancement"]
-            self.enhanced_image = self.current_image
-            
-            # Adjust brightness
-            enhancer = ImageEnhance.Brightness(self.enhanced_image)
-            self.enhanced_image = enhancer.enhance(enhancement["brightness"])
-            # Save intermediate result
-            self._save_intermediate_image("brightness_adjusted.jpg")
-            self.progress = 40
-            
-            # Adjust contrast
-            enhancer = ImageEnhance.Contrast(self.enhanced_image)
-            self.enhanced_image = enhancer.enhance(enhancement["contrast"])
-            # Save intermediate result
-            self._save_intermediate_image("contrast_adjusted.jpg")
-            self.progress = 60
-            
-            # Adjust sharpness
-            enhancer = ImageEnhance.Sharpness(self.enhanced_image)
-            self.enhanced_image = enhancer.enhance(enhancement["sharpness"])
-            # Save intermediate result
-            self._save_intermediate_image("sharpness_adjusted.jpg")
-            self.progress = 80
-            
-            # Save final result
-            self._save_output_image("final_result.jpg")
-            
-            # Simulate processing time
-            time.sleep(2)
+            # Worker processes start without memoized outputs; the memo is in use until the run ends
+            self.stage_outputs = self.stage_outputs or {}
+            if self.memo_budget is not None:
+                self.memo_budget.discharge(self.app_id)
+            stages = self._pipeline(input_config, enhancement, policy)
+            keys = []
+            key = (policy,)
+            for stage in stages:
+                key += (stage,)
+                keys.append(key)
+            reused = self._reusable_stages(stages, keys, policy)
+            final_result_path = os.path.join(self.output_dir, "final_result.jpg")
+            if reused < len(stages) or (policy != "none" and not os.path.exists(final_result_path)):
+                # The files of the stages that run again are replaced, from the cache or by this run
+                self._clear_artifacts([stage for stage, _ in stages[reused:]], everything=reused == 0)
+                if self._restore_cached_result(lambda: self._cache_key(input_config, enhancement, policy)):
+                    self.preview_version += 1
+                    self.progress = 100
+                    return
+                    
+                self.current_image = self.stage_outputs["decode"][1] if reused else None
+                self.enhanced_image = self.stage_outputs[stages[reused - 1][0]][1] if reused else None
+                for index in range(reused, len(stages)):
+                    stage, params = stages[index]
+                    with self._stage(stage):
+                        self.enhanced_image = self._run_stage(stage, params, self.enhanced_image, input_config, policy)
+                    self._memoize(stages, keys, index, self.enhanced_image)
+                    if stage == "decode":
+                        self.current_image = self.enhanced_image
+                    else:
+                        self._keep_stage_image(STAGE_FILES[stage][-1], policy)
+                    self.progress = STAGE_PROGRESS[stage]
+                    
+                if policy != "none":
+                    with self._stage("save_result"):
+                        self._save_output_image("final_result.jpg")
+            # Completion waits until every kept artifact is on disk
+            self.flush()
+            self.run_artifacts = policy
+            self.run_enhancement = dict(enhancement)
+            self._store_result()
             self.progress = 100
             
+        except AppCancelledError:
+            # stop() resets the state of a cancelled run
+            pass
         except Exception as e:
             self.progress = -1
             # Save error information
             self.save_output_file("error.txt", str(e))
             raise e
+        finally:
+            self._charge_memo()
+            
+    def _cache_key(self, input_config: Dict[str, Any], enhancement: Dict[str, Any], policy: str) -> Dict[str, Any]:
+        """Digest of the input image and the parameters, which determine every file a run saves"""
+        if "image_file" in input_config:
+            image_digest = file_digest(self.resolve_input_file(input_config["image_file"]))
+        else:
+            image_digest = hashlib.sha256(base64.b64decode(input_config["image_base64"])).hexdigest()
+        return {"image_sha256": image_digest, "enhancement": enhancement, "artifacts": policy}
+        
+    def _on_worker_result(self) -> None:
+        """Load the final image written by a worker process"""
+        final_result_path = os.path.join(self.output_dir, "final_result.jpg")
+        if os.path.exists(final_result_path):
+            self.enhanced_image = Image.open(final_result_path)
+            
+    def _clear_artifacts(self, stages: List[str], everything: bool = False) -> None:
+        """Delete the images of stages of the previous run, and its final result
+        
+        Their memoized outputs are dropped with them. With everything, the
+        input or artifact policy changed: all intermediates are deleted.
+        """
+        self.flush()
+        if everything:
+            self._remove_intermediates(self.app_dir, self.file_sizes)
+            self.stage_outputs = {}
+        for stage in stages:
+            self.stage_outputs.pop(stage, None)
+            for name in STAGE_FILES[stage]:
+                for filename in (f"{name}.jpg", f"{name}_thumb.jpg", f"{name}.png"):
+                    self._remove_file(os.path.join(self.intermediate_dir, filename))
+        self._remove_file(os.path.join(self.output_dir, "final_result.jpg"))
+        self.run_artifacts = None
+        
+    def _remove_file(self, file_path: str) -> None:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        self.file_sizes.pop(os.path.relpath(file_path, self.app_dir), None)
+        
+    @staticmethod
+    def _encode_thumbnail(image: Image.Image) -> bytes:
+        """Encode a JPEG thumbnail of at most 200x200 pixels"""
+        thumbnail = BytesIO()
+        preview_image = image.copy()
+        preview_image.thumbnail((200, 200))  # Reduce preview image size
+        preview_image.save(thumbnail, format="JPEG")
+        return thumbnail.getvalue()
+        
+    def _update_preview(self) -> Optional[bytes]:
+        """Encode a thumbnail of the current stage's image once, for every status poll to reuse"""
+        if self.enhanced_image:
+            thumbnail = self._encode_thumbnail(self.enhanced_image)
+            self.preview = base64.b64encode(thumbnail).decode()
+            self.preview_version += 1
+            return thumbnail
+        return None
+        
+    def _keep_stage_image(self, name: str, policy: str) -> None:
+        """Save the current stage's image as the artifact policy says and refresh the preview
+        
+        Only "all" encodes full-size intermediates; "thumbnails" reuses the preview.
+        """
+        if policy == "all":
+            self._save_intermediate_image(f"{name}.jpg")
+        thumbnail = self._update_preview()
+        if policy == "thumbnails" and thumbnail:
+            self.save_intermediate_file(f"{name}_thumb.jpg", thumbnail)
             
     def _save_intermediate_image(self, filename: str):
         """Helper method to save intermediate image"""
@@ -107,17 +358,53 @@ class ImageProcessor(BaseApp):
             self.enhanced_image.save(output, format="JPEG")
             self.save_output_file(filename, output.getvalue())
             
+    def _on_demand_files(self) -> List[str]:
+        """Lossless intermediates of the last run that are rendered when first requested"""
+        if self.run_artifacts != "lossless-on-demand":
+            return []
+        return [f"{name}.png" for _, name in STAGE_IMAGES]
+        
+    def _render_on_demand(self, filename: str) -> Optional[str]:
+        """Re-run the enhancement stages on the kept original up to the requested stage, saved as PNG"""
+        source_path = os.path.join(self.intermediate_dir, "original.jpg")
+        if not os.path.exists(source_path):
+            return None
+        image = Image.open(source_path)
+        image.load()
+        adjust = {"brightness": adjust_brightness, "contrast": adjust_contrast, "sharpness": adjust_sharpness}
+        for stage, name in STAGE_IMAGES:
+            image = adjust[stage](image, self.run_enhancement[stage])
+            if filename == f"{name}.png":
+                break
+        output = BytesIO()
+        image.save(output, format="PNG")
+        # Saved files are renamed into place, so concurrent requests never read a partial file
+        file_path = self.save_intermediate_file(filename, output.getvalue())
+        self.flush()
+        # The report now lists the rendered file, so cached reports are stale
+        self._mark_changed()
+        return file_path
+        
+    def resolve_file(self, filename: str) -> Optional[str]:
+        """Get the path of an output or intermediate file, rendering on-demand files first"""
+        file_path = super().resolve_file(filename)
+        if file_path is None and filename in self._on_demand_files():
+            file_path = self._render_on_demand(filename)
+        return file_path
+        
     def start(self) -> None:
         """Start image processing"""
         if self.is_running:
             raise RuntimeError("Application is already running")
             
+        if self.processing_future and not self.processing_future.done():
+            raise RuntimeError("Previous run is still stopping")
+            
         if not self.validate_configs():
             raise ValueError("Configuration validation failed")
             
         self.progress = 0
-        self.processing_thread = threading.Thread(target=self._process_image)
-        self.processing_thread.start()
+        self.processing_future = self._submit_work(self._process_image)
         self.is_running = True
         
     def stop(self) -> None:
@@ -125,55 +412,61 @@ class ImageProcessor(BaseApp):
         if not self.is_running:
             raise RuntimeError("Application is not running")
             
-        if self.processing_thread and self.processing_thread.is_alive():
-            # In a real application, there should be a more graceful way to stop
-            self.processing_thread.join(timeout=1)
+        # Abort the pipeline at its next stage boundary
+        self._cancel_work(self.processing_future)
+        completed = self.progress == 100
+        
+        # Release the decoded input, and partial results of an aborted run; the
+        # memoized stage outputs are kept for the next run to start from until
+        # the janitor trims the intermediates or the memo budget releases them
+        self.current_image = None
+        if not completed:
+            self.enhanced_image = None
+            self.preview = None
             
         self.is_running = False
         self.progress = 0
         
-    def get_status(self) -> Dict[str, Any]:
+    def get_status(self, preview_version: Optional[int] = None) -> Dict[str, Any]:
         """Get processing status"""
         status = {
             "progress": self.progress,
             "is_running": self.is_running,
-            "app_type": "image_processor"
+            "app_type": "image_processor",
+            "preview_version": self.preview_version
         }
         
-        # If there's a current image, add preview
-        if self.enhanced_image and self.progress > 0:
-            preview = BytesIO()
-            preview_size = (200, 200)  # Reduce preview image size
-            preview_image = self.enhanced_image.copy()
-            preview_image.thumbnail(preview_size)
-            preview_image.save(preview, format="JPEG")
-            status["preview"] = base64.b64encode(preview.getvalue()).decode()
+        # Add the cached preview unless the client already has this version
+        if self.preview and self.progress > 0 and preview_version != self.preview_version:
+            status["preview"] = self.preview
             
         return status
         
     def get_report(self) -> Dict[str, Any]:
         """Get processing report"""
-        if not self.enhanced_image or self.progress < 100:
+        if self.progress < 100:
             return {"error": "Processing not completed"}
+        self.flush()
             
-        # Get final result image
-        final_result_path = os.path.join(self.output_dir, "final_result.jpg")
-        with open(final_result_path, "rb") as f:
-            image_data = f.read()
-            
-        return {
-            "processed_image": base64.b64encode(image_data).decode(),
-            "processing_time": "2 seconds",  # In a real application, should record actual processing time
+        # Only the files the run's artifact policy kept
+        intermediate_files = [
+            filename for filename in os.listdir(self.intermediate_dir)
+            if not filename.startswith(".")
+        ] if os.path.isdir(self.intermediate_dir) else []
+        final_result = "final_result.jpg" if super().resolve_file("final_result.jpg") else None
+        report = {
+            "processing_time": self.processing_time,
+            "stage_timings": self.stage_timings,
             "enhancement_params": self.config_image_processor["enhancement"],
+            "artifacts": self.run_artifacts,
             "output_files": {
-                "final_result": "final_result.jpg",
-                "intermediate_files": [
-                    "original.jpg",
-                    "brightness_adjusted.jpg",
-                    "contrast_adjusted.jpg",
-                    "sharpness_adjusted.jpg"
-                ]
+                "final_result": final_result,
+                "intermediate_files": sorted(intermediate_files)
             }
-        } 
-    
-    
\ No newline at end of file
+        }
+        if final_result:
+            report["processed_image_url"] = self.file_url(final_result)
+        on_demand_files = [name for name in self._on_demand_files() if name not in intermediate_files]
+        if on_demand_files:
+            report["output_files"]["on_demand_files"] = on_demand_files
+        return report
@@ -1,8 +1,21 @@
+import importlib
+
 from .base_app import BaseApp
 from .app_manager import AppManager
+from .executor import AppExecutor
 from .web_service import WebService
-from .flask_service import FlaskWebService
-from .fastapi_service import FastAPIWebService
 
-__all__ = ['BaseApp', 'AppManager', 'WebService', 'FlaskWebService', 'FastAPIWebService'] 
+# The web services import their framework, so they are imported on first access (PEP 562)
+_EXPORTS = {
+    'FlaskWebService': '.flask_service',
+    'FastAPIWebService': '.fastapi_service'
+}
+
+__all__ = ['BaseApp', 'AppManager', 'AppExecutor', 'WebService', 'FlaskWebService', 'FastAPIWebService']
 
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,78 +1,588 @@
-from typing import Dict, Type, Optional
+from typing import Dict, List, Tuple, Type, Optional, Any, Union
+import importlib
+import json
+import threading
+import time
 import uuid
 import os
 
-from .base_app import BaseApp
+from .base_app import ARTIFACT_POLICIES, BaseApp
+from .batch import Batch
+from .events import EventBus
+from .executor import AppExecutor
+from .janitor import Janitor, RetentionPolicy
+from .memo import MemoBudget
+from .metrics import Collected, ServiceMetrics
+from .registry import AppRegistry, AppOwnershipError, MemoryRegistry, RemoteApp
+from .result_cache import ResultCache
+from .writer import ArtifactWriter
+
+MANIFEST_FILENAME = "manifest.json"
+# Record of the worker that created a batch, for removing the batch once that worker is gone
+BATCH_MANIFEST_FILENAME = "batch.json"
+# Directory of the result caches of all worker processes, under the runtime directory
+RESULT_CACHE_DIRNAME = ".result-cache"
+# Default bound on the results all applications of a manager memoize in memory
+DEFAULT_MEMO_BUDGET_BYTES = 256 * 1024 * 1024
 
 class AppManager:
-    def __init__(self, runtime_dir: str = "runtime"):
+    def __init__(self, runtime_dir: str = "runtime", max_workers: Optional[int] = None,
+                 executor_backend: str = "thread", registry: Optional[AppRegistry] = None,
+                 retention: Optional[RetentionPolicy] = None, artifact_policy: Optional[str] = None,
+                 write_behind: bool = False, result_cache_bytes: Optional[int] = None,
+                 memo_budget_bytes: int = DEFAULT_MEMO_BUDGET_BYTES):
         self.apps: Dict[str, BaseApp] = {}
-        self.app_types: Dict[str, Type[BaseApp]] = {}
+        # Batches created by this worker, by batch ID
+        self.batches: Dict[str, Batch] = {}
+        # Application classes, or dotted paths of classes not imported yet
+        self.app_types: Dict[str, Union[Type[BaseApp], str]] = {}
         self.runtime_dir = os.path.abspath(runtime_dir)
+        # Default intermediate artifact policy of every application instance
+        if artifact_policy is not None and artifact_policy not in ARTIFACT_POLICIES:
+            raise ValueError(f"Unsupported artifact policy: {artifact_policy}")
+        self.artifact_policy = artifact_policy
+        
+        # Shared worker pool all application instances submit their work to
+        self.executor = AppExecutor(max_workers=max_workers, backend=executor_backend)
+        # With write-behind, one I/O thread writes the files all applications save
+        self.artifact_writer = ArtifactWriter() if write_behind else None
+        # Applications publish their state changes here for push subscribers
+        self.event_bus = EventBus()
+        # Metrics of the applications, the worker pool and the web service, served at /metrics
+        self.metrics = ServiceMetrics()
+        self.metrics.add_collector(self._collect_metrics)
+        
+        # Record of all application instances; a shared registry lets several
+        # worker processes serve the same applications. Applications left in
+        # the runtime directory by earlier runs are added from their manifests
+        # when first looked up, so startup does not depend on their number.
+        self.registry = registry or MemoryRegistry()
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._scanned = False
+        self._sync_lock = threading.Lock()
+        # Reports of completed local runs by application ID, with the run and files they describe
+        self._reports: Dict[str, Tuple[Any, Dict[str, int], Dict[str, Any]]] = {}
+        # Whether the last manifest written for each local application had a run in flight
+        self._manifest_busy: Dict[str, bool] = {}
+        # Mirror local state changes into the registry and the manifests off the request path
+        self._sync_subscription = self.event_bus.subscribe(maxsize=0)
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="registry-sync", daemon=True)
+        self._sync_thread.start()
         
         # Create runtime directory if it doesn't exist
         if not os.path.exists(self.runtime_dir):
             os.makedirs(self.runtime_dir)
+            
+        # Runs with the same inputs and parameters complete from the results of earlier ones
+        self.result_cache = None
+        if result_cache_bytes:
+            cache_root = os.path.join(self.runtime_dir, RESULT_CACHE_DIRNAME)
+            self._remove_stale_caches(cache_root)
+            self.result_cache = ResultCache(os.path.join(cache_root, self.worker_id), result_cache_bytes)
+        # Memoized results of idle applications are released, least recently used first, beyond this size
+        self.memo_budget = MemoBudget(memo_budget_bytes)
+            
+        # Removes finished applications and their files according to the retention policy
+        self.janitor = Janitor(self, retention) if retention is not None else None
+        if self.janitor is not None:
+            self.janitor.start()
+        
+    def register_app_type(self, app_type_name: str, app_class: Union[Type[BaseApp], str]) -> None:
+        """Register application type
         
-    def register_app_type(self, app_type_name: str, app_class: Type[BaseApp]) -> None:
-        """Register application type"""
+        app_class may be a dotted path such as "app.apps.data_analyzer.DataAnalyzer";
+        its module, and the libraries it needs, are imported on first use.
+        """
         self.app_types[app_type_name] = app_class
         
+    def _app_class(self, app_type_name: str) -> Type[BaseApp]:
+        """Get the class of an application type, importing it if registered by path"""
+        app_class = self.app_types[app_type_name]
+        if isinstance(app_class, str):
+            module_name, _, class_name = app_class.rpartition(".")
+            app_class = getattr(importlib.import_module(module_name), class_name)
+            self.app_types[app_type_name] = app_class
+        return app_class
+        
     def create_app_instance(self, app_type_name: str) -> str:
         """Create application instance"""
         if app_type_name not in self.app_types:
             raise ValueError(f"Unknown application type: {app_type_name}")
-            
+        
         app_id = str(uuid.uuid4())
         
         # Create app directory structure
         app_dir = os.path.join(self.runtime_dir, app_id)
-        config_dir = os.path.join(app_dir, "config")
-        intermediate_dir = os.path.join(app_dir, "intermediate")
-        output_dir = os.path.join(app_dir, "output")
-        
-        # Create directories
         os.makedirs(app_dir)
-        os.makedirs(config_dir)
-        os.makedirs(intermediate_dir)
-        os.makedirs(output_dir)
+        for name in ("config", "intermediate", "output", "input"):
+            os.makedirs(os.path.join(app_dir, name))
         
-        # Create app instance with directory paths
-        app_instance = self.app_types[app_type_name](
+        app_instance = self._instantiate(app_type_name, app_id)
+        record = {
+            "app_type": app_type_name,
+            "app_dir": app_dir,
+            "created_at": time.time(),
+            **self._snapshot(app_instance)
+        }
+        self._write_manifest(app_id, record)
+        self.apps[app_id] = app_instance
+        self.registry.put(app_id, record)
+        return app_id
+        
+    def _instantiate(self, app_type_name: str, app_id: str, app_dir: Optional[str] = None,
+                     event_bus: Optional[Any] = None) -> BaseApp:
+        """Create an application object over its existing directories"""
+        app_dir = app_dir or os.path.join(self.runtime_dir, app_id)
+        return self._app_class(app_type_name)(
             app_id,
             app_dir=app_dir,
-            config_dir=config_dir,
-            intermediate_dir=intermediate_dir,
-            output_dir=output_dir
+            config_dir=os.path.join(app_dir, "config"),
+            intermediate_dir=os.path.join(app_dir, "intermediate"),
+            output_dir=os.path.join(app_dir, "output"),
+            executor=self.executor,
+            event_bus=event_bus or self.event_bus,
+            artifact_policy=self.artifact_policy,
+            artifact_writer=self.artifact_writer,
+            result_cache=self.result_cache,
+            metrics=self.metrics,
+            memo_budget=self.memo_budget
         )
-        self.apps[app_id] = app_instance
-        return app_id
         
-    def get_app(self, app_id: str) -> Optional[BaseApp]:
-        """Get application instance"""
-        return self.apps.get(app_id)
+    def _snapshot(self, app: BaseApp) -> Dict[str, Any]:
+        """Get the registry fields describing an application's current state"""
+        # Read the tag first, so it can only be older than the state it describes
+        etag = app.get_etag()
+        status = app.get_status()
+        # Previews are inline images; remote readers fetch files instead
+        status.pop("preview", None)
+        return {
+            "owner": self.worker_id,
+            "is_running": app.is_running,
+            "busy": app.busy,
+            "progress": app.progress,
+            "state_version": app.state_version,
+            "etag": etag,
+            "status": status,
+            "report": self._completed_report(app),
+            "file_sizes": app.file_sizes,
+            "last_used": app.last_used
+        }
+        
+    def _completed_report(self, app: BaseApp) -> Optional[Dict[str, Any]]:
+        """Get the report of a completed run, built once per run and set of files
+        
+        A run is identified by its cancellation token, which every submission
+        replaces; files trimmed or rendered after the run change its report.
+        """
+        if app.progress != 100:
+            self._reports.pop(app.app_id, None)
+            return None
+        cached = self._reports.get(app.app_id)
+        if cached is not None and cached[0] is app.cancel_token and cached[1] == app.file_sizes:
+            return cached[2]
+        report = app.get_report()
+        self._reports[app.app_id] = (app.cancel_token, dict(app.file_sizes), report)
+        return report
+        
+    def _write_manifest(self, app_id: str, record: Dict[str, Any]) -> None:
+        """Atomically replace the manifest an application is recovered from after a restart"""
+        self._write_json(os.path.join(self.runtime_dir, app_id, MANIFEST_FILENAME), record)
+        
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        
+    def _load_manifest(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """Read the record of an application left by an earlier run, or None if there is none"""
+        if not BaseApp._is_plain_filename(app_id):
+            return None
+        app_dir = os.path.join(self.runtime_dir, app_id)
+        try:
+            with open(os.path.join(app_dir, MANIFEST_FILENAME), "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The runtime directory may have moved since the manifest was written
+        record["app_dir"] = app_dir
+        record.update(self._recovered_fields(record))
+        # Another worker may have loaded it first
+        if not self.registry.add(app_id, record):
+            return self.registry.get(app_id)
+        return record
+        
+    @staticmethod
+    def _recovered_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the fields that release an application from a worker that no longer exists"""
+        fields = {"owner": None, "busy": False}
+        if record.get("busy"):
+            # The run was cut short: report it as failed rather than running forever
+            fields["is_running"] = False
+            fields["progress"] = -1
+            fields["status"] = {**(record.get("status") or {}), "is_running": False, "progress": -1,
+                                "error": "Interrupted by a restart"}
+        return fields
+        
+    def _remove_stale_caches(self, cache_root: str) -> None:
+        """Remove the result caches of worker processes that have exited; their indexes are gone"""
+        if not os.path.isdir(cache_root):
+            return
+        import shutil
+        with os.scandir(cache_root) as entries:
+            for entry in entries:
+                if entry.is_dir() and not self._owner_alive(entry.name):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        
+    def _owner_alive(self, owner: Optional[str]) -> bool:
+        """Check whether the worker process owning a record is still running on this host"""
+        if owner is None:
+            return False
+        try:
+            pid = int(owner.split("-")[0])
+        except ValueError:
+            return True
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+        
+    def _release_orphan(self, app_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Release a record whose owning worker has exited, so any worker can take it over"""
+        fields = self._recovered_fields(record)
+        if self.registry.swap(app_id, record.get("owner"), fields):
+            record.update(fields)
+            return record
+        return self.registry.get(app_id) or record
+        
+    def _sync_loop(self) -> None:
+        """Write the state of changed local applications to the registry and their manifests"""
+        closed = False
+        while not closed:
+            event = self._sync_subscription.get()
+            # Coalesce queued events: one write per application reflects them all
+            changed = set()
+            while event is not None:
+                if event["type"] == "status":
+                    changed.add(event["app_id"])
+                elif event["type"] == "shutdown":
+                    closed = True
+                event = self._sync_subscription.get(timeout=0)
+            for app_id in changed:
+                self._sync_app(app_id)
+        
+    def _sync_app(self, app_id: str) -> None:
+        """Write the current state of a local application to the registry and its manifest"""
+        # Held across the write so delete_app() never races a manifest into a removed directory
+        with self._sync_lock:
+            app = self.apps.get(app_id)
+            if app is None:
+                return
+            try:
+                record = self.registry.get(app_id)
+                if record is None or record.get("owner") != self.worker_id:
+                    return
+                snapshot = self._snapshot(app)
+                record.update(snapshot)
+                self.registry.update(app_id, snapshot)
+                # Progress within a run only goes to the registry: a manifest written
+                # while busy is recovered as interrupted, whatever progress it records
+                if not (snapshot["busy"] and self._manifest_busy.get(app_id)):
+                    self._write_manifest(app_id, record)
+                    self._manifest_busy[app_id] = snapshot["busy"]
+            except Exception as e:
+                print(f"Error syncing {app_id} to the registry: {str(e)}")
+        
+    def get_app(self, app_id: str) -> Optional[Union[BaseApp, RemoteApp]]:
+        """Get application instance, or a read-only view if this worker has not loaded it"""
+        item = self._get_batch_item(app_id)
+        if item is not None:
+            return item
+        if not self.registry.shared and app_id in self.apps:
+            return self._touch(self.apps[app_id])
+        
+        record = self.registry.get(app_id) or self._load_manifest(app_id)
+        if record is None:
+            # Deleted, possibly by another worker
+            self.apps.pop(app_id, None)
+            return None
+        if record.get("owner") == self.worker_id:
+            app = self.apps.get(app_id)
+            return self._touch(app) if app is not None else None
+        # Another worker has taken the application over; any local copy is stale
+        self.apps.pop(app_id, None)
+        if record.get("owner") is not None and not self._owner_alive(record["owner"]):
+            record = self._release_orphan(app_id, record)
+        return RemoteApp(app_id, record)
+        
+    @staticmethod
+    def _touch(app: BaseApp) -> BaseApp:
+        """Mark an application as recently used, for least-recently-used eviction"""
+        app.last_used = time.time()
+        return app
+        
+    def acquire_app(self, app_id: str) -> Optional[BaseApp]:
+        """Get an application instance that can be changed
+        
+        An application this worker has not loaded is taken over and reloaded
+        from its configs, which resets its run; if another worker still has
+        its work in flight, AppOwnershipError is raised instead.
+        """
+        app = self.get_app(app_id)
+        self._check_not_batch_item(app_id)
+        if not isinstance(app, RemoteApp):
+            return app
+        app_type_name = app.record["app_type"]
+        if app_type_name not in self.app_types:
+            raise ValueError(f"Unknown application type: {app_type_name}")
+        if app.busy or not self.registry.claim(app_id, self.worker_id, app.owner):
+            raise AppOwnershipError(f"Application {app_id} is busy on worker {app.owner}")
+        
+        app_instance = self._instantiate(app_type_name, app_id)
+        app_instance._reload_configs()
+        # Files on disk outlive the run that wrote them
+        app_instance.file_sizes = dict(app.record.get("file_sizes") or {})
+        self.apps[app_id] = app_instance
+        self._sync_app(app_id)
+        return app_instance
         
     def delete_app(self, app_id: str) -> None:
         """Delete application instance"""
-        if app_id in self.apps:
-            app = self.apps[app_id]
+        app = self.get_app(app_id)
+        if app is None:
+            return
+        self._check_not_batch_item(app_id)
+        if isinstance(app, RemoteApp):
+            if app.busy:
+                raise AppOwnershipError(f"Application {app_id} is running on worker {app.owner}")
+        else:
             if app.is_running:
                 app.stop()
+            # Let queued writes finish before their directory is removed
+            try:
+                app.flush()
+            except Exception:
+                pass
+        
+        with self._sync_lock:
+            self.apps.pop(app_id, None)
+            self._reports.pop(app_id, None)
+            self._manifest_busy.pop(app_id, None)
+        self.memo_budget.discharge(app_id)
+        
+        # Clean up app directory
+        app_dir = os.path.join(self.runtime_dir, app_id)
+        if os.path.exists(app_dir):
+            import shutil
+            shutil.rmtree(app_dir)
+        
+        self.registry.delete(app_id)
+        self.event_bus.publish(app_id, {"type": "deleted", "app_id": app_id})
+        
+    def remove_intermediate_files(self, app_id: str) -> int:
+        """Delete an idle application's intermediate files, keeping its final outputs
+        
+        Returns the number of bytes freed.
+        """
+        app = self.get_app(app_id)
+        if app is None:
+            return 0
+        if not isinstance(app, RemoteApp):
+            return app.remove_intermediate_files()
+        if app.owner is not None:
+            raise AppOwnershipError(f"Application {app_id} is owned by worker {app.owner}")
+        file_sizes = dict(app.record.get("file_sizes") or {})
+        freed = BaseApp._remove_intermediates(app.app_dir, file_sizes)
+        if self.registry.swap(app_id, None, {"file_sizes": file_sizes}):
+            self._write_manifest(app_id, {**app.record, "file_sizes": file_sizes})
+        return freed
+        
+    def get_all_apps(self) -> Dict[str, Union[BaseApp, RemoteApp]]:
+        """Get all application instances, with read-only views of those this worker has not loaded"""
+        if not self._scanned:
+            self._scan_runtime_dir()
+        
+        apps = {}
+        for app_id, record in self.registry.list().items():
+            app = self.apps.get(app_id)
+            if record.get("owner") == self.worker_id and app is not None:
+                apps[app_id] = app
+                continue
+            if record.get("owner") is not None and not self._owner_alive(record["owner"]):
+                record = self._release_orphan(app_id, record)
+            apps[app_id] = RemoteApp(app_id, record)
+        return apps
+        
+    def _scan_runtime_dir(self) -> None:
+        """Add the applications left in the runtime directory by earlier runs to the registry"""
+        known = self.registry.list()
+        with os.scandir(self.runtime_dir) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.name not in known:
+                    if self._load_manifest(entry.name) is None:
+                        self._remove_orphan_batch(entry.path)
+        self._scanned = True
+        
+    def _remove_orphan_batch(self, batch_dir: str) -> None:
+        """Delete the directory tree of a batch whose worker has exited; batches do not survive it"""
+        try:
+            with open(os.path.join(batch_dir, BATCH_MANIFEST_FILENAME), "r") as f:
+                owner = json.load(f).get("owner")
+        except (OSError, ValueError):
+            return
+        if not self._owner_alive(owner):
+            import shutil
+            shutil.rmtree(batch_dir, ignore_errors=True)
+        
+    def create_batch(self, app_type_name: str, configs: List[Dict[str, Any]], start: bool = True) -> str:
+        """Create a batch running one application type over many default configs
+        
+        All items share one directory tree, runtime_dir/<batch_id>/items/<index>,
+        and are submitted to the shared worker pool together. Raises ValueError,
+        creating nothing, if any config is invalid.
+        """
+        if app_type_name not in self.app_types:
+            raise ValueError(f"Unknown application type: {app_type_name}")
+        if not configs:
+            raise ValueError("A batch needs at least one item")
             
-            # Clean up app directory
-            app_dir = os.path.join(self.runtime_dir, app_id)
-            if os.path.exists(app_dir):
-                import shutil
-                shutil.rmtree(app_dir)
+        batch_id = str(uuid.uuid4())
+        batch_dir = os.path.join(self.runtime_dir, batch_id)
+        os.makedirs(batch_dir)
+        self._write_json(os.path.join(batch_dir, BATCH_MANIFEST_FILENAME), {
+            "batch_id": batch_id,
+            "app_type": app_type_name,
+            "owner": self.worker_id,
+            "created_at": time.time()
+        })
+        batch = Batch(batch_id, app_type_name, batch_dir, self.event_bus)
+        invalid = []
+        for index, config in enumerate(configs):
+            item_dir = os.path.join(batch_dir, "items", str(index))
+            for name in ("config", "intermediate", "output", "input"):
+                os.makedirs(os.path.join(item_dir, name))
+            item = self._instantiate(app_type_name, f"{batch_id}.{index}", app_dir=item_dir, event_bus=batch.events)
+            item.upload_config("default", config)
+            if not item.validate_configs():
+                invalid.append(index)
+            batch.items.append(item)
+        if invalid:
+            import shutil
+            shutil.rmtree(batch_dir)
+            raise ValueError(f"Invalid configuration for batch items: {invalid}")
             
-            del self.apps[app_id]
+        self.batches[batch_id] = batch
+        if start:
+            batch.start()
+        return batch_id
+        
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        """Get a batch created by this worker"""
+        return self.batches.get(batch_id)
+        
+    def delete_batch(self, batch_id: str) -> None:
+        """Stop a batch and delete its items and directory tree"""
+        batch = self.batches.pop(batch_id, None)
+        if batch is None:
+            return
+        batch.stop()
+        for item in batch.items:
+            try:
+                item.flush()
+            except Exception:
+                pass
+            self.memo_budget.discharge(item.app_id)
+        if os.path.exists(batch.batch_dir):
+            import shutil
+            shutil.rmtree(batch.batch_dir)
+        self.event_bus.publish(batch_id, {"type": "deleted", "app_id": batch_id})
+        
+    def _get_batch_item(self, app_id: str) -> Optional[BaseApp]:
+        """Get a batch item by its ID, <batch_id>.<index>"""
+        batch_id, _, index = app_id.rpartition(".")
+        batch = self.batches.get(batch_id)
+        if batch is None or not index.isdigit() or int(index) >= len(batch.items):
+            return None
+        return batch.items[int(index)]
+        
+    def _check_not_batch_item(self, app_id: str) -> None:
+        """Batch items are changed only through their batch"""
+        if self._get_batch_item(app_id) is not None:
+            raise AppOwnershipError(f"Application {app_id} belongs to batch {app_id.rpartition('.')[0]}")
             
-    def get_all_apps(self) -> Dict[str, BaseApp]:
-        """Get all application instances"""
-        return self.apps.copy()
-        
-    def get_app_types(self) -> Dict[str, Type[BaseApp]]:
-        """Get all registered application types"""
-        return self.app_types.copy() 
-    
-    
\ No newline at end of file
+    def get_app_types(self) -> Dict[str, Union[Type[BaseApp], str]]:
+        """Get all registered application types, as classes or the dotted paths not imported yet"""
+        return self.app_types.copy()
+        
+    def get_executor_stats(self) -> Dict[str, Any]:
+        """Get worker pool queue depth and wait time metrics"""
+        return self.executor.get_stats()
+        
+    def _collect_metrics(self) -> List[Collected]:
+        """Read the worker pool, application, memo and result cache metrics when they are rendered"""
+        executor = self.executor.get_stats()
+        memo = self.memo_budget.get_stats()
+        local_apps = list(self.apps.values()) + [item for batch in list(self.batches.values()) for item in batch.items]
+        busy = sum(1 for app in local_apps if app.busy)
+        collected = [
+            ("executor_active_work_items", "gauge", "Work items running in the worker pool",
+             [({}, executor["active"])]),
+            ("executor_queued_work_items", "gauge", "Work items waiting for a worker",
+             [({}, executor["queued"])]),
+            ("executor_max_workers", "gauge", "Size of the worker pool", [({}, executor["max_workers"])]),
+            ("executor_wait_seconds_total", "counter", "Time work items spent waiting for a worker",
+             [({}, executor["wait_time_total"])]),
+            ("apps_loaded", "gauge", "Applications and batch items loaded by this worker, by whether a run is in flight",
+             [({"state": "busy"}, busy), ({"state": "idle"}, len(local_apps) - busy)]),
+            ("memo_bytes", "gauge", "Size of the results idle applications keep memoized in memory",
+             [({}, memo["bytes"])]),
+            ("memo_releases_total", "counter", "Memoized results released to keep within the memo budget",
+             [({}, memo["releases"])])
+        ]
+        if self.artifact_writer is not None:
+            collected.append(("artifact_writes_pending", "gauge", "Files queued for the write-behind thread",
+                              [({}, self.artifact_writer.pending)]))
+        if self.result_cache is not None:
+            cache = self.result_cache.get_stats()
+            collected.extend([
+                ("result_cache_lookups_total", "counter", "Result cache lookups, by result",
+                 [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+                ("result_cache_hit_ratio", "gauge", "Fraction of result cache lookups that hit",
+                 [({}, cache["hit_rate"])]),
+                ("result_cache_evictions_total", "counter", "Runs evicted from the result cache",
+                 [({}, cache["evictions"])]),
+                ("result_cache_entries", "gauge", "Runs in the result cache", [({}, cache["entries"])]),
+                ("result_cache_bytes", "gauge", "Size of the files in the result cache", [({}, cache["bytes"])])
+            ])
+        return collected
+        
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get result cache hit and miss counts and size"""
+        if self.result_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.result_cache.get_stats()}
+        
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the janitor, the shared worker pool and the registry"""
+        if self.janitor is not None:
+            self.janitor.stop()
+        self.executor.shutdown(wait=wait)
+        if self.artifact_writer is not None:
+            self.artifact_writer.close()
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        # Only subscribers to all applications receive this
+        self.event_bus.publish(None, {"type": "shutdown"})
+        self._sync_thread.join(timeout=1)
+        self._sync_subscription.close()
+        # Persist the final state of local applications for the next start
+        for app_id in list(self.apps):
+            self._sync_app(app_id)
+        self.registry.close()
+
@@ -1,28 +1,363 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from typing import Dict, Any, List, Callable, Optional, BinaryIO
 from pathlib import Path
 import os
 import json
+import shutil
+import threading
+import time
+import uuid
+
+from .cancellation import CancellationToken
+from .events import EventBus
+from .executor import AppExecutor, get_default_executor
+from .memo import MemoBudget
+from .metrics import ServiceMetrics
+from .result_cache import ResultCache
+from .writer import ArtifactWriter, write_atomic
+
+# Which intermediate artifacts a run keeps, for applications that support a policy
+ARTIFACT_POLICIES = ("none", "final-only", "thumbnails", "lossless-on-demand", "all")
+
+def _run_in_worker_process(app: "BaseApp", method_name: str, channel, args, kwargs):
+    """Run a process-safe work method on a copy of the app in a pool worker"""
+    app._worker_channel = channel
+    app._reload_configs()
+    getattr(app, method_name)(*args, **kwargs)
+    app._worker_seq += 1
+    names = tuple(app.progress_attrs) + tuple(app.result_attrs) + ("file_sizes",)
+    return app._worker_seq, {name: getattr(app, name) for name in names}
 
 class BaseApp(ABC):
-    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str):
+    # Set to True in subclasses whose work method can run in a worker process.
+    # The app is pickled without its configs, so the work method must read
+    # its inputs through the config files and write its outputs to the
+    # runtime directories.
+    process_safe = False
+    # Attributes relayed from a worker process whenever state changes
+    progress_attrs = ("progress", "stage_timings")
+    # Attributes copied back from a worker process when the work completes
+    result_attrs = ()
+    # Attributes that are never sent to a worker process
+    transient_attrs = ()
+    # Attributes that, with the files of result_files(), make up the result of a
+    # completed run; they are stored in and restored from the result cache
+    cache_attrs = ()
+    
+    def __init__(self, app_id: str, app_dir: str, config_dir: str, intermediate_dir: str, output_dir: str,
+                 executor: Optional[AppExecutor] = None, event_bus: Optional[EventBus] = None,
+                 artifact_policy: Optional[str] = None, artifact_writer: Optional[ArtifactWriter] = None,
+                 result_cache: Optional[ResultCache] = None, metrics: Optional[ServiceMetrics] = None,
+                 memo_budget: Optional[MemoBudget] = None):
         self.app_id = app_id
         self.app_dir = app_dir
         self.config_dir = config_dir
         self.intermediate_dir = intermediate_dir
         self.output_dir = output_dir
+        # Binary inputs uploaded outside the configs, referenced from them by file name
+        self.input_dir = os.path.join(app_dir, "input")
         self.configs: Dict[str, Dict] = {}
-        self.is_running = False
+        self.executor = executor
+        self.event_bus = event_bus
+        # Service-wide default of ARTIFACT_POLICIES; apps may let their configs override it
+        self.artifact_policy = artifact_policy or "all"
+        # Write-behind queue for saved files; None writes them synchronously
+        self.artifact_writer = artifact_writer
+        self._pending_writes: List[Future] = []
+        self._write_lock = threading.Lock()
+        # Completed runs shared between applications; None never caches
+        self.result_cache = result_cache
+        self._run_cache_key: Optional[Dict[str, Any]] = None
+        # Stage durations and written bytes are recorded here; None records nothing
+        self.metrics = metrics
+        # Bound on the results memoized in memory by all applications; None leaves them unbounded
+        self.memo_budget = memo_budget
+        # Monotonic version of everything get_status()/get_report() return;
+        # the epoch keeps ETags unique across restarts of the service
+        self.state_version = 0
+        self._state_epoch = uuid.uuid4().hex[:8]
+        self._version_lock = threading.Lock()
+        self._is_running = False
+        self._progress = 0
+        self.cancel_token = CancellationToken()
+        self.stage_timings: Dict[str, float] = {}
+        # Size of every file written under app_dir, by path relative to it,
+        # so disk usage is known without walking the directory tree
+        self.file_sizes: Dict[str, int] = {}
+        self.last_used = time.time()
+        self._worker_channel = None
+        self._worker_seq = 0
+        self._worker_lock = threading.Lock()
+        
+    @property
+    def progress(self) -> int:
+        return self._progress
+        
+    @progress.setter
+    def progress(self, value: int) -> None:
+        self._progress = value
+        self._mark_changed()
+        
+    @property
+    def is_running(self) -> bool:
+        return self._is_running
+        
+    @is_running.setter
+    def is_running(self, value: bool) -> None:
+        self._is_running = value
+        self._mark_changed()
+        
+    def _mark_changed(self) -> None:
+        """Record that observable application state has changed
+        
+        Subclasses must call this (directly, or by setting progress or
+        is_running) after any change that affects get_status() or get_report().
+        """
+        if self._worker_channel is not None:
+            # Running inside a worker process: relay the change to the parent
+            self._worker_seq += 1
+            update = {name: getattr(self, name) for name in self.progress_attrs}
+            self._worker_channel.put((self.app_id, (self._worker_seq, update)))
+            return
+        self.last_used = time.time()
+        with self._version_lock:
+            self.state_version += 1
+            version = self.state_version
+        if self.event_bus is not None:
+            self.event_bus.publish(self.app_id, {"type": "status", "app_id": self.app_id, "version": version})
+            
+    def get_etag(self, variant: str = "") -> str:
+        """Get an entity tag for the current state version
+        
+        Read it before building the response it describes, so the tag can
+        only ever be older than the body, never newer.
+        """
+        etag = f"{self._state_epoch}-{self.state_version}"
+        return f"{etag}-{variant}" if variant else etag
+        
+            
+    @property
+    def busy(self) -> bool:
+        """Whether a run is in flight; a finished run stays running until it is stopped"""
+        return self.is_running and 0 <= self.progress < 100
+        
+    @property
+    def disk_usage(self) -> int:
+        """Bytes used by the files this app has written"""
+        return sum(self.file_sizes.values())
+        
+    @property
+    def intermediate_usage(self) -> int:
+        """Bytes used by this app's intermediate files"""
+        return self._intermediate_usage(self.file_sizes)
+        
+    @staticmethod
+    def _intermediate_usage(file_sizes: Dict[str, int]) -> int:
+        prefix = "intermediate" + os.sep
+        return sum(size for path, size in file_sizes.items() if path.startswith(prefix))
+        
+    def _record_file(self, file_path: str) -> None:
+        """Account for a file written under the app directory"""
+        self._count_written(os.path.relpath(file_path, self.app_dir), os.path.getsize(file_path))
+        
+    def _count_written(self, relative_path: str, size: int) -> None:
+        """Account for size bytes written to a path relative to the app directory"""
+        self.file_sizes[relative_path] = size
+        if self.metrics is not None:
+            self.metrics.write_size.observe(size, app=type(self).__name__, directory=relative_path.split(os.sep)[0])
+        
+    def remove_intermediate_files(self) -> int:
+        """Delete the intermediate files, keeping configs, inputs and final outputs
+        
+        Returns the number of bytes freed.
+        """
+        freed = self._remove_intermediates(self.app_dir, self.file_sizes)
+        self._mark_changed()
+        return freed
+        
+    @staticmethod
+    def _remove_intermediates(app_dir: str, file_sizes: Dict[str, int]) -> int:
+        """Delete the intermediate files of an app directory and drop them from file_sizes"""
+        intermediate_dir = os.path.join(app_dir, "intermediate")
+        if os.path.isdir(intermediate_dir):
+            with os.scandir(intermediate_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        os.remove(entry.path)
+        prefix = "intermediate" + os.sep
+        freed = 0
+        for path in [path for path in file_sizes if path.startswith(prefix)]:
+            freed += file_sizes.pop(path)
+        return freed
+        
+    @property
+    def processing_time(self) -> float:
+        """Total seconds spent in the stages of the current run"""
+        return sum(self.stage_timings.values())
+        
+    def check_cancelled(self) -> None:
+        """Raise AppCancelledError if the current run has been cancelled"""
+        self.cancel_token.raise_if_cancelled()
+        
+    @contextmanager
+    def _stage(self, name: str):
+        """Run a pipeline stage: check for cancellation first, then record its duration"""
+        self.check_cancelled()
+        self.on_stage_start(name)
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.on_stage_end(name, time.perf_counter() - started, e)
+            raise
+        duration = time.perf_counter() - started
+        self.on_stage_end(name, duration)
+        self.stage_timings[name] = duration
+        
+    def on_stage_start(self, name: str) -> None:
+        """Hook called when a pipeline stage starts"""
+        if self.metrics is not None:
+            self.metrics.stage_started(type(self).__name__, name)
+            
+    def on_stage_end(self, name: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        """Hook called when a pipeline stage ends, with the exception that ended it early, if any"""
+        if self.metrics is not None:
+            self.metrics.stage_finished(type(self).__name__, name, seconds, error)
+        
+    def _submit_work(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit background work to the shared worker pool
+        
+        Each submission starts a new run with a fresh cancellation token and
+        empty stage timings. With a process backend, bound methods of
+        process-safe apps run in a worker process; everything else runs on a
+        worker thread.
+        """
+        executor = self.executor or get_default_executor()
+        self.cancel_token = CancellationToken()
+        self.stage_timings = {}
+        if executor.backend == "process" and self.process_safe and getattr(fn, "__self__", None) is self:
+            channel = executor.progress_channel
+            self.cancel_token = CancellationToken(channel.create_event())
+            channel.register(self.app_id, self._apply_worker_update)
+            with self._worker_lock:
+                self._worker_seq = 0
+                
+            def apply_result(result):
+                channel.unregister(self.app_id)
+                self._apply_worker_update(result)
+                self._on_worker_result()
+                # Stage hooks do not run in worker processes; record the completed stages here
+                if self.metrics is not None:
+                    for name, seconds in self.stage_timings.items():
+                        self.metrics.record_stage(type(self).__name__, name, seconds)
+                self._mark_changed()
+                
+            return executor.submit_and_apply(
+                apply_result, _run_in_worker_process, self, fn.__name__, channel.queue, args, kwargs
+            )
+        return executor.submit_thread(fn, *args, **kwargs)
+        
+    def _cancel_work(self, future: Optional[Future], timeout: float = 5.0) -> bool:
+        """Cancel a submitted run and wait for it to reach a cancellation point
+        
+        Returns True if the run is no longer executing.
+        """
+        self.cancel_token.cancel()
+        if future is None or future.cancel():
+            return True
+        done, _ = wait([future], timeout=timeout)
+        return bool(done)
+        
+    def _apply_worker_update(self, update) -> None:
+        """Apply state relayed from a worker process, ignoring stale updates
+        
+        The change is published once all attributes are set, so subscribers
+        never see progress without the rest of the update.
+        """
+        seq, attrs = update
+        with self._worker_lock:
+            if seq <= self._worker_seq:
+                return
+            self._worker_seq = seq
+            for name, value in attrs.items():
+                # Set the state behind properties such as progress, which would publish each change
+                if isinstance(getattr(type(self), name, None), property):
+                    name = f"_{name}"
+                setattr(self, name, value)
+        self._mark_changed()
+                
+    def _on_worker_result(self) -> None:
+        """Hook to load outputs written by a worker process into the parent"""
+        pass
+        
+    def _reload_configs(self) -> None:
+        """Load every configuration file from config_dir"""
+        self.configs = {}
+        for filename in os.listdir(self.config_dir):
+            if filename.endswith(".json"):
+                self.get_config(filename[:-len(".json")])
+                
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Configs are re-read from config_dir in the worker process
+        state["configs"] = {}
+        # Worker processes write their files synchronously and bypass the result cache
+        for name in ("executor", "event_bus", "artifact_writer", "result_cache", "metrics", "memo_budget",
+                     "_worker_channel", "_worker_lock", "_version_lock", "_write_lock") + tuple(self.transient_attrs):
+            state[name] = None
+        state["_pending_writes"] = []
+        return state
+        
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._worker_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._write_lock = threading.Lock()
         
     def upload_config(self, config_name: str, config_data: Dict[str, Any]) -> None:
         """Upload configuration file"""
         print(f"config_name={config_name}")
         self.configs[config_name] = config_data
         
-        # Save config to file
+        # Save config to file (compact: configs may embed large payloads)
         config_path = os.path.join(self.config_dir, f"{config_name}.json")
         with open(config_path, "w") as f:
-            json.dump(config_data, f, indent=2)
+            json.dump(config_data, f, separators=(",", ":"))
+        self._record_file(config_path)
+        self._mark_changed()
+        
+    @contextmanager
+    def open_input_writer(self, filename: str):
+        """Open an input file for writing; it only appears under its name once fully written"""
+        if not self._is_plain_filename(filename):
+            raise ValueError(f"Invalid input file name: {filename}")
+        os.makedirs(self.input_dir, exist_ok=True)
+        file_path = os.path.join(self.input_dir, filename)
+        temp_path = f"{file_path}.part"
+        try:
+            with open(temp_path, "wb") as f:
+                yield f
+            os.replace(temp_path, file_path)
+            self._record_file(file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+            
+    def save_input_file(self, filename: str, stream: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+        """Stream binary input data to the input directory"""
+        with self.open_input_writer(filename) as f:
+            shutil.copyfileobj(stream, f, chunk_size)
+        return os.path.join(self.input_dir, filename)
+        
+    def resolve_input_file(self, filename: str) -> Optional[str]:
+        """Get the path of an uploaded input file, or None if there is no such file"""
+        if not self._is_plain_filename(filename):
+            return None
+        file_path = os.path.join(self.input_dir, filename)
+        return file_path if os.path.isfile(file_path) else None
         
     def get_config(self, config_name: str) -> Dict[str, Any]:
         """Get configuration file"""
@@ -34,33 +369,103 @@ class BaseApp(ABC):
                     self.configs[config_name] = json.load(f)
         return self.configs.get(config_name, {})
         
-    def save_intermediate_file(self, filename: str, content: Any) -> str:
-        """Save intermediate file"""
-        file_path = os.path.join(self.intermediate_dir, filename)
+    def _write_file(self, file_path: str, content: Any) -> str:
+        """Write a file atomically, behind the pipeline if a write-behind queue is set
+        
+        Content is serialized here, so the caller may change it afterwards.
+        """
         if isinstance(content, (dict, list)):
-            with open(file_path, "w") as f:
-                json.dump(content, f, indent=2)
+            data = json.dumps(content, indent=2).encode()
         elif isinstance(content, bytes):
-            with open(file_path, "wb") as f:
-                f.write(content)
+            data = content
         else:
-            with open(file_path, "w") as f:
-                f.write(str(content))
+            data = str(content).encode()
+        if self.artifact_writer is None:
+            write_atomic(file_path, data)
+        else:
+            future = self.artifact_writer.submit(file_path, data)
+            with self._write_lock:
+                self._pending_writes = [f for f in self._pending_writes if not f.done()] + [future]
+        self._count_written(os.path.relpath(file_path, self.app_dir), len(data))
         return file_path
         
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until every file saved so far is in place
+        
+        Re-raises the first error of a failed write-behind write.
+        """
+        with self._write_lock:
+            pending, self._pending_writes = self._pending_writes, []
+        for future in pending:
+            future.result(timeout=timeout)
+            
+    def _restore_cached_result(self, cache_key: Callable[[], Dict[str, Any]]) -> bool:
+        """Complete the run with the files and cache_attrs of an equal cached run
+        
+        cache_key returns the parameters and input digests that determine the
+        run's results; it is only called when a result cache is set, in a
+        "cache" stage. Returns False on a miss, and the run continues.
+        """
+        self._run_cache_key = None
+        if self.result_cache is None:
+            return False
+        with self._stage("cache"):
+            self._run_cache_key = cache_key()
+            cached = self.result_cache.restore(self._cache_type(), self._run_cache_key, self.app_dir)
+        if cached is None:
+            return False
+        attrs, file_sizes = cached
+        for name, value in attrs.items():
+            setattr(self, name, value)
+        self.file_sizes.update(file_sizes)
+        return True
+        
+    def _store_result(self) -> None:
+        """Add a completed run to the result cache, under the key of its lookup"""
+        if self.result_cache is None or self._run_cache_key is None:
+            return
+        self.flush()
+        attrs = {name: getattr(self, name) for name in self.cache_attrs}
+        self.result_cache.put(self._cache_type(), self._run_cache_key, self.app_dir, self.result_files(), attrs)
+        
+    @classmethod
+    def _cache_type(cls) -> str:
+        """The application type part of result cache keys"""
+        return f"{cls.__module__}.{cls.__qualname__}"
+        
+    def result_files(self) -> List[str]:
+        """Paths, relative to app_dir, of the output and intermediate files of the completed run"""
+        prefixes = ("output" + os.sep, "intermediate" + os.sep)
+        return [path for path in self.file_sizes
+                if path.startswith(prefixes) and os.path.basename(path) != "error.txt"]
+        
+    def save_intermediate_file(self, filename: str, content: Any) -> str:
+        """Save intermediate file"""
+        return self._write_file(os.path.join(self.intermediate_dir, filename), content)
+        
     def save_output_file(self, filename: str, content: Any) -> str:
         """Save output file"""
-        file_path = os.path.join(self.output_dir, filename)
-        if isinstance(content, (dict, list)):
-            with open(file_path, "w") as f:
-                json.dump(content, f, indent=2)
-        elif isinstance(content, bytes):
-            with open(file_path, "wb") as f:
-                f.write(content)
-        else:
-            with open(file_path, "w") as f:
-                f.write(str(content))
-        return file_path
+        return self._write_file(os.path.join(self.output_dir, filename), content)
+        
+    def file_url(self, filename: str) -> str:
+        """Get the API URL that serves one of this app's files"""
+        return f"/api/apps/{self.app_id}/files/{filename}"
+        
+    @staticmethod
+    def _is_plain_filename(filename: str) -> bool:
+        """Only plain file names: never let a request escape the app directory"""
+        return bool(filename) and filename == os.path.basename(filename) and not filename.startswith(".")
+        
+    def resolve_file(self, filename: str) -> Optional[str]:
+        """Get the path of an output or intermediate file, or None if there is no such file"""
+        if not self._is_plain_filename(filename):
+            return None
+        self.flush()
+        for directory in (self.output_dir, self.intermediate_dir):
+            file_path = os.path.join(directory, filename)
+            if os.path.isfile(file_path):
+                return file_path
+        return None
         
     @abstractmethod
     def validate_configs(self) -> bool:
@@ -78,8 +483,12 @@ class BaseApp(ABC):
         pass
         
     @abstractmethod
-    def get_status(self) -> Dict[str, Any]:
-        """Get current application status"""
+    def get_status(self, preview_version: Optional[int] = None) -> Dict[str, Any]:
+        """Get current application status
+        
+        The status carries a preview_version; previews are left out when the
+        caller passes the version it already has.
+        """
         pass
         
     @abstractmethod
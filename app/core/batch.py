@@ -0,0 +1,130 @@
+from typing import Dict, Any, List, Optional
+import threading
+import time
+import uuid
+
+from .base_app import BaseApp
+from .events import EventBus
+
+
+class _BatchEvents:
+    """Event bus of batch items: a change of any item is a change of its batch"""
+
+    def __init__(self, batch: "Batch"):
+        self.batch = batch
+
+    def publish(self, app_id: Optional[str], event: Dict[str, Any]) -> None:
+        self.batch._mark_changed()
+
+
+class Batch:
+    """Many inputs run by one application type over the shared worker pool
+
+    Items are application instances under one directory tree, without
+    registry records, manifests or event streams of their own: their state
+    changes are published once, as changes of the batch. The batch lives in
+    the worker process that created it.
+    """
+
+    def __init__(self, batch_id: str, app_type: str, batch_dir: str, event_bus: Optional[EventBus] = None):
+        self.batch_id = batch_id
+        self.app_type = app_type
+        self.batch_dir = batch_dir
+        self.event_bus = event_bus
+        self.events = _BatchEvents(self)
+        self.items: List[BaseApp] = []
+        self.created_at = time.time()
+        self.state_version = 0
+        self._state_epoch = uuid.uuid4().hex[:8]
+        self._version_lock = threading.Lock()
+
+    def _mark_changed(self) -> None:
+        with self._version_lock:
+            self.state_version += 1
+            version = self.state_version
+        if self.event_bus is not None:
+            self.event_bus.publish(self.batch_id, {"type": "status", "app_id": self.batch_id, "version": version})
+
+    def get_etag(self, variant: str = "") -> str:
+        """Get an entity tag for the current state version, as BaseApp.get_etag() does"""
+        etag = f"{self._state_epoch}-{self.state_version}"
+        return f"{etag}-{variant}" if variant else etag
+
+    def start(self) -> None:
+        """Submit every item to the worker pool"""
+        for item in self.items:
+            item.start()
+
+    def stop(self) -> None:
+        """Stop every running item"""
+        for item in self.items:
+            if item.is_running:
+                item.stop()
+
+    @property
+    def busy(self) -> bool:
+        """Whether any item has a run in flight"""
+        return any(item.busy for item in self.items)
+
+    @property
+    def last_used(self) -> float:
+        return max((item.last_used for item in self.items), default=self.created_at)
+
+    @property
+    def disk_usage(self) -> int:
+        """Bytes used by the files the items have written"""
+        return sum(item.disk_usage for item in self.items)
+
+    @property
+    def intermediate_usage(self) -> int:
+        return sum(item.intermediate_usage for item in self.items)
+
+    def remove_intermediate_files(self) -> int:
+        """Delete the intermediate files of every item; returns the number of bytes freed"""
+        return sum(item.remove_intermediate_files() for item in self.items)
+
+    @property
+    def done(self) -> bool:
+        """Whether every item has completed or failed"""
+        return all(item.progress in (100, -1) for item in self.items)
+
+    def get_status(self, preview_version: Optional[int] = None) -> Dict[str, Any]:
+        """Get the aggregated status; previews are left to the item status endpoints"""
+        progress = [item.progress for item in self.items]
+        return {
+            "batch_id": self.batch_id,
+            "app_type": self.app_type,
+            "total": len(progress),
+            "completed": progress.count(100),
+            "failed": progress.count(-1),
+            "running": sum(1 for item in self.items if item.busy),
+            "progress": sum(100 if p == -1 else p for p in progress) // max(len(progress), 1),
+            "done": self.done,
+            "items": [{"app_id": item.app_id, "progress": item.progress} for item in self.items]
+        }
+
+    def get_report(self) -> Dict[str, Any]:
+        """Get the reports of all items, with totals"""
+        items = []
+        for index, item in enumerate(self.items):
+            entry = {"index": index, "app_id": item.app_id, "progress": item.progress}
+            if item.progress == 100:
+                entry["report"] = item.get_report()
+            elif item.progress == -1:
+                error_path = item.resolve_file("error.txt")
+                if error_path is not None:
+                    with open(error_path, "r") as f:
+                        entry["error"] = f.read()
+                else:
+                    entry["error"] = "Run failed"
+            items.append(entry)
+        return {
+            "batch_id": self.batch_id,
+            "app_type": self.app_type,
+            "total": len(items),
+            "completed": sum(1 for entry in items if entry["progress"] == 100),
+            "failed": sum(1 for entry in items if entry["progress"] == -1),
+            "done": self.done,
+            "processing_time": sum(item.processing_time for item in self.items),
+            "items": items
+        }
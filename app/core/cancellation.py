@@ -0,0 +1,31 @@
+from typing import Optional
+import threading
+
+
+class AppCancelledError(Exception):
+    """Raised inside application work when its run has been cancelled"""
+    pass
+
+
+class CancellationToken:
+    """Cooperative cancellation flag checked by application pipelines
+
+    The underlying event may be a multiprocessing manager event, so a token
+    can be shared with work running in a worker process.
+    """
+
+    def __init__(self, event: Optional[threading.Event] = None):
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self) -> None:
+        """Request cancellation"""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """Raise AppCancelledError if cancellation was requested"""
+        if self._event.is_set():
+            raise AppCancelledError("Application run was cancelled")
@@ -0,0 +1,126 @@
+from typing import Iterator, Optional, Tuple, Union
+import json
+import os
+
+import numpy as np
+
+DATA_FORMATS = ("npy", "csv", "f32", "f64", "ndjson")
+
+_EXTENSIONS = {
+    ".npy": "npy",
+    ".csv": "csv",
+    ".f32": "f32",
+    ".f64": "f64",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson"
+}
+
+# Raw little-endian float arrays
+_BINARY_DTYPES = {"f32": np.dtype("<f4"), "f64": np.dtype("<f8")}
+
+
+def detect_format(filename: str, data_format: Optional[str] = None) -> Optional[str]:
+    """Get the format of a data file from an explicit name or its extension, or None if unsupported"""
+    if data_format is not None:
+        return data_format if data_format in DATA_FORMATS else None
+    return _EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def iter_chunks(path: str, data_format: str, chunk_size: int = 4 * 1024 * 1024,
+                column: Optional[Union[int, str]] = None) -> Iterator[Tuple[np.ndarray, int]]:
+    """Read a data file in chunks of about chunk_size bytes
+
+    Yields each chunk's values as a 1-D array together with the number of
+    bytes of the file consumed so far. column selects a CSV column (index
+    or header name) or an NDJSON object field.
+    """
+    if data_format == "npy":
+        yield from _iter_npy(path, chunk_size)
+    elif data_format in _BINARY_DTYPES:
+        yield from _iter_binary(path, _BINARY_DTYPES[data_format], chunk_size)
+    elif data_format == "csv":
+        yield from _iter_csv(path, chunk_size, column)
+    elif data_format == "ndjson":
+        yield from _iter_ndjson(path, chunk_size, column)
+    else:
+        raise ValueError(f"Unsupported data format: {data_format}")
+
+
+def _iter_npy(path: str, chunk_size: int) -> Iterator[Tuple[np.ndarray, int]]:
+    data = np.load(path, mmap_mode="r")
+    values = data.reshape(-1)
+    header_size = os.path.getsize(path) - data.nbytes
+    step = max(1, chunk_size // values.itemsize)
+    for start in range(0, values.size, step):
+        chunk = values[start:start + step]
+        yield chunk, header_size + (start + chunk.size) * values.itemsize
+
+
+def _iter_binary(path: str, dtype: np.dtype, chunk_size: int) -> Iterator[Tuple[np.ndarray, int]]:
+    # Whole values only, so a chunk never splits one
+    chunk_size = max(dtype.itemsize, chunk_size - chunk_size % dtype.itemsize)
+    with open(path, "rb") as f:
+        while True:
+            buffer = f.read(chunk_size)
+            if not buffer:
+                break
+            usable = len(buffer) - len(buffer) % dtype.itemsize
+            yield np.frombuffer(buffer[:usable], dtype=dtype), f.tell()
+
+
+def _iter_lines(path: str, chunk_size: int) -> Iterator[Tuple[list, int]]:
+    """Yield blocks of complete lines and the bytes consumed"""
+    with open(path, "rb") as f:
+        rest = b""
+        while True:
+            buffer = f.read(chunk_size)
+            if not buffer:
+                break
+            buffer = rest + buffer
+            end = buffer.rfind(b"\n") + 1
+            rest = buffer[end:]
+            if end:
+                yield buffer[:end].decode("utf-8").splitlines(), f.tell() - len(rest)
+        if rest.strip():
+            yield rest.decode("utf-8").splitlines(), f.tell()
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _iter_csv(path: str, chunk_size: int, column: Optional[Union[int, str]]) -> Iterator[Tuple[np.ndarray, int]]:
+    column_index = column if isinstance(column, int) else 0
+    first = True
+    for lines, consumed in _iter_lines(path, chunk_size):
+        if first:
+            first = False
+            fields = [field.strip() for field in lines[0].split(",")] if lines else []
+            if fields and not _is_number(fields[min(column_index, len(fields) - 1)]):
+                # Header row
+                if isinstance(column, str):
+                    if column not in fields:
+                        raise ValueError(f"Column not found: {column}")
+                    column_index = fields.index(column)
+                lines = lines[1:]
+            elif isinstance(column, str):
+                raise ValueError(f"Column {column} requires a header row")
+        if not lines:
+            continue
+        values = np.loadtxt(lines, delimiter=",", usecols=column_index, dtype=np.float64, ndmin=1)
+        yield values, consumed
+
+
+def _iter_ndjson(path: str, chunk_size: int, field: Optional[Union[int, str]]) -> Iterator[Tuple[np.ndarray, int]]:
+    field = field if field is not None else "value"
+    for lines, consumed in _iter_lines(path, chunk_size):
+        values = []
+        for line in lines:
+            if line.strip():
+                item = json.loads(line)
+                values.append(item[field] if isinstance(item, dict) else item)
+        yield np.array(values, dtype=np.float64), consumed
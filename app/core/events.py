@@ -0,0 +1,114 @@
+from typing import Dict, Any, Optional, Set
+import asyncio
+import queue
+import threading
+
+
+class Subscription:
+    """Queue of events for one subscriber, consumed from a thread
+
+    When the subscriber falls behind, the oldest events are dropped: events
+    only announce that state changed, so the latest one is what matters.
+    """
+
+    def __init__(self, bus: "EventBus", app_id: Optional[str], maxsize: int):
+        self.app_id = app_id
+        self._bus = bus
+        self._queue = queue.Queue(maxsize)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, or return None after timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        """Stop receiving events"""
+        self._bus.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class AsyncSubscription(Subscription):
+    """Queue of events for one subscriber, consumed from an asyncio event loop"""
+
+    def __init__(self, bus: "EventBus", app_id: Optional[str], maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.app_id = app_id
+        self._bus = bus
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        # Publishers run on worker threads; hand the event to the loop's thread
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The event loop has been closed
+            self.close()
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, or return None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Publishes application state changes to thread and asyncio subscribers"""
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, app_id: Optional[str] = None, maxsize: Optional[int] = None) -> Subscription:
+        """Subscribe to events of one application, or of all applications if app_id is None
+
+        maxsize overrides the bus default; 0 keeps every event.
+        """
+        subscription = Subscription(self, app_id, self.maxsize if maxsize is None else maxsize)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def subscribe_async(self, app_id: Optional[str] = None, loop: Optional[asyncio.AbstractEventLoop] = None,
+                        maxsize: Optional[int] = None) -> AsyncSubscription:
+        """Subscribe from a coroutine running on loop (default: the running loop)"""
+        subscription = AsyncSubscription(self, app_id, self.maxsize if maxsize is None else maxsize,
+                                         loop or asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, app_id: Optional[str], event: Dict[str, Any]) -> None:
+        """Deliver event to every subscriber of app_id, or only to subscribers of all applications if None"""
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.app_id is None or s.app_id == app_id]
+        for subscription in subscriptions:
+            subscription._deliver(event)
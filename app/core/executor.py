@@ -0,0 +1,228 @@
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+import multiprocessing
+import os
+import threading
+import time
+
+EXECUTOR_BACKENDS = ("thread", "process")
+
+
+class ProgressChannel:
+    """Relays state updates from worker processes back to their applications
+
+    Workers put ``(app_id, update)`` tuples on a manager queue; a listener
+    thread in the parent hands each update to the handler registered for
+    that application.
+    """
+
+    def __init__(self):
+        self._manager = multiprocessing.Manager()
+        self.queue = self._manager.Queue()
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._lock = threading.Lock()
+        self._listener = threading.Thread(target=self._listen, name="progress-channel", daemon=True)
+        self._listener.start()
+
+    def register(self, app_id: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        """Route updates for app_id to handler"""
+        with self._lock:
+            self._handlers[app_id] = handler
+
+    def unregister(self, app_id: str) -> None:
+        """Stop routing updates for app_id"""
+        with self._lock:
+            self._handlers.pop(app_id, None)
+
+    def create_event(self):
+        """Create an event that can be shared with worker processes"""
+        return self._manager.Event()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                item = self.queue.get()
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+            app_id, update = item
+            with self._lock:
+                handler = self._handlers.get(app_id)
+            if handler is not None:
+                try:
+                    handler(update)
+                except Exception as e:
+                    print(f"Error applying worker update for {app_id}: {str(e)}")
+
+    def close(self) -> None:
+        """Stop the listener and the manager process"""
+        try:
+            self.queue.put(None)
+            self._listener.join(timeout=1)
+        finally:
+            self._manager.shutdown()
+
+
+class AppExecutor:
+    """Bounded worker pool shared by all application instances
+
+    Work is admitted to the underlying pool only when a worker is free, so
+    queue depth and queue wait time can be measured the same way for both
+    the thread and the process backend. With the process backend, work
+    that cannot be pickled can still be run on threads with submit_thread();
+    both kinds of work share the same bound.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, backend: str = "thread"):
+        if backend not in EXECUTOR_BACKENDS:
+            raise ValueError(f"Unsupported executor backend: {backend}")
+        self.backend = backend
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="app-worker")
+        if backend == "process":
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._pool = self._thread_pool
+        self._channel: Optional[ProgressChannel] = None
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue work for execution and return its future
+
+        A future that is cancelled while still queued is never started.
+        With the process backend, fn and its arguments must be picklable.
+        """
+        return self._enqueue(self._pool, fn, args, kwargs)
+
+    def submit_and_apply(self, apply: Callable[[Any], Any], fn: Callable, *args, **kwargs) -> Future:
+        """Like submit(), but run apply(result) in this process before the future completes
+
+        The returned future resolves to the value returned by apply, so
+        anyone waiting on it observes the state apply has set up.
+        """
+        return self._enqueue(self._pool, fn, args, kwargs, apply)
+
+    def submit_thread(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue work that must run on a thread in this process"""
+        return self._enqueue(self._thread_pool, fn, args, kwargs)
+
+    def _enqueue(self, pool, fn: Callable, args, kwargs, apply: Optional[Callable] = None) -> Future:
+        future = Future()
+        with self._lock:
+            self._queue.append((future, pool, fn, args, kwargs, apply, time.monotonic()))
+            self._submitted += 1
+        self._dispatch()
+        return future
+
+    @property
+    def progress_channel(self) -> ProgressChannel:
+        """Channel worker processes use to report progress, created on first use"""
+        with self._lock:
+            if self._channel is None:
+                self._channel = ProgressChannel()
+            return self._channel
+
+    def _dispatch(self) -> None:
+        """Hand queued work to the pool while there are free workers"""
+        ready = []
+        with self._lock:
+            while self._queue and self._active < self.max_workers:
+                future, pool, fn, args, kwargs, apply, submitted_at = self._queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    self._cancelled += 1
+                    continue
+                wait = time.monotonic() - submitted_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._active += 1
+                ready.append((future, pool, fn, args, kwargs, apply))
+
+        # Submit outside the lock: done callbacks may run synchronously
+        for future, pool, fn, args, kwargs, apply in ready:
+            try:
+                inner = pool.submit(fn, *args, **kwargs)
+            except Exception as e:
+                self._finish(future, None, None, e)
+                continue
+            inner.add_done_callback(lambda inner, future=future, apply=apply: self._finish(future, inner, apply))
+
+    def _finish(self, future: Future, inner: Optional[Future], apply: Optional[Callable],
+                error: Optional[BaseException] = None) -> None:
+        """Propagate the pool result and admit the next queued item"""
+        result = None
+        if inner is not None:
+            error = inner.exception()
+        if error is None:
+            try:
+                result = inner.result()
+                if apply is not None:
+                    result = apply(result)
+            except Exception as e:
+                error = e
+        with self._lock:
+            self._active -= 1
+            self._completed += 1
+            if error is not None:
+                self._failed += 1
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, utilisation and wait time metrics"""
+        with self._lock:
+            started = self._submitted - len(self._queue) - self._cancelled
+            return {
+                "backend": self.backend,
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": len(self._queue),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "wait_time_avg": self._wait_total / started if started else 0.0,
+                "wait_time_max": self._wait_max,
+                "wait_time_total": self._wait_total
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancel queued work and shut down the worker pool"""
+        with self._lock:
+            queued = list(self._queue)
+            self._queue.clear()
+        cancelled = sum(1 for item in queued if item[0].cancel())
+        with self._lock:
+            self._cancelled += cancelled
+        self._pool.shutdown(wait=wait)
+        if self._pool is not self._thread_pool:
+            self._thread_pool.shutdown(wait=wait)
+        if self._channel is not None:
+            self._channel.close()
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor() -> AppExecutor:
+    """Get the executor used by applications created outside an AppManager"""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = AppExecutor()
+        return _default_executor
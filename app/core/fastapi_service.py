@@ -1,12 +1,19 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Callable
+import asyncio
+import os
+import time
 from pydantic import BaseModel
 
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse, FileResponse
 from fastapi.requests import Request
+from starlette.concurrency import run_in_threadpool
 
+from .app_manager import AppManager
+from .metrics import METRICS_CONTENT_TYPE, ServiceMetrics
+from .registry import AppOwnershipError
 from .web_service import WebService
 
 
@@ -16,14 +23,64 @@ class CreateAppRequest(BaseModel):
 class ConfigData(BaseModel):
     data: Dict[str, Any]
 
+class CreateBatchRequest(BaseModel):
+    app_type: str
+    items: List[Dict[str, Any]]
+    start: bool = True
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every request to its response headers, by route template
+    
+    Timing to the headers keeps event streams from counting as long requests.
+    """
+    def __init__(self, app, metrics: ServiceMetrics):
+        self.app = app
+        self.metrics = metrics
+        
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        
+        def record(status: int) -> None:
+            # Routing stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.request_duration.observe(time.perf_counter() - started, method=scope["method"],
+                                                  route=route, status=str(status))
+            
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+            
+        try:
+            await self.app(scope, receive, send_and_record)
+        except Exception:
+            record(500)
+            raise
+
 class FastAPIWebService(WebService):
-    def __init__(self, runtime_dir: str = "runtime"):
-        super().__init__(runtime_dir=runtime_dir)
+    """FastAPI front end
+    
+    Handlers stay on the event loop only for cheap bookkeeping; anything that
+    touches the disk or may burn CPU (app creation and deletion, config and
+    input writes, status and report building, stopping runs) is run in the
+    thread pool with run_in_threadpool so one slow call cannot stall the loop.
+    Application lookups query the registry and taking an application over
+    from another worker reloads it from disk, so get_app() and acquire_app()
+    are offloaded too.
+    """
+    def __init__(self, runtime_dir: str = "runtime", app_manager: Optional[AppManager] = None):
+        super().__init__(runtime_dir=runtime_dir, app_manager=app_manager)
         self.fastapi_app = FastAPI()
+        self.fastapi_app.add_middleware(RequestMetricsMiddleware, metrics=self.app_manager.metrics)
         
         # Set up static files and templates
-        self.templates = Jinja2Templates(directory="app/templates")
-        self.fastapi_app.mount("/static", StaticFiles(directory="app/static"), name="static")
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.templates = Jinja2Templates(directory=os.path.join(package_dir, "templates"))
+        self.fastapi_app.mount("/static", StaticFiles(directory=os.path.join(package_dir, "static"), check_dir=False),
+                               name="static")
         
         self._register_routes()
         
@@ -36,13 +93,40 @@ class FastAPIWebService(WebService):
         self.fastapi_app.delete("/api/apps/{app_id}")(self.delete_app)
         self.fastapi_app.get("/api/apps/types")(self.get_app_types)
         self.fastapi_app.get("/api/apps")(self.get_all_apps)
+        self.fastapi_app.get("/api/executor")(self.get_executor_stats)
+        self.fastapi_app.get("/api/cache")(self.get_cache_stats)
+        self.fastapi_app.get("/api/events")(self.stream_events)
+        self.fastapi_app.get("/metrics")(self.get_metrics)
         
         # Application operations
         self.fastapi_app.post("/api/apps/{app_id}/config/{config_name}")(self.upload_config)
+        self.fastapi_app.post("/api/apps/{app_id}/inputs/{filename}")(self.upload_input)
+        self.fastapi_app.put("/api/apps/{app_id}/inputs/{filename}")(self.upload_input)
         self.fastapi_app.post("/api/apps/{app_id}/start")(self.start_app)
         self.fastapi_app.post("/api/apps/{app_id}/stop")(self.stop_app)
         self.fastapi_app.get("/api/apps/{app_id}/status")(self.get_app_status)
         self.fastapi_app.get("/api/apps/{app_id}/report")(self.get_app_report)
+        self.fastapi_app.get("/api/apps/{app_id}/events")(self.stream_app_events)
+        self.fastapi_app.get("/api/apps/{app_id}/files/{filename}")(self.get_app_file)
+        
+        # Batches
+        self.fastapi_app.post("/api/batches")(self.create_batch)
+        self.fastapi_app.delete("/api/batches/{batch_id}")(self.delete_batch)
+        self.fastapi_app.post("/api/batches/{batch_id}/stop")(self.stop_batch)
+        self.fastapi_app.get("/api/batches/{batch_id}/status")(self.get_batch_status)
+        self.fastapi_app.get("/api/batches/{batch_id}/report")(self.get_batch_report)
+        self.fastapi_app.get("/api/batches/{batch_id}/events")(self.stream_batch_events)
+        
+    async def _get_app(self, app_id: str) -> Any:
+        """Look an application up in the thread pool, raising 404 if it does not exist
+        
+        With a shared registry the lookup is a database query, and it may load
+        a manifest from disk.
+        """
+        app = await run_in_threadpool(self.app_manager.get_app, app_id)
+        if app is None:
+            raise HTTPException(status_code=404, detail=f"Application not found: {app_id}")
+        return app
         
     async def index(self, request: Request):
         """Render homepage"""
@@ -50,88 +134,278 @@ class FastAPIWebService(WebService):
 
     async def create_app(self, request: CreateAppRequest) -> Dict[str, Any]:
         try:
-            app_id = self.app_manager.create_app_instance(request.app_type)
+            app_id = await run_in_threadpool(self.app_manager.create_app_instance, request.app_type)
             return {"app_id": app_id}
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
             
     async def delete_app(self, app_id: str) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
-        if error:
-            raise HTTPException(status_code=404, detail=error["error"])
-            
-        self.app_manager.delete_app(app_id)
+        await self._get_app(app_id)
+        try:
+            await run_in_threadpool(self.app_manager.delete_app, app_id)
+        except AppOwnershipError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         return {"message": "Application deleted"}
         
     async def upload_config(self, app_id: str, config_name: str, config: ConfigData) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
-        if error:
-            raise HTTPException(status_code=404, detail=error["error"])
-            
-        app = self.app_manager.get_app(app_id)
-        app.upload_config(config_name, config.data)
+        await self._get_app(app_id)
+        try:
+            app = await run_in_threadpool(self.app_manager.acquire_app, app_id)
+        except AppOwnershipError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        await run_in_threadpool(app.upload_config, config_name, config.data)
         return {"message": "Configuration uploaded"}
         
+    async def upload_input(self, app_id: str, filename: str, request: Request) -> Dict[str, Any]:
+        await self._get_app(app_id)
+        try:
+            app = await run_in_threadpool(self.app_manager.acquire_app, app_id)
+        except AppOwnershipError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        try:
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                # Multipart form upload (field "file"), spooled to disk by the parser
+                form = await request.form()
+                upload = form.get("file")
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(status_code=400, detail="Missing file field")
+                file_path = await run_in_threadpool(app.save_input_file, filename, upload.file)
+            else:
+                # Raw request body, written as it arrives
+                file_path = await self._write_input_stream(app, filename, request.stream())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        size = await run_in_threadpool(os.path.getsize, file_path)
+        return {"message": "Input uploaded", "filename": filename, "size": size}
+        
+    async def _write_input_stream(self, app, filename: str, stream) -> str:
+        """Write an async byte stream to an input file, doing all file I/O off the event loop"""
+        writer = app.open_input_writer(filename)
+        f = await run_in_threadpool(writer.__enter__)
+        try:
+            async for chunk in stream:
+                await run_in_threadpool(f.write, chunk)
+        except BaseException as e:
+            await run_in_threadpool(writer.__exit__, type(e), e, e.__traceback__)
+            raise
+        await run_in_threadpool(writer.__exit__, None, None, None)
+        return os.path.join(app.input_dir, filename)
+        
     async def start_app(self, app_id: str) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
-        if error:
-            raise HTTPException(status_code=404, detail=error["error"])
-            
-        app = self.app_manager.get_app(app_id)
+        await self._get_app(app_id)
+        try:
+            app = await run_in_threadpool(self.app_manager.acquire_app, app_id)
+        except AppOwnershipError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         if app.is_running:
             raise HTTPException(status_code=400, detail="Application is already running")
             
-        if not app.validate_configs():
+        if not await run_in_threadpool(app.validate_configs):
             raise HTTPException(status_code=400, detail="Configuration validation failed")
             
         try:
-            app.start()
+            await run_in_threadpool(app.start)
             return {"message": "Application started"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Start failed: {str(e)}")
             
     async def stop_app(self, app_id: str) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
-        if error:
-            raise HTTPException(status_code=404, detail=error["error"])
-            
-        app = self.app_manager.get_app(app_id)
+        app = await self._get_app(app_id)
         if not app.is_running:
             raise HTTPException(status_code=400, detail="Application is not running")
             
+        # Only the worker running the application can stop it
+        try:
+            app = await run_in_threadpool(self.app_manager.acquire_app, app_id)
+        except AppOwnershipError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+            
         try:
-            app.stop()
+            # stop() waits for the run to reach a cancellation point; an
+            # application taken over from another worker has already been reset
+            if app.is_running:
+                await run_in_threadpool(app.stop)
             return {"message": "Application stopped"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Stop failed: {str(e)}")
             
-    async def get_app_status(self, app_id: str) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
+    async def get_app_status(self, app_id: str, request: Request, preview_version: Optional[int] = None) -> Response:
+        app = await self._get_app(app_id)
+        return await self._conditional_json(
+            request,
+            self._status_etag(app, preview_version),
+            lambda: app.get_status(preview_version=preview_version)
+        )
+        
+    async def get_app_report(self, app_id: str, request: Request) -> Response:
+        app = await self._get_app(app_id)
+        return await self._conditional_json(request, app.get_etag("report"), app.get_report)
+        
+    async def get_app_file(self, app_id: str, filename: str) -> FileResponse:
+        app = await self._get_app(app_id)
+        file_path = await run_in_threadpool(app.resolve_file, filename)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+            
+        # FileResponse streams the file and handles Range requests
+        return FileResponse(file_path)
+        
+    async def stream_app_events(self, app_id: str, request: Request,
+                                preview_version: Optional[int] = None) -> StreamingResponse:
+        app = await self._get_app(app_id)
+        return self._event_stream(app_id, app, lambda: self.app_manager.get_app(app_id), request,
+                                  preview_version)
+        
+    def _event_stream(self, app_id: str, app: Any, lookup: Callable[[], Any], request: Request,
+                      preview_version: Optional[int]) -> StreamingResponse:
+        """Stream the status of an application or batch as server-sent events
+        
+        Only local changes are published on the event bus, so the application
+        is looked up again on every keep-alive: one owned by another worker is
+        a registry snapshot that has to be re-read to see its changes.
+        """
+        subscription = self.app_manager.event_bus.subscribe_async(app_id, asyncio.get_running_loop())
+        
+        async def generate():
+            nonlocal app, preview_version
+            sent_version = None
+            try:
+                while not await request.is_disconnected():
+                    # Events are coalesced: send one snapshot of the latest state
+                    version = app.state_version
+                    if version != sent_version:
+                        status = await run_in_threadpool(app.get_status, preview_version)
+                        yield self._sse_message("status", status, version)
+                        sent_version = version
+                        preview_version = status.get("preview_version")
+                        
+                    event = await subscription.get(timeout=self.sse_keepalive)
+                    if event is None:
+                        app = await run_in_threadpool(lookup)
+                        if app is None:
+                            yield self._sse_message("deleted", {"app_id": app_id})
+                            return
+                        yield ": keep-alive\n\n"
+                    elif event["type"] == "deleted":
+                        yield self._sse_message("deleted", {"app_id": app_id})
+                        return
+            finally:
+                subscription.close()
+                
+        return StreamingResponse(generate(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+    async def stream_events(self, request: Request) -> StreamingResponse:
+        """Stream the status of every application on one connection
+        
+        Each event carries its app_id. The stream opens with the status of all
+        applications, then sends those that change; every keep-alive checks all
+        of them again for changes made by other workers.
+        """
+        subscription = self.app_manager.event_bus.subscribe_async(maxsize=self.sse_all_apps_backlog)
+        
+        async def generate():
+            sent, preview_versions = {}, {}
+            try:
+                for message in await run_in_threadpool(self._status_messages, None, sent, preview_versions):
+                    yield message
+                while not await request.is_disconnected():
+                    event = await subscription.get(timeout=self.sse_keepalive)
+                    if event is None:
+                        messages = await run_in_threadpool(self._status_messages, None, sent, preview_versions)
+                        messages.append(": keep-alive\n\n")
+                    elif event["type"] == "shutdown":
+                        return
+                    else:
+                        messages = await run_in_threadpool(self._status_messages, [event["app_id"]], sent,
+                                                           preview_versions)
+                    for message in messages:
+                        yield message
+            finally:
+                subscription.close()
+                
+        return StreamingResponse(generate(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+    async def _conditional_json(self, request: Request, etag: str, build: Callable[[], Dict[str, Any]]) -> Response:
+        """Answer 304 if the client already has etag, otherwise build and tag the payload"""
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if self._etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        # Building and serializing the payload both happen off the event loop
+        return await run_in_threadpool(lambda: JSONResponse(content=build(), headers=headers))
+        
+    async def get_app_types(self) -> Dict[str, List[str]]:
+        return {"app_types": list(self.app_manager.get_app_types().keys())}
+        
+    async def get_all_apps(self) -> Dict[str, Dict[str, Any]]:
+        def collect():
+            apps_info = {}
+            for app_id, app in self.app_manager.get_all_apps().items():
+                apps_info[app_id] = {
+                    "is_running": app.is_running,
+                    "status": app.get_status()
+                }
+            return apps_info
+        return {"apps": await run_in_threadpool(collect)}
+        
+    async def get_executor_stats(self) -> Dict[str, Any]:
+        return self.app_manager.get_executor_stats()
+        
+    async def get_cache_stats(self) -> Dict[str, Any]:
+        return self.app_manager.get_cache_stats()
+        
+    async def get_metrics(self) -> Response:
+        return Response(self.app_manager.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+        
+    async def create_batch(self, request: CreateBatchRequest) -> Dict[str, Any]:
+        try:
+            batch_id = await run_in_threadpool(self.app_manager.create_batch, request.app_type, request.items,
+                                               request.start)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        batch = self.app_manager.get_batch(batch_id)
+        return {"batch_id": batch_id, "items": [item.app_id for item in batch.items]}
+        
+    async def delete_batch(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            raise HTTPException(status_code=404, detail=error["error"])
+            
+        await run_in_threadpool(self.app_manager.delete_batch, batch_id)
+        return {"message": "Batch deleted"}
+        
+    async def stop_batch(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
         if error:
             raise HTTPException(status_code=404, detail=error["error"])
             
-        app = self.app_manager.get_app(app_id)
-        return app.get_status()
+        await run_in_threadpool(self.app_manager.get_batch(batch_id).stop)
+        return {"message": "Batch stopped"}
         
-    async def get_app_report(self, app_id: str) -> Dict[str, Any]:
-        error = self._get_app_or_error(app_id)
+    async def get_batch_status(self, batch_id: str, request: Request) -> Response:
+        error = self._get_batch_or_error(batch_id)
         if error:
             raise HTTPException(status_code=404, detail=error["error"])
             
-        app = self.app_manager.get_app(app_id)
-        return app.get_report()
+        batch = self.app_manager.get_batch(batch_id)
+        return await self._conditional_json(request, batch.get_etag("status"), batch.get_status)
         
-    async def get_app_types(self) -> Dict[str, List[str]]:
-        return {"app_types": list(self.app_manager.get_app_types().keys())}
+    async def get_batch_report(self, batch_id: str, request: Request) -> Response:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            raise HTTPException(status_code=404, detail=error["error"])
+            
+        batch = self.app_manager.get_batch(batch_id)
+        return await self._conditional_json(request, batch.get_etag("report"), batch.get_report)
         
-    async def get_all_apps(self) -> Dict[str, Dict[str, Any]]:
-        apps_info = {}
-        for app_id, app in self.app_manager.get_all_apps().items():
-            apps_info[app_id] = {
-                "is_running": app.is_running,
-                "status": app.get_status()
-            }
-        return {"apps": apps_info}
+    async def stream_batch_events(self, batch_id: str, request: Request) -> StreamingResponse:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            raise HTTPException(status_code=404, detail=error["error"])
+            
+        return self._event_stream(batch_id, self.app_manager.get_batch(batch_id),
+                                  lambda: self.app_manager.get_batch(batch_id), request, None)
         
     def run(self, host: str = "0.0.0.0", port: int = 5000):
         import uvicorn
@@ -1,17 +1,38 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Callable
+import os
+import time
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, make_response, send_file
 
+from .app_manager import AppManager
+from .metrics import METRICS_CONTENT_TYPE
+from .registry import AppOwnershipError
 from .web_service import WebService
 
 class FlaskWebService(WebService):
-    def __init__(self, runtime_dir: str = "runtime"):
-        super().__init__(runtime_dir=runtime_dir)
+    def __init__(self, runtime_dir: str = "runtime", app_manager: Optional[AppManager] = None):
+        super().__init__(runtime_dir=runtime_dir, app_manager=app_manager)
         self.flask_app = Flask(__name__, 
                              template_folder='../templates',  # Set template directory
                              static_folder='../static')       # Set static file directory
+        # Time every request, by route template
+        self.flask_app.before_request(self._start_request_timer)
+        self.flask_app.after_request(self._record_request)
         self._register_routes()
         
+    def _start_request_timer(self) -> None:
+        g.request_started = time.perf_counter()
+        
+    def _record_request(self, response: Response) -> Response:
+        """Record the time to respond; streamed bodies are timed to their first byte"""
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            self.app_manager.metrics.request_duration.observe(
+                time.perf_counter() - started, method=request.method, route=route, status=str(response.status_code)
+            )
+        return response
+        
     def _register_routes(self):
         # Homepage route
         self.flask_app.route('/')(self.index)
@@ -21,13 +42,28 @@ class FlaskWebService(WebService):
         self.flask_app.route('/api/apps/<app_id>', methods=['DELETE'])(self.delete_app)
         self.flask_app.route('/api/apps/types', methods=['GET'])(self.get_app_types)
         self.flask_app.route('/api/apps', methods=['GET'])(self.get_all_apps)
+        self.flask_app.route('/api/executor', methods=['GET'])(self.get_executor_stats)
+        self.flask_app.route('/api/cache', methods=['GET'])(self.get_cache_stats)
+        self.flask_app.route('/api/events', methods=['GET'])(self.stream_events)
+        self.flask_app.route('/metrics', methods=['GET'])(self.get_metrics)
         
         # Application operations
         self.flask_app.route('/api/apps/<app_id>/config/<config_name>', methods=['POST'])(self.upload_config)
+        self.flask_app.route('/api/apps/<app_id>/inputs/<filename>', methods=['POST', 'PUT'])(self.upload_input)
         self.flask_app.route('/api/apps/<app_id>/start', methods=['POST'])(self.start_app)
         self.flask_app.route('/api/apps/<app_id>/stop', methods=['POST'])(self.stop_app)
         self.flask_app.route('/api/apps/<app_id>/status', methods=['GET'])(self.get_app_status)
         self.flask_app.route('/api/apps/<app_id>/report', methods=['GET'])(self.get_app_report)
+        self.flask_app.route('/api/apps/<app_id>/events', methods=['GET'])(self.stream_app_events)
+        self.flask_app.route('/api/apps/<app_id>/files/<filename>', methods=['GET'])(self.get_app_file)
+        
+        # Batches
+        self.flask_app.route('/api/batches', methods=['POST'])(self.create_batch)
+        self.flask_app.route('/api/batches/<batch_id>', methods=['DELETE'])(self.delete_batch)
+        self.flask_app.route('/api/batches/<batch_id>/stop', methods=['POST'])(self.stop_batch)
+        self.flask_app.route('/api/batches/<batch_id>/status', methods=['GET'])(self.get_batch_status)
+        self.flask_app.route('/api/batches/<batch_id>/report', methods=['GET'])(self.get_batch_report)
+        self.flask_app.route('/api/batches/<batch_id>/events', methods=['GET'])(self.stream_batch_events)
         
     def index(self):
         """Render homepage"""
@@ -50,7 +86,10 @@ class FlaskWebService(WebService):
         if error:
             return jsonify(error), 404
             
-        self.app_manager.delete_app(app_id)
+        try:
+            self.app_manager.delete_app(app_id)
+        except AppOwnershipError as e:
+            return jsonify({"error": str(e)}), 409
         return jsonify({"message": "Application deleted"})
         
     def upload_config(self, app_id: str, config_name: str) -> Dict[str, Any]:
@@ -62,16 +101,45 @@ class FlaskWebService(WebService):
         if not config_data:
             return jsonify({"error": "Missing configuration data"}), 400
             
-        app = self.app_manager.get_app(app_id)
+        try:
+            app = self.app_manager.acquire_app(app_id)
+        except AppOwnershipError as e:
+            return jsonify({"error": str(e)}), 409
         app.upload_config(config_name, config_data)
         return jsonify({"message": "Configuration uploaded"})
         
+    def upload_input(self, app_id: str, filename: str) -> Dict[str, Any]:
+        error = self._get_app_or_error(app_id)
+        if error:
+            return jsonify(error), 404
+            
+        # Multipart form upload (field "file") or the raw request body
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return jsonify({"error": "Missing file field"}), 400
+            stream = request.files['file'].stream
+        else:
+            stream = request.stream
+            
+        try:
+            app = self.app_manager.acquire_app(app_id)
+        except AppOwnershipError as e:
+            return jsonify({"error": str(e)}), 409
+        try:
+            file_path = app.save_input_file(filename, stream)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"message": "Input uploaded", "filename": filename, "size": os.path.getsize(file_path)})
+        
     def start_app(self, app_id: str) -> Dict[str, Any]:
         error = self._get_app_or_error(app_id)
         if error:
             return jsonify(error), 404
             
-        app = self.app_manager.get_app(app_id)
+        try:
+            app = self.app_manager.acquire_app(app_id)
+        except AppOwnershipError as e:
+            return jsonify({"error": str(e)}), 409
         if app.is_running:
             return jsonify({"error": "Application is already running"}), 400
             
@@ -93,8 +161,16 @@ class FlaskWebService(WebService):
         if not app.is_running:
             return jsonify({"error": "Application is not running"}), 400
             
+        # Only the worker running the application can stop it
         try:
-            app.stop()
+            app = self.app_manager.acquire_app(app_id)
+        except AppOwnershipError as e:
+            return jsonify({"error": str(e)}), 409
+            
+        try:
+            # An application taken over from another worker has already been reset
+            if app.is_running:
+                app.stop()
             return jsonify({"message": "Application stopped"})
         except Exception as e:
             return jsonify({"error": f"Stop failed: {str(e)}"}), 500
@@ -105,7 +181,11 @@ class FlaskWebService(WebService):
             return jsonify(error), 404
             
         app = self.app_manager.get_app(app_id)
-        return jsonify(app.get_status())
+        preview_version = request.args.get('preview_version', type=int)
+        return self._conditional_json(
+            self._status_etag(app, preview_version),
+            lambda: app.get_status(preview_version=preview_version)
+        )
         
     def get_app_report(self, app_id: str) -> Dict[str, Any]:
         error = self._get_app_or_error(app_id)
@@ -113,7 +193,106 @@ class FlaskWebService(WebService):
             return jsonify(error), 404
             
         app = self.app_manager.get_app(app_id)
-        return jsonify(app.get_report())
+        return self._conditional_json(app.get_etag("report"), app.get_report)
+        
+    def get_app_file(self, app_id: str, filename: str) -> Any:
+        error = self._get_app_or_error(app_id)
+        if error:
+            return jsonify(error), 404
+            
+        app = self.app_manager.get_app(app_id)
+        file_path = app.resolve_file(filename)
+        if file_path is None:
+            return jsonify({"error": f"File not found: {filename}"}), 404
+            
+        # conditional=True adds Range, ETag and Last-Modified handling
+        return send_file(file_path, conditional=True, max_age=0)
+        
+    def stream_app_events(self, app_id: str) -> Any:
+        error = self._get_app_or_error(app_id)
+        if error:
+            return jsonify(error), 404
+            
+        app = self.app_manager.get_app(app_id)
+        return self._event_stream(app_id, app, lambda: self.app_manager.get_app(app_id),
+                                  request.args.get('preview_version', type=int))
+        
+    def _event_stream(self, app_id: str, app: Any, lookup: Callable[[], Any],
+                      preview_version: Optional[int]) -> Response:
+        """Stream the status of an application or batch as server-sent events
+        
+        Only local changes are published on the event bus, so the application
+        is looked up again on every keep-alive: one owned by another worker is
+        a registry snapshot that has to be re-read to see its changes.
+        """
+        subscription = self.app_manager.event_bus.subscribe(app_id)
+        
+        def generate():
+            nonlocal app, preview_version
+            sent_version = None
+            try:
+                while True:
+                    # Events are coalesced: send one snapshot of the latest state
+                    version = app.state_version
+                    if version != sent_version:
+                        status = app.get_status(preview_version=preview_version)
+                        yield self._sse_message("status", status, version)
+                        sent_version = version
+                        preview_version = status.get("preview_version")
+                        
+                    event = subscription.get(timeout=self.sse_keepalive)
+                    if event is None:
+                        app = lookup()
+                        if app is None:
+                            yield self._sse_message("deleted", {"app_id": app_id})
+                            return
+                        yield ": keep-alive\n\n"
+                    elif event["type"] == "deleted":
+                        yield self._sse_message("deleted", {"app_id": app_id})
+                        return
+            finally:
+                subscription.close()
+                
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    def stream_events(self) -> Any:
+        """Stream the status of every application on one connection
+        
+        Each event carries its app_id. The stream opens with the status of all
+        applications, then sends those that change; every keep-alive checks all
+        of them again for changes made by other workers.
+        """
+        subscription = self.app_manager.event_bus.subscribe(maxsize=self.sse_all_apps_backlog)
+        
+        def generate():
+            sent, preview_versions = {}, {}
+            try:
+                yield from self._status_messages(None, sent, preview_versions)
+                while True:
+                    event = subscription.get(timeout=self.sse_keepalive)
+                    if event is None:
+                        yield from self._status_messages(None, sent, preview_versions)
+                        yield ": keep-alive\n\n"
+                    elif event["type"] == "shutdown":
+                        return
+                    else:
+                        yield from self._status_messages([event["app_id"]], sent, preview_versions)
+            finally:
+                subscription.close()
+                
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    def _conditional_json(self, etag: str, build: Callable[[], Dict[str, Any]]):
+        """Answer 304 if the client already has etag, otherwise build and tag the payload"""
+        if self._etag_matches(request.headers.get('If-None-Match'), etag):
+            response = make_response('', 304)
+        else:
+            response = jsonify(build())
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     def get_app_types(self) -> Dict[str, Any]:
         return jsonify({"app_types": list(self.app_manager.get_app_types().keys())})
@@ -127,6 +306,70 @@ class FlaskWebService(WebService):
             }
         return jsonify({"apps": apps_info})
         
+    def get_executor_stats(self) -> Dict[str, Any]:
+        return jsonify(self.app_manager.get_executor_stats())
+        
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return jsonify(self.app_manager.get_cache_stats())
+        
+    def get_metrics(self) -> Response:
+        return Response(self.app_manager.metrics.render(), content_type=METRICS_CONTENT_TYPE)
+        
+    def create_batch(self) -> Dict[str, Any]:
+        data = request.get_json()
+        if not data or not data.get('app_type'):
+            return jsonify({"error": "Missing app_type parameter"}), 400
+        items = data.get('items')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify({"error": "items must be a list of configurations"}), 400
+            
+        try:
+            batch_id = self.app_manager.create_batch(data['app_type'], items, start=data.get('start', True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        batch = self.app_manager.get_batch(batch_id)
+        return jsonify({"batch_id": batch_id, "items": [item.app_id for item in batch.items]})
+        
+    def delete_batch(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            return jsonify(error), 404
+            
+        self.app_manager.delete_batch(batch_id)
+        return jsonify({"message": "Batch deleted"})
+        
+    def stop_batch(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            return jsonify(error), 404
+            
+        self.app_manager.get_batch(batch_id).stop()
+        return jsonify({"message": "Batch stopped"})
+        
+    def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            return jsonify(error), 404
+            
+        batch = self.app_manager.get_batch(batch_id)
+        return self._conditional_json(batch.get_etag("status"), batch.get_status)
+        
+    def get_batch_report(self, batch_id: str) -> Dict[str, Any]:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            return jsonify(error), 404
+            
+        batch = self.app_manager.get_batch(batch_id)
+        return self._conditional_json(batch.get_etag("report"), batch.get_report)
+        
+    def stream_batch_events(self, batch_id: str) -> Any:
+        error = self._get_batch_or_error(batch_id)
+        if error:
+            return jsonify(error), 404
+            
+        return self._event_stream(batch_id, self.app_manager.get_batch(batch_id),
+                                  lambda: self.app_manager.get_batch(batch_id), None)
+        
     def run(self, host: str = "0.0.0.0", port: int = 5000):
         self.flask_app.run(host=host, port=port) 
 
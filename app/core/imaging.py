@@ -0,0 +1,83 @@
+from functools import lru_cache
+from typing import Tuple
+
+from PIL import Image, ImageEnhance, ImageStat
+
+# Modes whose bands are all 8-bit and where ImageEnhance leaves alpha untouched
+_LUT_MODES = {"L": 1, "LA": 1, "RGB": 3, "RGBA": 3}
+
+_IDENTITY = tuple(range(256))
+
+
+@lru_cache(maxsize=1)
+def _ramp() -> Image.Image:
+    """One pixel of every 8-bit value"""
+    ramp = Image.new("L", (256, 1))
+    ramp.putdata(_IDENTITY)
+    return ramp
+
+
+@lru_cache(maxsize=512)
+def _blend_lut(base: int, factor: float) -> Tuple[int, ...]:
+    """Value map of Image.blend(constant base image, image, factor)
+
+    Built by running Image.blend itself over every value, so applying it
+    reproduces the blend, including its rounding and clipping, bit for bit.
+    """
+    return tuple(Image.blend(Image.new("L", (256, 1), base), _ramp(), factor).tobytes())
+
+
+def _apply(image: Image.Image, lut: Tuple[int, ...]) -> Image.Image:
+    """Map the color bands of an image through lut in one pass, leaving alpha as is"""
+    color_bands = _LUT_MODES[image.mode]
+    alpha_bands = len(image.getbands()) - color_bands
+    return image.point(list(lut) * color_bands + list(_IDENTITY) * alpha_bands)
+
+
+def _mean_luminance(image: Image.Image) -> int:
+    """Rounded mean of the L conversion, the gray ImageEnhance.Contrast blends against"""
+    return int(ImageStat.Stat(image if image.mode == "L" else image.convert("L")).mean[0] + 0.5)
+
+
+def adjust_brightness(image: Image.Image, factor: float) -> Image.Image:
+    """ImageEnhance.Brightness(image).enhance(factor) as a single lookup table pass"""
+    if factor == 1:
+        return image
+    if image.mode not in _LUT_MODES:
+        return ImageEnhance.Brightness(image).enhance(factor)
+    return _apply(image, _blend_lut(0, factor))
+
+
+def adjust_contrast(image: Image.Image, factor: float) -> Image.Image:
+    """ImageEnhance.Contrast(image).enhance(factor) as a single lookup table pass"""
+    if factor == 1:
+        return image
+    if image.mode not in _LUT_MODES:
+        return ImageEnhance.Contrast(image).enhance(factor)
+    return _apply(image, _blend_lut(_mean_luminance(image), factor))
+
+
+def adjust_tone(image: Image.Image, brightness: float, contrast: float) -> Image.Image:
+    """Brightness then contrast, with the output of the two ImageEnhance calls in sequence
+
+    The two are never fused: contrast blends against the mean luminance of
+    the brightened image, which is only known once that image exists. Each
+    factor of 1 skips its lookup table pass.
+    """
+    return adjust_contrast(adjust_brightness(image, brightness), contrast)
+
+
+def adjust_sharpness(image: Image.Image, factor: float) -> Image.Image:
+    """ImageEnhance.Sharpness(image).enhance(factor): one smoothing convolution and a blend
+
+    Folding the blend into the convolution kernel would round differently,
+    so the two steps are kept; a factor of 1 skips both.
+    """
+    if factor == 1:
+        return image
+    return ImageEnhance.Sharpness(image).enhance(factor)
+
+
+def enhance(image: Image.Image, brightness: float, contrast: float, sharpness: float) -> Image.Image:
+    """Apply brightness, contrast and sharpness as the ImageEnhance chain does"""
+    return adjust_sharpness(adjust_tone(image, brightness, contrast), sharpness)
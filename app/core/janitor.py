@@ -0,0 +1,166 @@
+from typing import Dict, Any, List, Optional, Tuple, Union, TYPE_CHECKING
+import os
+import threading
+import time
+
+from .base_app import BaseApp
+from .batch import Batch
+from .registry import RemoteApp
+
+if TYPE_CHECKING:
+    from .app_manager import AppManager
+
+
+class RetentionPolicy:
+    """When finished applications and their files are removed from the runtime directory"""
+
+    def __init__(self, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                 keep_final_only: bool = False, interval: float = 60.0):
+        # Seconds a finished application or batch is kept after it was last used
+        self.ttl = ttl
+        # Disk quota for all applications; least recently used ones are trimmed, then evicted
+        self.max_bytes = max_bytes
+        # Delete the intermediate files of completed runs, keeping final outputs
+        self.keep_final_only = keep_final_only
+        # Seconds between janitor passes
+        self.interval = interval
+
+
+class Janitor:
+    """Applies a RetentionPolicy to the applications of an AppManager
+
+    Disk usage comes from the per-app accounting kept by BaseApp and the
+    registry, so a pass never walks the runtime directory. Batches of this
+    worker count and are removed as a whole, like applications.
+    Applications with work in flight are never touched, nor are
+    applications owned by other worker processes sharing the registry;
+    their own janitors manage them.
+    """
+
+    def __init__(self, manager: "AppManager", policy: RetentionPolicy):
+        self.manager = manager
+        self.policy = policy
+        self.stats = {"passes": 0, "evicted": 0, "trimmed": 0, "freed_bytes": 0}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Run passes in a background thread every policy.interval seconds"""
+        self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.policy.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in janitor pass: {str(e)}")
+
+    def run_once(self) -> Dict[str, int]:
+        """Apply the policy once and return what this pass removed"""
+        policy = self.policy
+        now = time.time()
+        result = {"evicted": 0, "trimmed": 0, "freed_bytes": 0}
+
+        apps: Dict[str, Union[BaseApp, RemoteApp, Batch]] = dict(self.manager.get_all_apps())
+        apps.update(dict(self.manager.batches))
+        total = sum(app.disk_usage for app in apps.values())
+        # Idle applications and batches this worker may change, least recently used first;
+        # those that have not run yet count against the quota but are kept until deleted
+        candidates: List[Tuple[str, Union[BaseApp, RemoteApp, Batch]]] = sorted(
+            ((app_id, app) for app_id, app in apps.items() if self._manageable(app) and self._finished(app)),
+            key=lambda item: item[1].last_used
+        )
+
+        # Bytes already trimmed per app; views of other workers' records are not refreshed
+        trimmed: Dict[str, int] = {}
+
+        def evict(app_id, app):
+            nonlocal total
+            if isinstance(app, RemoteApp):
+                freed = app.disk_usage - trimmed.get(app_id, 0)
+            else:
+                freed = app.disk_usage
+            if isinstance(app, Batch):
+                self.manager.delete_batch(app_id)
+            else:
+                self.manager.delete_app(app_id)
+            total -= freed
+            result["evicted"] += 1
+            result["freed_bytes"] += freed
+
+        def trim(app_id, app):
+            nonlocal total
+            if isinstance(app, Batch):
+                freed = app.remove_intermediate_files()
+            else:
+                freed = self.manager.remove_intermediate_files(app_id)
+            trimmed[app_id] = trimmed.get(app_id, 0) + freed
+            total -= freed
+            result["trimmed"] += 1
+            result["freed_bytes"] += freed
+
+        if policy.ttl is not None:
+            expired = [(app_id, app) for app_id, app in candidates if now - app.last_used > policy.ttl]
+            for app_id, app in expired:
+                evict(app_id, app)
+            candidates = [item for item in candidates if item not in expired]
+
+        if policy.keep_final_only:
+            for app_id, app in candidates:
+                if self._completed(app) and self._intermediate_left(app_id, app, trimmed):
+                    trim(app_id, app)
+
+        if policy.max_bytes is not None:
+            # Intermediate files go first, then whole applications
+            for app_id, app in candidates:
+                if total <= policy.max_bytes:
+                    break
+                if self._intermediate_left(app_id, app, trimmed):
+                    trim(app_id, app)
+            for app_id, app in candidates:
+                if total <= policy.max_bytes:
+                    break
+                evict(app_id, app)
+
+        self.stats["passes"] += 1
+        for key, value in result.items():
+            self.stats[key] += value
+        return result
+
+    @staticmethod
+    def _completed(app: Union[BaseApp, RemoteApp, Batch]) -> bool:
+        """Whether the last run completed; a batch once all of its items have run"""
+        return app.done if isinstance(app, Batch) else app.progress == 100
+
+    @staticmethod
+    def _finished(app: Union[BaseApp, RemoteApp, Batch]) -> bool:
+        """Whether a run has completed or failed; a batch once all of its items have run
+
+        Stopping a run resets its progress, so outputs left behind count too.
+        """
+        if isinstance(app, Batch):
+            return app.done
+        file_sizes = app.file_sizes if isinstance(app, BaseApp) else app.record.get("file_sizes") or {}
+        prefix = "output" + os.sep
+        return app.progress in (100, -1) or any(path.startswith(prefix) for path in file_sizes)
+
+    @staticmethod
+    def _intermediate_left(app_id: str, app: Union[BaseApp, RemoteApp, Batch], trimmed: Dict[str, int]) -> bool:
+        if not isinstance(app, RemoteApp):
+            return app.intermediate_usage > 0
+        return app_id not in trimmed and app.intermediate_usage > 0
+
+    def _manageable(self, app: Union[BaseApp, RemoteApp, Batch]) -> bool:
+        if app.busy:
+            return False
+        return not isinstance(app, RemoteApp) or app.owner is None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cumulative janitor counters"""
+        return dict(self.stats)
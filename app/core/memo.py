@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+import threading
+
+
+class MemoBudget:
+    """Bound on the memoized results all applications of a manager keep in memory
+
+    An application charges the size of its memo when a run completes, and
+    the memos of the least recently charged other applications are released
+    until the total fits in max_bytes. A run discharges its application's
+    memo before reading it, so a memo in use is never released; release
+    callbacks run under the budget's lock and must only drop references.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = {"charges": 0, "releases": 0}
+        # Size and release callback of each memo by owner, least recently charged first
+        self._entries: "OrderedDict[str, Tuple[int, Callable[[], None]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def charge(self, owner: str, size: int, release: Callable[[], None]) -> None:
+        """Record an owner's memo as the most recently used, releasing older ones over the budget"""
+        with self._lock:
+            self._pop(owner)
+            self._entries[owner] = (size, release)
+            self.bytes += size
+            self.stats["charges"] += 1
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._pop(next(iter(self._entries)))[1]()
+                self.stats["releases"] += 1
+
+    def discharge(self, owner: str) -> None:
+        """Stop accounting for an owner's memo: it is in use, dropped, or its owner is deleted"""
+        with self._lock:
+            self._pop(owner)
+
+    def _pop(self, owner: str) -> Tuple[int, Callable[[], None]]:
+        entry = self._entries.pop(owner, (0, lambda: None))
+        self.bytes -= entry[0]
+        return entry
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memo counts and the bytes charged"""
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes}
@@ -0,0 +1,301 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional
+import json
+import os
+import sqlite3
+import threading
+
+from .base_app import BaseApp
+
+REGISTRY_BACKENDS = ("memory", "sqlite")
+
+
+class AppOwnershipError(RuntimeError):
+    """Raised when an application can only be changed by the worker that owns it"""
+    pass
+
+
+class AppRegistry(ABC):
+    """Record of application instances and their latest status
+
+    Records are plain JSON-serializable dicts. A shared registry makes them
+    visible to every worker process serving the same runtime directory.
+    """
+
+    # Whether other worker processes see the same records
+    shared = False
+
+    @abstractmethod
+    def put(self, app_id: str, record: Dict[str, Any]) -> None:
+        """Create or replace the record of an application"""
+        pass
+
+    @abstractmethod
+    def add(self, app_id: str, record: Dict[str, Any]) -> bool:
+        """Create a record unless one already exists; returns whether it was created"""
+        pass
+
+    @abstractmethod
+    def update(self, app_id: str, fields: Dict[str, Any]) -> None:
+        """Merge fields into an existing record"""
+        pass
+
+    @abstractmethod
+    def swap(self, app_id: str, previous_owner: Optional[str], fields: Dict[str, Any]) -> bool:
+        """Merge fields into a record only if it is still owned by previous_owner"""
+        pass
+
+    @abstractmethod
+    def claim(self, app_id: str, owner: str, previous_owner: Optional[str]) -> bool:
+        """Make owner the owner of an application still owned by previous_owner
+
+        Returns False if the record has changed hands or the application is busy.
+        """
+        pass
+
+    @abstractmethod
+    def get(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """Get the record of an application"""
+        pass
+
+    @abstractmethod
+    def delete(self, app_id: str) -> None:
+        """Remove the record of an application"""
+        pass
+
+    @abstractmethod
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        """Get all records by application ID"""
+        pass
+
+    def close(self) -> None:
+        """Release any resources held by the registry"""
+        pass
+
+
+class MemoryRegistry(AppRegistry):
+    """In-process registry for single-worker deployments"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, app_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records[app_id] = dict(record)
+
+    def add(self, app_id: str, record: Dict[str, Any]) -> bool:
+        with self._lock:
+            if app_id in self._records:
+                return False
+            self._records[app_id] = dict(record)
+            return True
+
+    def update(self, app_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            if app_id in self._records:
+                self._records[app_id].update(fields)
+
+    def swap(self, app_id: str, previous_owner: Optional[str], fields: Dict[str, Any]) -> bool:
+        with self._lock:
+            record = self._records.get(app_id)
+            if record is None or record.get("owner") != previous_owner:
+                return False
+            record.update(fields)
+            return True
+
+    def claim(self, app_id: str, owner: str, previous_owner: Optional[str]) -> bool:
+        with self._lock:
+            record = self._records.get(app_id)
+            if record is None or record.get("owner") != previous_owner or record.get("busy"):
+                return False
+            record["owner"] = owner
+            return True
+
+    def get(self, app_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(app_id)
+            return dict(record) if record is not None else None
+
+    def delete(self, app_id: str) -> None:
+        with self._lock:
+            self._records.pop(app_id, None)
+
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {app_id: dict(record) for app_id, record in self._records.items()}
+
+
+class SQLiteRegistry(AppRegistry):
+    """Registry in a SQLite database shared by all worker processes on a host"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS apps ("
+                "app_id TEXT PRIMARY KEY, record TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, app_id: str, record: Dict[str, Any]) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO apps (app_id, record) VALUES (?, ?)",
+                (app_id, json.dumps(record))
+            )
+
+    def add(self, app_id: str, record: Dict[str, Any]) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO apps (app_id, record) VALUES (?, ?)",
+                (app_id, json.dumps(record))
+            )
+            return cursor.rowcount == 1
+
+    def update(self, app_id: str, fields: Dict[str, Any]) -> None:
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading so concurrent merges don't interleave
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM apps WHERE app_id = ?", (app_id,)).fetchone()
+            if row is None:
+                return
+            record = json.loads(row[0])
+            record.update(fields)
+            conn.execute("UPDATE apps SET record = ? WHERE app_id = ?", (json.dumps(record), app_id))
+
+    def swap(self, app_id: str, previous_owner: Optional[str], fields: Dict[str, Any]) -> bool:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM apps WHERE app_id = ?", (app_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[0])
+            if record.get("owner") != previous_owner:
+                return False
+            record.update(fields)
+            conn.execute("UPDATE apps SET record = ? WHERE app_id = ?", (json.dumps(record), app_id))
+            return True
+
+    def claim(self, app_id: str, owner: str, previous_owner: Optional[str]) -> bool:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM apps WHERE app_id = ?", (app_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[0])
+            if record.get("owner") != previous_owner or record.get("busy"):
+                return False
+            record["owner"] = owner
+            conn.execute("UPDATE apps SET record = ? WHERE app_id = ?", (json.dumps(record), app_id))
+            return True
+
+    def get(self, app_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT record FROM apps WHERE app_id = ?", (app_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, app_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM apps WHERE app_id = ?", (app_id,))
+
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._connect().execute("SELECT app_id, record FROM apps").fetchall()
+        return {app_id: json.loads(record) for app_id, record in rows}
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RemoteApp:
+    """Read-only view of an application this worker has not loaded
+
+    The application is owned by another worker process, or by none when it
+    was recovered from its manifest after a restart. Status, report and
+    entity tag come from its registry record; files are read from the
+    runtime directory.
+    """
+
+    def __init__(self, app_id: str, record: Dict[str, Any]):
+        self.app_id = app_id
+        self.record = record
+        self.app_dir = record["app_dir"]
+        self.output_dir = os.path.join(self.app_dir, "output")
+        self.intermediate_dir = os.path.join(self.app_dir, "intermediate")
+        self.owner = record.get("owner")
+
+    @property
+    def is_running(self) -> bool:
+        return self.record.get("is_running", False)
+
+    @property
+    def busy(self) -> bool:
+        """Whether the owning worker has work for this application in flight"""
+        return self.record.get("busy", False)
+
+    @property
+    def progress(self) -> int:
+        return self.record.get("progress", 0)
+
+    @property
+    def last_used(self) -> float:
+        return self.record.get("last_used", 0.0)
+
+    @property
+    def disk_usage(self) -> int:
+        return sum((self.record.get("file_sizes") or {}).values())
+
+    @property
+    def intermediate_usage(self) -> int:
+        return BaseApp._intermediate_usage(self.record.get("file_sizes") or {})
+
+    @property
+    def state_version(self) -> int:
+        return self.record.get("state_version", 0)
+
+    def get_etag(self, variant: str = "") -> str:
+        etag = self.record.get("etag", "")
+        return f"{etag}-{variant}" if variant else etag
+
+    def get_status(self, preview_version: Optional[int] = None) -> Dict[str, Any]:
+        return dict(self.record.get("status") or {})
+
+    def get_report(self) -> Dict[str, Any]:
+        return self.record.get("report") or {"error": "Report not available"}
+
+    def resolve_file(self, filename: str) -> Optional[str]:
+        if not BaseApp._is_plain_filename(filename):
+            return None
+        for directory in (self.output_dir, self.intermediate_dir):
+            file_path = os.path.join(directory, filename)
+            if os.path.isfile(file_path):
+                return file_path
+        return None
+
+
+def create_registry(backend: str, runtime_dir: str) -> AppRegistry:
+    """Create a registry backend by name"""
+    if backend == "memory":
+        return MemoryRegistry()
+    if backend == "sqlite":
+        os.makedirs(runtime_dir, exist_ok=True)
+        return SQLiteRegistry(os.path.join(runtime_dir, "registry.sqlite3"))
+    raise ValueError(f"Unsupported registry backend: {backend}")
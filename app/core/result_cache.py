@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    """Hard-link a file into place, copying it across file systems
+
+    The target is replaced atomically. Saved files are always replaced,
+    never rewritten in place, so a link never sees a later change.
+    """
+    directory, filename = os.path.split(target)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ResultCache:
+    """Content-addressed cache of completed runs, bounded in size with LRU eviction
+
+    An entry is keyed by the application type and a canonical hash of what
+    determines the run's results: its parameters and digests of its inputs.
+    It holds the run's output and intermediate files, linked from the app
+    directory, and the result attributes the app restores. The index is
+    kept in memory, so the cache directory does not outlive the process.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Entries by digest, least recently used first
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(app_type: str, key: Dict[str, Any]) -> str:
+        """Canonical hash of an application type and a cache key"""
+        canonical = json.dumps({"app_type": app_type, "key": key}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def restore(self, app_type: str, key: Dict[str, Any],
+                app_dir: str) -> Optional[Tuple[Dict[str, Any], Dict[str, int]]]:
+        """Link the files of a cached run into an app directory
+
+        Returns the cached result attributes and the sizes of the linked
+        files by path relative to app_dir, or None on a miss.
+        """
+        digest = self.digest(app_type, key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                try:
+                    for path in entry["files"]:
+                        _link_or_copy(os.path.join(self.cache_dir, digest, path), os.path.join(app_dir, path))
+                except OSError:
+                    self._remove(digest)
+                    entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.stats["hits"] += 1
+            return copy.deepcopy(entry["attrs"]), dict(entry["files"])
+
+    def put(self, app_type: str, key: Dict[str, Any], app_dir: str, files: Iterable[str],
+            attrs: Dict[str, Any]) -> bool:
+        """Add a completed run, evicting least recently used runs to stay within max_bytes
+
+        files are paths relative to app_dir. Returns False if the run is
+        already cached, larger than the whole cache, or its files are gone.
+        """
+        digest = self.digest(app_type, key)
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return False
+        # Link outside the lock; the entry only becomes visible once complete
+        temp_dir = os.path.join(self.cache_dir, f".{digest}.{uuid.uuid4().hex[:8]}.tmp")
+        sizes = {}
+        try:
+            for path in files:
+                target = os.path.join(temp_dir, path)
+                _link_or_copy(os.path.join(app_dir, path), target)
+                sizes[path] = os.path.getsize(target)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return False
+        size = sum(sizes.values())
+        with self._lock:
+            if size > self.max_bytes or digest in self._entries:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return False
+            os.makedirs(temp_dir, exist_ok=True)
+            os.replace(temp_dir, os.path.join(self.cache_dir, digest))
+            self._entries[digest] = {"files": sizes, "attrs": copy.deepcopy(attrs), "size": size}
+            self.bytes += size
+            self.stats["stores"] += 1
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def _remove(self, digest: str) -> None:
+        entry = self._entries.pop(digest)
+        self.bytes -= entry["size"]
+        shutil.rmtree(os.path.join(self.cache_dir, digest), ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit and miss counts and the size of the cache"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def clear(self) -> None:
+        """Drop every entry and remove the cache directory"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
@@ -0,0 +1,234 @@
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+import math
+
+import numpy as np
+
+# Metrics describe() and StreamingStatistics compute
+METRICS = ("mean", "median", "std", "variance", "min", "max", "percentiles", "histogram")
+
+Histogram = Tuple[np.ndarray, np.ndarray]
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream of chunks
+
+    Each chunk is reduced with vectorized numpy calls and merged into the
+    running totals with the parallel form of Welford's algorithm (Chan et
+    al.), which stays numerically stable however many values are streamed.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, chunk: np.ndarray) -> None:
+        n = chunk.size
+        if n == 0:
+            return
+        chunk_mean = float(np.mean(chunk, dtype=np.float64))
+        deviations = np.subtract(chunk, chunk_mean, dtype=np.float64)
+        chunk_m2 = float(np.dot(deviations, deviations))
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(chunk.min()))
+        self.max = max(self.max, float(chunk.max()))
+
+    @property
+    def variance(self) -> float:
+        """Population variance, as np.var computes it"""
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class StreamingHistogram:
+    """Bin counts over a range that grows to fit a stream of chunks
+
+    The range starts at the first chunk's extent. When a value falls outside
+    it, the bin width doubles and adjacent bins are merged, so memory stays
+    at one counter per bin and the counts are exact for the final edges.
+    """
+
+    def __init__(self, bins: int = 30):
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.low = None
+        self.width = None
+
+    @property
+    def high(self) -> float:
+        return self.low + self.bins * self.width
+
+    def update(self, chunk: np.ndarray) -> None:
+        if chunk.size == 0:
+            return
+        low, high = float(chunk.min()), float(chunk.max())
+        if self.low is None:
+            self.low = low
+            self.width = (high - low) / self.bins if high > low else max(abs(low), 1.0) / self.bins
+        while low < self.low:
+            self._grow(downward=True)
+        while high > self.high:
+            self._grow(downward=False)
+        indices = np.floor_divide(np.subtract(chunk, self.low, dtype=np.float64), self.width).astype(np.int64)
+        # The top edge belongs to the last bin, as in np.histogram
+        np.clip(indices, 0, self.bins - 1, out=indices)
+        self.counts += np.bincount(indices, minlength=self.bins)
+
+    def _grow(self, downward: bool) -> None:
+        """Double the bin width, extending the range below or above"""
+        padded = np.append(self.counts, 0) if self.bins % 2 else self.counts
+        merged = padded[0::2] + padded[1::2]
+        counts = np.zeros(self.bins, dtype=np.int64)
+        if downward:
+            self.low -= (self.bins - len(merged)) * 2 * self.width
+            counts[self.bins - len(merged):] = merged
+        else:
+            counts[:len(merged)] = merged
+        self.counts = counts
+        self.width *= 2
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the counts and bin edges, like np.histogram"""
+        return self.counts.copy(), np.linspace(self.low, self.high, self.bins + 1)
+
+
+class ReservoirSample:
+    """Uniform random sample of bounded size from a stream, for approximate quantiles
+
+    Quantiles are exact while the stream fits in the reservoir.
+    """
+
+    def __init__(self, size: int = 100_000, seed: int = 0):
+        self.size = size
+        self.sample = np.empty(size, dtype=np.float64)
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def exact(self) -> bool:
+        return self.seen <= self.size
+
+    def update(self, chunk: np.ndarray) -> None:
+        chunk = chunk.ravel()
+        filled = min(self.seen, self.size)
+        fill = min(chunk.size, self.size - filled)
+        self.sample[filled:filled + fill] = chunk[:fill]
+        rest = chunk[fill:]
+        if rest.size:
+            # Algorithm R, vectorized: value i of the stream (1-based) replaces
+            # a random slot with probability size / i
+            positions = np.arange(self.seen + fill + 1, self.seen + chunk.size + 1, dtype=np.float64)
+            accepted = self._rng.random(rest.size) * positions < self.size
+            slots = self._rng.integers(0, self.size, int(accepted.sum()))
+            self.sample[slots] = rest[accepted]
+        self.seen += chunk.size
+
+    def quantile(self, q: float) -> float:
+        return float(np.quantile(self.sample[:min(self.seen, self.size)], q))
+
+
+def _summarize(stats: RunningStats, metrics: Iterable[str], quantile: Callable[[float], float],
+               percentiles: Iterable[float]) -> Dict[str, Any]:
+    """Pick the requested metrics out of the running totals and quantiles"""
+    results = {}
+    if "mean" in metrics:
+        results["mean"] = stats.mean
+    if "median" in metrics:
+        results["median"] = quantile(0.5)
+    if "std" in metrics:
+        results["std"] = stats.std
+    if "variance" in metrics:
+        results["variance"] = stats.variance
+    if "min" in metrics:
+        results["min"] = stats.min
+    if "max" in metrics:
+        results["max"] = stats.max
+    if "percentiles" in metrics:
+        results["percentiles"] = {f"{p:g}": quantile(p / 100) for p in percentiles}
+    return results
+
+
+def _quantile_levels(metrics: Iterable[str], percentiles: Iterable[float]) -> List[float]:
+    levels = [0.5] if "median" in metrics else []
+    if "percentiles" in metrics:
+        levels.extend(p / 100 for p in percentiles)
+    return levels
+
+
+def describe(data: np.ndarray, metrics: Iterable[str], percentiles: Iterable[float] = (25, 75),
+             bins: int = 30, block_size: int = 64 * 1024) -> Tuple[Dict[str, Any], Optional[Histogram], RunningStats]:
+    """Compute the requested metrics of an in-memory array in as few passes as possible
+
+    Count, mean, variance, min and max come from one pass over cache-sized
+    blocks; the histogram reuses that range, so np.histogram makes a single
+    pass; every quantile is read from one np.partition of one copy. float32
+    data is never converted; sums are accumulated in float64.
+
+    Returns the results, the histogram counts and edges (None unless
+    requested) and the running totals.
+    """
+    metrics = set(metrics)
+    values = data.reshape(-1)
+    stats = RunningStats()
+    for start in range(0, values.size, block_size):
+        stats.update(values[start:start + block_size])
+
+    histogram = None
+    if "histogram" in metrics and values.size:
+        histogram = np.histogram(values, bins=bins, range=(stats.min, stats.max))
+
+    quantiles = {}
+    levels = _quantile_levels(metrics, percentiles)
+    if levels and values.size:
+        # Linear interpolation between closest ranks, as np.quantile and np.median do
+        positions = {level: (values.size - 1) * level for level in levels}
+        kth = sorted({math.floor(h) for h in positions.values()} | {math.ceil(h) for h in positions.values()})
+        ordered = np.partition(values, kth)
+        for level, h in positions.items():
+            low, high = float(ordered[math.floor(h)]), float(ordered[math.ceil(h)])
+            quantiles[level] = low + (h - math.floor(h)) * (high - low)
+
+    return _summarize(stats, metrics, quantiles.get, percentiles), histogram, stats
+
+
+class StreamingStatistics:
+    """describe() for data arriving in chunks: one pass, bounded memory
+
+    Quantiles come from a reservoir sample, so they are approximate once
+    more values than sample_size have been seen.
+    """
+
+    def __init__(self, metrics: Iterable[str], percentiles: Iterable[float] = (25, 75), bins: int = 30,
+                 sample_size: int = 100_000):
+        self.metrics = set(metrics)
+        self.percentiles = tuple(percentiles)
+        self.stats = RunningStats()
+        self.histogram = StreamingHistogram(bins) if "histogram" in self.metrics else None
+        self.sample = ReservoirSample(sample_size) if _quantile_levels(self.metrics, self.percentiles) else None
+
+    @property
+    def exact(self) -> bool:
+        """Whether the quantiles are exact"""
+        return self.sample is None or self.sample.exact
+
+    def update(self, chunk: np.ndarray) -> None:
+        self.stats.update(chunk)
+        if self.histogram is not None:
+            self.histogram.update(chunk)
+        if self.sample is not None:
+            self.sample.update(chunk)
+
+    def result(self) -> Tuple[Dict[str, Any], Optional[Histogram], RunningStats]:
+        """Get the results, histogram and running totals, like describe()"""
+        quantile = self.sample.quantile if self.sample is not None else None
+        histogram = self.histogram.result() if self.histogram is not None and self.stats.count else None
+        return _summarize(self.stats, self.metrics, quantile, self.percentiles), histogram, self.stats
@@ -1,11 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional
+import json
 
 from .app_manager import AppManager
+from .base_app import BaseApp
 
 class WebService(ABC):
-    def __init__(self, runtime_dir: str = "runtime"):
-        self.app_manager = AppManager(runtime_dir=runtime_dir)
+    # Seconds between keep-alive comments on idle event streams
+    sse_keepalive = 15.0
+    # Events queued for a stream of all applications before the oldest are dropped
+    sse_all_apps_backlog = 1024
+    
+    def __init__(self, runtime_dir: str = "runtime", app_manager: Optional[AppManager] = None):
+        self.app_manager = app_manager or AppManager(runtime_dir=runtime_dir)
         
     @abstractmethod
     def create_app(self, app_type: str) -> Dict[str, Any]:
@@ -22,6 +29,11 @@ class WebService(ABC):
         """Upload configuration file"""
         pass
         
+    @abstractmethod
+    def upload_input(self, app_id: str, filename: str) -> Dict[str, Any]:
+        """Upload a binary input file"""
+        pass
+        
     @abstractmethod
     def start_app(self, app_id: str) -> Dict[str, Any]:
         """Start application"""
@@ -52,6 +64,135 @@ class WebService(ABC):
         """Get all application instances"""
         pass
         
+    @abstractmethod
+    def get_app_file(self, app_id: str, filename: str) -> Any:
+        """Serve an output or intermediate file of an application"""
+        pass
+        
+    @abstractmethod
+    def stream_app_events(self, app_id: str) -> Any:
+        """Stream application status changes as server-sent events"""
+        pass
+        
+    @abstractmethod
+    def stream_events(self) -> Any:
+        """Stream the status changes of all applications as server-sent events tagged with their app_id"""
+        pass
+        
+    @abstractmethod
+    def get_executor_stats(self) -> Dict[str, Any]:
+        """Get worker pool metrics"""
+        pass
+        
+    @abstractmethod
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get result cache metrics"""
+        pass
+        
+    @abstractmethod
+    def get_metrics(self) -> Any:
+        """Render all metrics in the Prometheus text exposition format"""
+        pass
+        
+    @abstractmethod
+    def create_batch(self) -> Dict[str, Any]:
+        """Create and start a batch of one application type over many configs"""
+        pass
+        
+    @abstractmethod
+    def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
+        """Get the aggregated status of a batch"""
+        pass
+        
+    @abstractmethod
+    def get_batch_report(self, batch_id: str) -> Dict[str, Any]:
+        """Get the aggregated report of a batch"""
+        pass
+        
+    @abstractmethod
+    def stream_batch_events(self, batch_id: str) -> Any:
+        """Stream batch status changes as server-sent events"""
+        pass
+        
+    @abstractmethod
+    def stop_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Stop every running item of a batch"""
+        pass
+        
+    @abstractmethod
+    def delete_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Delete a batch and its files"""
+        pass
+        
+    @staticmethod
+    def _sse_message(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+        """Format one server-sent event"""
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return f"id: {event_id}\n{message}" if event_id is not None else message
+        
+    def _status_messages(self, app_ids: Optional[Iterable[str]], sent: Dict[str, str],
+                         preview_versions: Dict[str, Optional[int]]) -> List[str]:
+        """Status events of the applications that changed since they were last sent on a stream
+        
+        sent maps application IDs to the entity tag of the status last sent.
+        app_ids None checks every application, which also finds the changes and
+        deletions of other workers; otherwise only the given IDs are looked up.
+        Events of batches are left to their own streams.
+        """
+        messages = []
+        if app_ids is None:
+            apps = self.app_manager.get_all_apps()
+            gone = [app_id for app_id in sent if app_id not in apps]
+        else:
+            apps, gone = {}, []
+            for app_id in app_ids:
+                if self.app_manager.get_batch(app_id) is not None:
+                    continue
+                app = self.app_manager.get_app(app_id)
+                if app is not None:
+                    apps[app_id] = app
+                elif app_id in sent:
+                    gone.append(app_id)
+        for app_id in gone:
+            del sent[app_id]
+            preview_versions.pop(app_id, None)
+            messages.append(self._sse_message("deleted", {"app_id": app_id}))
+        for app_id, app in apps.items():
+            etag = app.get_etag()
+            if sent.get(app_id) == etag:
+                continue
+            status = app.get_status(preview_version=preview_versions.get(app_id))
+            sent[app_id] = etag
+            preview_versions[app_id] = status.get("preview_version")
+            messages.append(self._sse_message("status", {**status, "app_id": app_id}))
+        return messages
+        
+    @staticmethod
+    def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """Check an If-None-Match header value against an unquoted entity tag"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"') == etag:
+                return True
+        return False
+        
+    @staticmethod
+    def _status_etag(app: BaseApp, preview_version: Optional[int]) -> str:
+        """Get the entity tag of a status response, which varies with the preview the client has"""
+        return app.get_etag("status" if preview_version is None else f"status-{preview_version}")
+        
+    def _get_batch_or_error(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get an error message if the batch does not exist"""
+        if self.app_manager.get_batch(batch_id) is None:
+            return {"error": f"Batch not found: {batch_id}"}
+        return None
+        
     def _get_app_or_error(self, app_id: str) -> Optional[Dict[str, Any]]:
         """Get application instance or return error message if not exists"""
         app = self.app_manager.get_app(app_id)
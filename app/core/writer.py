@@ -0,0 +1,74 @@
+from concurrent.futures import Future
+from typing import Optional, Tuple
+import os
+import queue
+import threading
+import uuid
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write a file under a temporary name and rename it into place
+
+    Readers see either the previous file or the complete new one, never a
+    partial write.
+    """
+    directory, filename = os.path.split(path)
+    temp_path = os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ArtifactWriter:
+    """Write-behind queue for application artifacts
+
+    Files are written by one dedicated I/O thread in submission order, so
+    pipeline stages continue while earlier artifacts reach the disk. The
+    queue is bounded: when the disk falls behind, submit() blocks instead
+    of buffering without limit.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes, Future]]]" = queue.Queue(maxsize=max_pending)
+        self.stats = {"written": 0, "failed": 0, "bytes": 0}
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, data: bytes) -> Future:
+        """Queue a file write; the future completes once the file is in place"""
+        future = Future()
+        self._queue.put((path, data, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, data, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                write_atomic(path, data)
+            except Exception as e:
+                self.stats["failed"] += 1
+                future.set_exception(e)
+            else:
+                self.stats["written"] += 1
+                self.stats["bytes"] += len(data)
+                future.set_result(path)
+
+    @property
+    def pending(self) -> int:
+        """Number of queued writes"""
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Write everything queued, then stop the I/O thread"""
+        self._queue.put(None)
+        self._thread.join()
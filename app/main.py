@@ -1,26 +1,81 @@
 import os
 import argparse
 
-from app.core.flask_service import FlaskWebService
-from app.core.fastapi_service import FastAPIWebService
-from app.apps.image_processor import ImageProcessor
-from app.apps.data_analyzer import DataAnalyzer
+from app.core.app_manager import DEFAULT_MEMO_BUDGET_BYTES, AppManager
+from app.core.base_app import ARTIFACT_POLICIES
+from app.core.janitor import RetentionPolicy
+from app.core.registry import REGISTRY_BACKENDS, create_registry
 
-def create_app(framework="flask", runtime_dir="runtime"):
+# Built-in application types, imported with Pillow, numpy and matplotlib only when first created
+APP_TYPES = {
+    "image_processor": "app.apps.image_processor.ImageProcessor",
+    "data_analyzer": "app.apps.data_analyzer.DataAnalyzer"
+}
+
+def create_app(framework="flask", runtime_dir="runtime", workers=None, executor="thread", registry="memory",
+               retention=None, artifacts=None, write_behind=False, result_cache_mb=None, memo_budget_mb=None):
     """Create a web service instance"""
+    result_cache_bytes = int(result_cache_mb * 1024 * 1024) if result_cache_mb else None
+    memo_budget_bytes = int(memo_budget_mb * 1024 * 1024) if memo_budget_mb is not None else DEFAULT_MEMO_BUDGET_BYTES
+    app_manager = AppManager(runtime_dir=runtime_dir, max_workers=workers, executor_backend=executor,
+                             registry=create_registry(registry, runtime_dir), retention=retention,
+                             artifact_policy=artifacts, write_behind=write_behind,
+                             result_cache_bytes=result_cache_bytes, memo_budget_bytes=memo_budget_bytes)
+    # Only the selected framework is imported
     if framework.lower() == "flask":
-        service = FlaskWebService(runtime_dir=runtime_dir)
+        from app.core.flask_service import FlaskWebService
+        service = FlaskWebService(app_manager=app_manager)
     elif framework.lower() == "fastapi":
-        service = FastAPIWebService(runtime_dir=runtime_dir)
+        from app.core.fastapi_service import FastAPIWebService
+        service = FastAPIWebService(app_manager=app_manager)
     else:
         raise ValueError(f"Unsupported framework: {framework}")
         
     # Register application types
-    service.app_manager.register_app_type("image_processor", ImageProcessor)
-    service.app_manager.register_app_type("data_analyzer", DataAnalyzer)
+    for app_type_name, app_class in APP_TYPES.items():
+        service.app_manager.register_app_type(app_type_name, app_class)
     
     return service
     
+def create_retention_policy(ttl=None, disk_quota_mb=None, keep_final_only=False):
+    """Create a retention policy, or None if nothing is ever removed"""
+    if ttl is None and disk_quota_mb is None and not keep_final_only:
+        return None
+    max_bytes = int(disk_quota_mb * 1024 * 1024) if disk_quota_mb is not None else None
+    return RetentionPolicy(ttl=ttl, max_bytes=max_bytes, keep_final_only=keep_final_only)
+    
+def _env_float(name, default=None):
+    value = os.getenv(name)
+    return float(value) if value else default
+    
+def _env_flag(name, default=False):
+    value = os.getenv(name)
+    return value.lower() in ("1", "true", "yes") if value else default
+    
+def _create_app_from_env(framework):
+    """Create a web service configured from environment variables"""
+    return create_app(
+        framework,
+        runtime_dir=os.getenv("RUNTIME_DIR", "runtime"),
+        workers=int(os.getenv("WORKERS", 0)) or None,
+        executor=os.getenv("EXECUTOR", "thread").lower(),
+        registry=os.getenv("REGISTRY", "memory").lower(),
+        retention=create_retention_policy(_env_float("RETENTION_TTL"), _env_float("DISK_QUOTA_MB"),
+                                          _env_flag("KEEP_FINAL_ONLY")),
+        artifacts=os.getenv("ARTIFACTS", "").lower() or None,
+        write_behind=_env_flag("WRITE_BEHIND"),
+        result_cache_mb=_env_float("RESULT_CACHE_MB"),
+        memo_budget_mb=_env_float("MEMO_BUDGET_MB")
+    )
+    
+def create_wsgi_app():
+    """WSGI application factory for multi-worker servers, e.g. gunicorn -w 4 'app.main:create_wsgi_app()'"""
+    return _create_app_from_env("flask").flask_app
+    
+def create_asgi_app():
+    """ASGI application factory for multi-worker servers, e.g. uvicorn --factory app.main:create_asgi_app --workers 4"""
+    return _create_app_from_env("fastapi").fastapi_app
+    
 def main():
     """Main entry point"""
     # Parse command line arguments
@@ -33,6 +88,31 @@ def main():
                       help="Port to bind to (default: 5000)")
     parser.add_argument("--runtime-dir", default="runtime",
                       help="Directory for runtime files (default: runtime)")
+    parser.add_argument("--workers", type=int, default=None,
+                      help="Size of the shared application worker pool (default: cpu count + 4, max 32)")
+    parser.add_argument("--executor", default="thread", choices=["thread", "process"],
+                      help="Worker pool backend (default: thread)")
+    parser.add_argument("--registry", default="memory", choices=REGISTRY_BACKENDS,
+                      help="Application registry backend; use sqlite when several server "
+                           "processes share one runtime directory (default: memory)")
+    parser.add_argument("--retention-ttl", type=float, default=None,
+                      help="Seconds an idle application is kept after it was last used (default: forever)")
+    parser.add_argument("--disk-quota-mb", type=float, default=None,
+                      help="Disk quota for all applications in MB; least recently used ones are "
+                           "trimmed, then evicted (default: unlimited)")
+    parser.add_argument("--keep-final-only", action="store_true",
+                      help="Delete intermediate files once a run completes")
+    parser.add_argument("--artifacts", default=None, choices=ARTIFACT_POLICIES,
+                      help="Intermediate artifacts runs keep; applications may override it in "
+                           "their configs (default: all)")
+    parser.add_argument("--write-behind", action="store_true",
+                      help="Write application files from a dedicated I/O thread while pipelines continue")
+    parser.add_argument("--result-cache-mb", type=float, default=None,
+                      help="Size of the cache of completed runs in MB; runs with the same inputs and "
+                           "parameters complete from it (default: no cache)")
+    parser.add_argument("--memo-budget-mb", type=float, default=None,
+                      help="Memory for the stage outputs idle applications keep memoized for re-runs in MB; "
+                           "least recently used ones are released (default: 256)")
     
     args = parser.parse_args()
     
@@ -41,14 +121,29 @@ def main():
     host = os.getenv("HOST", args.host)
     port = int(os.getenv("PORT", args.port))
     runtime_dir = os.getenv("RUNTIME_DIR", args.runtime_dir)
+    workers = int(os.getenv("WORKERS", args.workers or 0)) or None
+    executor = os.getenv("EXECUTOR", args.executor).lower()
+    registry = os.getenv("REGISTRY", args.registry).lower()
+    retention = create_retention_policy(
+        _env_float("RETENTION_TTL", args.retention_ttl),
+        _env_float("DISK_QUOTA_MB", args.disk_quota_mb),
+        _env_flag("KEEP_FINAL_ONLY", args.keep_final_only)
+    )
+    artifacts = os.getenv("ARTIFACTS", args.artifacts or "").lower() or None
+    write_behind = _env_flag("WRITE_BEHIND", args.write_behind)
+    result_cache_mb = _env_float("RESULT_CACHE_MB", args.result_cache_mb)
+    memo_budget_mb = _env_float("MEMO_BUDGET_MB", args.memo_budget_mb)
     
     # Create service instance
-    service = create_app(framework, runtime_dir)
+    service = create_app(framework, runtime_dir, workers, executor, registry, retention, artifacts, write_behind,
+                         result_cache_mb, memo_budget_mb)
     
     # Start service
     print(f"Starting service with {framework} framework")
     print(f"Service running at http://{host}:{port}")
     print(f"Runtime directory: {runtime_dir}")
+    print(f"Worker pool: {service.app_manager.executor.max_workers} {executor} workers")
+    print(f"Application registry: {registry}")
     service.run(host=host, port=port)
     
 if __name__ == "__main__":
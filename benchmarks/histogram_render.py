@@ -0,0 +1,45 @@
+"""Compare histogram rendering paths: pyplot (the previous path), Figure and direct PNG
+
+Run from the repository root: python -m benchmarks.histogram_render
+"""
+from io import BytesIO
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from app.core.rendering import HISTOGRAM_RENDERERS, render_histogram
+
+
+def render_pyplot(counts, edges):
+    fig = plt.figure(figsize=(10, 6))
+    plt.hist(edges[:-1], bins=edges, weights=counts, edgecolor="black")
+    plt.title("Data Distribution Histogram")
+    plt.xlabel("Value")
+    plt.ylabel("Frequency")
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def timeit(render, repeat=20):
+    render()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    counts, edges = np.histogram(np.random.default_rng(0).normal(size=100_000), bins=30)
+    print(f"{'pyplot':>8}: {timeit(lambda: render_pyplot(counts, edges)):8.2f} ms")
+    for renderer in HISTOGRAM_RENDERERS:
+        ms = timeit(lambda: render_histogram(counts, edges, renderer, "Data Distribution Histogram", "Value", "Frequency"))
+        print(f"{renderer:>8}: {ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Measure cold start: a fresh interpreter importing app.main and creating the service
+
+Run from the repository root: python -m benchmarks.startup [--framework flask] [--max-seconds 1.0]
+Exits with status 1 when the median exceeds --max-seconds, to guard against import regressions.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = (
+    "from app.main import create_app\n"
+    "service = create_app({framework!r}, runtime_dir={runtime_dir!r})\n"
+    "service.app_manager.shutdown()\n"
+)
+
+
+def measure(framework, repeat):
+    timings = []
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        script = SCRIPT.format(framework=framework, runtime_dir=runtime_dir)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", script], check=True)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service cold start benchmark")
+    parser.add_argument("--framework", default="flask", choices=["flask", "fastapi"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    timings = measure(args.framework, args.repeat)
+    median = statistics.median(timings)
+    print(f"{args.framework} startup: median {median * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms")
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"Startup exceeds {args.max_seconds:.2f} s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
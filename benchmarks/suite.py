@@ -0,0 +1,232 @@
+"""Benchmark suite for both web services and both example applications
+
+Drives FlaskWebService and FastAPIWebService through their test clients, and
+ImageProcessor and DataAnalyzer directly through an AppManager. Reports
+request throughput and p50/p99 latency of create, status and report, image
+pipeline time per megapixel, analyzer time per million points and peak RSS.
+
+Run from the repository root: python -m benchmarks.suite [--json results.json] [--compare baseline.json]
+"""
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+import argparse
+import base64
+import datetime
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.core.app_manager import AppManager
+from app.core.statistics import METRICS
+from app.main import APP_TYPES, create_app
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    # Kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def latency(timings):
+    """Throughput and latency percentiles of sequential requests, in seconds each"""
+    timings = np.asarray(timings)
+    return {
+        "requests": len(timings),
+        "req_per_s": len(timings) / timings.sum(),
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p99_ms": float(np.percentile(timings, 99) * 1000)
+    }
+
+
+def json_body(response):
+    """Decode a JSON body from either a flask or an httpx test response"""
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+
+
+def make_client(service, framework):
+    if framework == "flask":
+        return service.flask_app.test_client()
+    from fastapi.testclient import TestClient
+    return TestClient(service.fastapi_app)
+
+
+def bench_service(framework, requests):
+    """Latency of create, status and report requests through a framework's test client"""
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        service = create_app(framework, runtime_dir=runtime_dir)
+        try:
+            client = make_client(service, framework)
+
+            def timed(request):
+                start = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - start
+                assert response.status_code == 200, response.status_code
+                return elapsed
+
+            create = [timed(lambda: client.post("/api/apps", json={"app_type": "data_analyzer"}))
+                      for _ in range(requests)]
+
+            app_id = json_body(client.post("/api/apps", json={"app_type": "data_analyzer"}))["app_id"]
+            config = {
+                "data": {"values": np.random.default_rng(0).normal(size=1000).tolist()},
+                "analysis": {"metrics": ["mean", "std", "median"]}
+            }
+            # The FastAPI service takes the config as the data field of its body
+            timed(lambda: client.post(f"/api/apps/{app_id}/config/default",
+                                      json=config if framework == "flask" else {"data": config}))
+            timed(lambda: client.post(f"/api/apps/{app_id}/start"))
+            deadline = time.time() + 60
+            while json_body(client.get(f"/api/apps/{app_id}/status"))["progress"] != 100:
+                assert time.time() < deadline, "analysis did not complete"
+                time.sleep(0.01)
+
+            status = [timed(lambda: client.get(f"/api/apps/{app_id}/status")) for _ in range(requests)]
+            report = [timed(lambda: client.get(f"/api/apps/{app_id}/report")) for _ in range(requests)]
+        finally:
+            service.app_manager.shutdown()
+    return {"create": latency(create), "status": latency(status), "report": latency(report)}
+
+
+def run_app(manager, app_type, config):
+    """Run a new application to completion; returns its wall time and stage timings"""
+    app = manager.get_app(manager.create_app_instance(app_type))
+    app.upload_config("default", config)
+    start = time.perf_counter()
+    app.start()
+    (app.processing_future if app_type == "image_processor" else app.analysis_future).result()
+    elapsed = time.perf_counter() - start
+    assert app.progress == 100, f"{app_type} run failed"
+    timings = dict(app.stage_timings)
+    manager.delete_app(app.app_id)
+    return elapsed, timings
+
+
+def bench_app(app_type, config, runs, unit):
+    """Mean wall time and stage timings of fresh runs, in milliseconds per unit of input"""
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        manager = AppManager(runtime_dir=runtime_dir)
+        manager.register_app_type(app_type, APP_TYPES[app_type])
+        try:
+            run_app(manager, app_type, config)  # warm up
+            results = [run_app(manager, app_type, config) for _ in range(runs)]
+        finally:
+            manager.shutdown()
+    stages = {name: np.mean([timings.get(name, 0.0) for _, timings in results]) * 1000 / unit
+              for name in results[0][1]}
+    return np.mean([elapsed for elapsed, _ in results]) * 1000 / unit, stages
+
+
+def bench_image_processor(width, height, runs, artifacts):
+    # A gradient with noise: JPEG cost depends on content, and pure noise is a worst case
+    x = np.linspace(0, 255, width)[None, :]
+    y = np.linspace(0, 255, height)[:, None]
+    gradient = np.stack(np.broadcast_arrays(x, y, 255 - x), axis=2)
+    pixels = np.clip(gradient + np.random.default_rng(0).normal(0, 8, gradient.shape), 0, 255)
+    buffer = BytesIO()
+    Image.fromarray(pixels.astype(np.uint8), "RGB").save(buffer, format="JPEG", quality=90)
+    config = {
+        "input": {"image_base64": base64.b64encode(buffer.getvalue()).decode()},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3},
+        "artifacts": artifacts
+    }
+    megapixels = width * height / 1e6
+    total, stages = bench_app("image_processor", config, runs, megapixels)
+    return {"megapixels": megapixels, "runs": runs, "artifacts": artifacts,
+            "ms_per_megapixel": total, "stage_ms_per_megapixel": stages}
+
+
+def bench_data_analyzer(points, runs):
+    config = {
+        "data": {"values": np.random.default_rng(0).normal(size=points).tolist()},
+        "analysis": {"metrics": list(METRICS)}
+    }
+    total, stages = bench_app("data_analyzer", config, runs, points / 1e6)
+    return {"points": points, "runs": runs,
+            "ms_per_million_points": total, "stage_ms_per_million_points": stages}
+
+
+def flatten(results, prefix=""):
+    """Numeric leaves of a result tree by dotted path"""
+    values = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def compare(baseline, results):
+    """Print every metric next to its baseline value"""
+    old, new = flatten({k: v for k, v in baseline.items() if k != "meta"}), flatten(
+        {k: v for k, v in results.items() if k != "meta"})
+    print(f"\n{'metric':<58} {'baseline':>12} {'current':>12} {'change':>8}")
+    for path in sorted(old.keys() | new.keys()):
+        before, after = (f"{values[path]:12.3f}" if path in values else f"{'-':>12}" for values in (old, new))
+        change = ""
+        if path in old and path in new and old[path]:
+            change = f"{(new[path] - old[path]) / old[path] * 100:+.1f}%"
+        print(f"{path:<58} {before} {after} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service and application benchmark suite")
+    parser.add_argument("--frameworks", default="flask,fastapi",
+                        help="Comma-separated web services to benchmark (default: flask,fastapi)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--image-size", default="2048x1536")
+    parser.add_argument("--image-runs", type=int, default=5)
+    parser.add_argument("--artifacts", default="all", help="Artifact policy of the image runs (default: all)")
+    parser.add_argument("--points", type=int, default=1_000_000, help="Values per analyzer run")
+    parser.add_argument("--analyzer-runs", type=int, default=5)
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    parser.add_argument("--compare", default=None, help="Compare with the results of an earlier --json run")
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.image_size.split("x"))
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        }
+    }
+    # Applications print every config upload
+    with redirect_stdout(StringIO()):
+        results["service"] = {framework: bench_service(framework, args.requests)
+                              for framework in args.frameworks.split(",") if framework}
+        results["image_processor"] = bench_image_processor(width, height, args.image_runs, args.artifacts)
+        results["data_analyzer"] = bench_data_analyzer(args.points, args.analyzer_runs)
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    for framework, endpoints in results["service"].items():
+        for endpoint, stats in endpoints.items():
+            print(f"{framework:>8} {endpoint:<7} {stats['req_per_s']:9.0f} req/s "
+                  f"p50 {stats['p50_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+    image = results["image_processor"]
+    print(f"image pipeline: {image['ms_per_megapixel']:.1f} ms/megapixel ({image['megapixels']:.1f} MP, "
+          f"artifacts {image['artifacts']})")
+    analyzer = results["data_analyzer"]
+    print(f"data analyzer: {analyzer['ms_per_million_points']:.1f} ms/million points ({analyzer['points']} points)")
+    print(f"peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import base64
+from contextlib import contextmanager
 from io import BytesIO
 import os
 import shutil
@@ -7,6 +8,9 @@ import pytest
 from PIL import Image
 import numpy as np
 
+from app.core.app_manager import AppManager
+from app.core.cancellation import AppCancelledError
+from app.core.executor import AppExecutor
 from app.core.flask_service import FlaskWebService
 from app.core.fastapi_service import FastAPIWebService
 from app.apps.image_processor import ImageProcessor
@@ -41,14 +45,22 @@ def flask_service(test_runtime_dir):
     service = FlaskWebService(runtime_dir=test_runtime_dir)
     service.app_manager.register_app_type("image_processor", ImageProcessor)
     service.app_manager.register_app_type("data_analyzer", DataAnalyzer)
-    return service
+    yield service
+    service.app_manager.shutdown()
     
 @pytest.fixture
 def fastapi_service(test_runtime_dir):
     service = FastAPIWebService(runtime_dir=test_runtime_dir)
     service.app_manager.register_app_type("image_processor", ImageProcessor)
     service.app_manager.register_app_type("data_analyzer", DataAnalyzer)
-    return service
+    yield service
+    service.app_manager.shutdown()
+    
+@pytest.fixture
+def fastapi_client(fastapi_service):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    return TestClient(fastapi_service.fastapi_app)
     
 def create_test_image():
     """Create a test image"""
@@ -83,6 +95,7 @@ def test_runtime_directory_structure(test_runtime_dir, flask_service):
     assert os.path.exists(os.path.join(app_dir, "config"))
     assert os.path.exists(os.path.join(app_dir, "intermediate"))
     assert os.path.exists(os.path.join(app_dir, "output"))
+    assert os.path.exists(os.path.join(app_dir, "input"))
     
     # Delete app and check directory is removed
     flask_service.app_manager.delete_app(app_id)
@@ -173,7 +186,7 @@ def test_image_processor(flask_service):
     assert "preview" in status
     
     report = app.get_report()
-    assert "processed_image" in report
+    assert "processed_image_url" in report
     assert "enhancement_params" in report
     assert "output_files" in report
     assert "final_result" in report["output_files"]
@@ -220,12 +233,12 @@ def test_data_analyzer(flask_service):
     status = app.get_status()
     assert status["progress"] == 100
     assert "partial_results" in status
-    assert "plot" in status
+    assert "plot_url" in status
     
     report = app.get_report()
     assert "data_info" in report
     assert "analysis_results" in report
-    assert "plot" in report
+    assert "plot_url" in report
     assert "output_files" in report
     assert "data" in report["output_files"]
     assert "results" in report["output_files"]
@@ -241,6 +254,17 @@ def test_data_analyzer(flask_service):
     app.stop()
     assert app.is_running is False
     
+    # an empty dataset fails the run rather than reporting non-finite statistics
+    app.upload_config("default", {"data": {"values": []}, "analysis": {"metrics": ["mean", "std", "median"]}})
+    app.validate_configs()
+    app.start()
+    with pytest.raises(ValueError, match="No values"):
+        app.analysis_future.result(timeout=10)
+    assert app.get_status()["progress"] == -1
+    with open(os.path.join(app.output_dir, "error.txt")) as f:
+        assert f.read() == "No values in data.values"
+    app.stop()
+    
 def test_invalid_configs(test_app_dir):
     """test invalid configs"""
     # create image processor app
@@ -269,5 +293,1462 @@ def test_invalid_configs(test_app_dir):
     # test invalid data analyzer configs
     app.upload_config("data", {"wrong_key": []})
     app.upload_config("analysis", {"metrics": ["invalid_metric"]})
-    assert app.validate_configs() is False 
+    assert app.validate_configs() is False
+
+def test_app_executor():
+    """test bounded worker pool and its metrics"""
+    import threading
+    executor = AppExecutor(max_workers=1)
+    release = threading.Event()
+    
+    # the second and third jobs must wait for the single worker
+    futures = [executor.submit(release.wait, 5) for _ in range(3)]
+    stats = executor.get_stats()
+    assert stats["active"] == 1
+    assert stats["queued"] == 2
+    
+    # a queued job can be cancelled before it starts
+    assert futures[2].cancel() is True
+    
+    release.set()
+    assert futures[0].result(timeout=5) is True
+    assert futures[1].result(timeout=5) is True
+    
+    stats = executor.get_stats()
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
+    assert stats["completed"] == 2
+    assert stats["cancelled"] == 1
+    assert stats["wait_time_max"] >= 0
+    executor.shutdown()
+    
+def test_apps_share_manager_executor(flask_service):
+    """test application instances submit to the manager's worker pool"""
+    app_id = flask_service.app_manager.create_app_instance("data_analyzer")
+    app = flask_service.app_manager.get_app(app_id)
+    assert app.executor is flask_service.app_manager.executor
+    
+    app.upload_config("default", {"data": {"values": [1, 2, 3]}, "analysis": {"metrics": ["mean"]}})
+    assert app.validate_configs() is True
+    app.start()
+    app.analysis_future.result(timeout=10)
+    assert app.get_status()["progress"] == 100
+    
+    stats = flask_service.flask_app.test_client().get("/api/executor").get_json()
+    assert stats["backend"] == "thread"
+    assert stats["completed"] == 1
+    app.stop()
+    
+def test_process_backend(test_runtime_dir):
+    """test process-safe apps run in worker processes and report back"""
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=2, executor_backend="process")
+    manager.register_app_type("image_processor", ImageProcessor)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    try:
+        image_app = manager.get_app(manager.create_app_instance("image_processor"))
+        image_app.upload_config("default", {
+            "input": {"image_base64": create_test_image()},
+            "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+        })
+        data_app = manager.get_app(manager.create_app_instance("data_analyzer"))
+        data_app.upload_config("default", {
+            "data": {"values": [1, 2, 3, 4, 5]},
+            "analysis": {"metrics": ["mean", "median", "std", "histogram"]}
+        })
+        assert data_app.validate_configs() is True
+        
+        image_app.start()
+        data_app.start()
+        image_app.processing_future.result(timeout=60)
+        data_app.analysis_future.result(timeout=60)
+        
+        # progress and results flow back to the parent's status
+        status = image_app.get_status()
+        assert status["progress"] == 100
+        assert "preview" in status
+        assert "processed_image_url" in image_app.get_report()
+        
+        status = data_app.get_status()
+        assert status["progress"] == 100
+        assert status["partial_results"]["mean"] == 3.0
+        assert "plot_url" in status
+        assert data_app.get_report()["analysis_results"]["median"] == 3.0
+    finally:
+        manager.shutdown()
+        
+def test_worker_update_publishes_once(test_runtime_dir):
+    """test state relayed from a worker process is set as a whole before one change is published"""
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1)
+    manager.register_app_type("image_processor", ImageProcessor)
+    try:
+        app = manager.get_app(manager.create_app_instance("image_processor"))
+        version = app.state_version
+        with manager.event_bus.subscribe(app.app_id) as subscription:
+            app._apply_worker_update((1, {"progress": 40, "stage_timings": {"decode": 0.1},
+                                          "preview": "thumbnail", "preview_version": 2}))
+            assert subscription.get(timeout=1)["version"] == version + 1
+            assert subscription.get(timeout=0.01) is None
+            assert (app.progress, app.preview, app.preview_version) == (40, "thumbnail", 2)
+            
+            # stale updates are ignored
+            app._apply_worker_update((1, {"progress": 20}))
+            assert subscription.get(timeout=0.01) is None
+            assert app.progress == 40
+    finally:
+        manager.shutdown()
+        
+def test_stop_cancels_run(test_runtime_dir):
+    """test stop aborts a run and completed runs record stage timings"""
+    import threading
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1)
+    manager.register_app_type("image_processor", ImageProcessor)
+    app_id = manager.create_app_instance("image_processor")
+    app = manager.get_app(app_id)
+    app.upload_config("default", {
+        "input": {"image_base64": create_test_image()},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    })
+    
+    # occupy the only worker so the run is still queued when stopped
+    release = threading.Event()
+    manager.executor.submit(release.wait, 5)
+    app.start()
+    app.stop()
+    release.set()
+    assert app.processing_future.cancelled()
+    assert app.is_running is False
+    assert not os.path.exists(os.path.join(test_runtime_dir, app_id, "output", "final_result.jpg"))
+    
+    # a new run completes and reports measured stage timings
+    app.start()
+    app.processing_future.result(timeout=10)
+    report = app.get_report()
+    assert set(report["stage_timings"]) == {"decode", "brightness", "contrast", "sharpness", "save_result"}
+    assert report["processing_time"] == pytest.approx(sum(report["stage_timings"].values()))
+    
+    # pipelines check the token at every stage boundary
+    app.cancel_token.cancel()
+    with pytest.raises(AppCancelledError):
+        with app._stage("sharpness"):
+            pass
+    app.stop()
+    manager.shutdown()
+    
+def test_status_preview_cache(flask_service):
+    """test previews are encoded once per stage and skipped when unchanged"""
+    app_id = flask_service.app_manager.create_app_instance("image_processor")
+    app = flask_service.app_manager.get_app(app_id)
+    app.upload_config("default", {
+        "input": {"image_base64": create_test_image()},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    })
+    app.start()
+    app.processing_future.result(timeout=10)
+    
+    # one preview per enhancement stage
+    status = app.get_status()
+    assert status["preview_version"] == 3
+    assert app.get_status()["preview"] is status["preview"]
+    
+    client = flask_service.flask_app.test_client()
+    response = client.get(f"/api/apps/{app_id}/status?preview_version=3")
+    assert response.status_code == 200
+    assert "preview" not in response.get_json()
+    response = client.get(f"/api/apps/{app_id}/status?preview_version=2")
+    assert response.get_json()["preview"] == status["preview"]
+    app.stop()
+    
+    # preview versions keep counting across runs, so a plot from an earlier run is never taken as current
+    app_id = flask_service.app_manager.create_app_instance("data_analyzer")
+    app = flask_service.app_manager.get_app(app_id)
+    for values in ([1, 2, 3], [4, 5, 6]):
+        app.upload_config("default", {"data": {"values": values}, "analysis": {"metrics": ["histogram"]}})
+        app.validate_configs()
+        app.start()
+        app.analysis_future.result(timeout=10)
+        version = app.get_status()["preview_version"]
+        app.stop()
+    assert version == 2
+    assert app.get_status(preview_version=1)["plot_url"].endswith("?v=2")
+    
+def _json(response):
+    """Decode a JSON body from either a flask or an httpx test response"""
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+    
+def _body(response):
+    """Get the raw body from either a flask or an httpx test response"""
+    return response.data if hasattr(response, "get_json") else response.content
+    
+def _check_conditional_status(client, app_manager):
+    """Shared checks for ETag support on the status and report endpoints"""
+    app_id = app_manager.create_app_instance("data_analyzer")
+    app = app_manager.get_app(app_id)
+    app.upload_config("default", {"data": {"values": [1, 2, 3]}, "analysis": {"metrics": ["mean"]}})
+    
+    response = client.get(f"/api/apps/{app_id}/status")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    
+    # unchanged state answers 304 without building the status
+    original_get_status = app.get_status
+    app.get_status = None
+    response = client.get(f"/api/apps/{app_id}/status", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    app.get_status = original_get_status
+    
+    # any state change produces a new entity tag
+    app.validate_configs()
+    app.start()
+    app.analysis_future.result(timeout=10)
+    response = client.get(f"/api/apps/{app_id}/status", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert _json(response)["progress"] == 100
+    
+    response = client.get(f"/api/apps/{app_id}/report")
+    assert response.status_code == 200
+    response = client.get(f"/api/apps/{app_id}/report", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    app.stop()
+    
+def test_flask_conditional_get(flask_service):
+    """test ETag / If-None-Match on flask status and report endpoints"""
+    _check_conditional_status(flask_service.flask_app.test_client(), flask_service.app_manager)
+    
+def test_fastapi_conditional_get(fastapi_service, fastapi_client):
+    """test ETag / If-None-Match on fastapi status and report endpoints"""
+    _check_conditional_status(fastapi_client, fastapi_service.app_manager)
+    
+def _read_sse(lines):
+    """Parse (event, data) pairs from an iterator of server-sent event lines"""
+    import json
+    event = None
+    for line in lines:
+        line = line.decode() if isinstance(line, bytes) else line
+        for part in line.splitlines():
+            if part.startswith("event: "):
+                event = part[len("event: "):]
+            elif part.startswith("data: "):
+                yield event, json.loads(part[len("data: "):])
+                
+def _check_event_stream(lines, app_manager, app_id):
+    """Shared checks for the status event stream"""
+    app = app_manager.get_app(app_id)
+    app.upload_config("default", {"data": {"values": [1, 2, 3]}, "analysis": {"metrics": ["mean"]}})
+    events = _read_sse(lines)
+    event, status = next(events)
+    assert event == "status"
+    assert status["progress"] == 0
+    
+    app.validate_configs()
+    app.start()
+    for event, status in events:
+        if status["progress"] == 100:
+            break
+    assert status["partial_results"]["mean"] == 2.0
+    
+    app.stop()
+    app_manager.delete_app(app_id)
+    for event, status in events:
+        if event == "deleted":
+            break
+    assert event == "deleted"
+    
+def _check_multiplexed_stream(lines, app_manager, app_ids):
+    """Shared checks for the event stream of all applications"""
+    events = _read_sse(lines)
+    initial = {status["app_id"]: status for _, status in (next(events) for _ in app_ids)}
+    assert set(initial) == set(app_ids)
+    assert all(status["progress"] == 0 for status in initial.values())
+    
+    app = app_manager.get_app(app_ids[1])
+    app.upload_config("default", {"data": {"values": [1, 2, 3]}, "analysis": {"metrics": ["mean"]}})
+    app.validate_configs()
+    app.start()
+    for event, status in events:
+        if status["progress"] == 100:
+            break
+    assert status["app_id"] == app_ids[1]
+    assert status["partial_results"]["mean"] == 2.0
+    
+    app.stop()
+    app_manager.delete_app(app_ids[0])
+    for event, status in events:
+        if event == "deleted":
+            break
+    assert status == {"app_id": app_ids[0]}
+    
+def test_event_bus():
+    """test state changes are published to subscribers"""
+    from app.core.events import EventBus
+    bus = EventBus(maxsize=2)
+    with bus.subscribe("a") as subscription, bus.subscribe() as all_apps:
+        for version in range(3):
+            bus.publish("a", {"version": version})
+        bus.publish("b", {"version": 0})
+        
+        # slow subscribers keep only the latest events
+        assert subscription.get(timeout=1) == {"version": 1}
+        assert subscription.get(timeout=1) == {"version": 2}
+        assert subscription.get(timeout=0.01) is None
+        assert all_apps.get(timeout=1) == {"version": 2}
+        assert all_apps.get(timeout=1) == {"version": 0}
+        
+def test_flask_event_stream(flask_service):
+    """test server-sent status events from flask"""
+    flask_service.sse_keepalive = 0.1
+    app_id = flask_service.app_manager.create_app_instance("data_analyzer")
+    response = flask_service.flask_app.test_client().get(f"/api/apps/{app_id}/events", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    _check_event_stream(response.response, flask_service.app_manager, app_id)
+    response.close()
+    
+@contextmanager
+def _asgi_stream(asgi_app, path):
+    """Drive an endless streaming response over ASGI, yielding its body chunks
+    
+    The test client buffers whole responses, so the request runs on its own
+    event loop in a thread until the block exits and the client disconnects.
+    """
+    import asyncio
+    import queue
+    import threading
+    messages = queue.Queue()
+    disconnected = threading.Event()
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": b"", "root_path": "", "query_string": b"",
+        "headers": [], "server": ("testserver", 80), "client": ("testclient", 50000)
+    }
+    
+    async def receive():
+        while not disconnected.is_set():
+            await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+        
+    async def send(message):
+        messages.put(message)
+        
+    thread = threading.Thread(target=lambda: asyncio.run(asgi_app(scope, receive, send)))
+    thread.start()
+    try:
+        start = messages.get(timeout=10)
+        assert dict(start["headers"])[b"content-type"].startswith(b"text/event-stream")
+        yield iter(lambda: messages.get(timeout=10).get("body", b""), None)
+    finally:
+        disconnected.set()
+        thread.join(timeout=10)
+        
+def test_fastapi_event_stream(fastapi_service):
+    """test server-sent status events from fastapi"""
+    fastapi_service.sse_keepalive = 0.1
+    app_id = fastapi_service.app_manager.create_app_instance("data_analyzer")
+    with _asgi_stream(fastapi_service.fastapi_app, f"/api/apps/{app_id}/events") as chunks:
+        _check_event_stream(chunks, fastapi_service.app_manager, app_id)
+        
+def test_flask_multiplexed_event_stream(flask_service):
+    """test one flask event stream carries the status of every application"""
+    flask_service.sse_keepalive = 0.1
+    app_ids = [flask_service.app_manager.create_app_instance("data_analyzer") for _ in range(2)]
+    response = flask_service.flask_app.test_client().get("/api/events", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    _check_multiplexed_stream(response.response, flask_service.app_manager, app_ids)
+    response.close()
+    
+def test_fastapi_multiplexed_event_stream(fastapi_service):
+    """test one fastapi event stream carries the status of every application"""
+    fastapi_service.sse_keepalive = 0.1
+    app_ids = [fastapi_service.app_manager.create_app_instance("data_analyzer") for _ in range(2)]
+    with _asgi_stream(fastapi_service.fastapi_app, "/api/events") as chunks:
+        _check_multiplexed_stream(chunks, fastapi_service.app_manager, app_ids)
+        
+def _check_app_files(client, app_manager):
+    """Shared checks for the binary file endpoint"""
+    app_id = app_manager.create_app_instance("image_processor")
+    app = app_manager.get_app(app_id)
+    app.upload_config("default", {
+        "input": {"image_base64": create_test_image()},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    })
+    app.start()
+    app.processing_future.result(timeout=10)
+    
+    url = app.get_report()["processed_image_url"]
+    with open(os.path.join(app.output_dir, "final_result.jpg"), "rb") as f:
+        image_data = f.read()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/jpeg"
+    assert _body(response) == image_data
+    
+    # partial content
+    response = client.get(url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert _body(response) == image_data[:10]
+    
+    # intermediate files are served too, but nothing outside the app directory
+    assert client.get(f"/api/apps/{app_id}/files/original.jpg").status_code == 200
+    assert client.get(f"/api/apps/{app_id}/files/missing.jpg").status_code == 404
+    assert client.get(f"/api/apps/{app_id}/files/..%2Fconfig%2Fdefault.json").status_code == 404
+    app.stop()
+    
+def test_flask_app_files(flask_service):
+    """test serving app files from flask"""
+    _check_app_files(flask_service.flask_app.test_client(), flask_service.app_manager)
+    
+def test_fastapi_app_files(fastapi_service, fastapi_client):
+    """test serving app files from fastapi"""
+    _check_app_files(fastapi_client, fastapi_service.app_manager)
+    
+def _check_input_upload(client, app_manager, upload):
+    """Shared checks for binary input uploads referenced from the config"""
+    app_id = app_manager.create_app_instance("image_processor")
+    app = app_manager.get_app(app_id)
+    image_data = base64.b64decode(create_test_image())
+    
+    response = upload(client, f"/api/apps/{app_id}/inputs/photo.jpg", image_data)
+    assert response.status_code == 200
+    assert _json(response)["size"] == len(image_data)
+    assert upload(client, f"/api/apps/{app_id}/inputs/.hidden", image_data).status_code == 400
+    
+    app.upload_config("default", {
+        "input": {"image_file": "photo.jpg"},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    })
+    assert app.validate_configs() is True
+    app.start()
+    app.processing_future.result(timeout=10)
+    assert app.get_status()["progress"] == 100
+    with open(os.path.join(app.intermediate_dir, "original.jpg"), "rb") as f:
+        assert f.read() == image_data
+    app.stop()
+    
+    # a config referencing a missing upload is invalid
+    app.upload_config("default", {
+        "input": {"image_file": "missing.jpg"},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    })
+    assert app.validate_configs() is False
+    
+def test_flask_input_upload(flask_service):
+    """test multipart input upload to flask"""
+    def upload(client, url, data):
+        return client.post(url, data={"file": (BytesIO(data), "photo.jpg")}, content_type="multipart/form-data")
+    _check_input_upload(flask_service.flask_app.test_client(), flask_service.app_manager, upload)
+    
+def test_fastapi_input_upload(fastapi_service, fastapi_client):
+    """test raw body input upload to fastapi"""
+    def upload(client, url, data):
+        return client.put(url, content=data, headers={"Content-Type": "application/octet-stream"})
+    _check_input_upload(fastapi_client, fastapi_service.app_manager, upload)
+    
+def test_fastapi_offloads_blocking_calls(fastapi_service):
+    """test a blocking status call does not stall the fastapi event loop"""
+    import asyncio
+    import threading
+    httpx = pytest.importorskip("httpx")
+    app_id = fastapi_service.app_manager.create_app_instance("data_analyzer")
+    app = fastapi_service.app_manager.get_app(app_id)
+    
+    release = threading.Event()
+    get_status = app.get_status
+    
+    def slow_get_status(preview_version=None):
+        release.wait(5)
+        return get_status(preview_version)
+    app.get_status = slow_get_status
+    
+    async def run():
+        transport = httpx.ASGITransport(app=fastapi_service.fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            slow = asyncio.create_task(client.get(f"/api/apps/{app_id}/status"))
+            await asyncio.sleep(0.1)
+            # other requests are served while the status call blocks a worker thread
+            response = await asyncio.wait_for(client.get("/api/apps/types"), timeout=2)
+            assert response.status_code == 200
+            assert not slow.done()
+            release.set()
+            assert (await slow).status_code == 200
+    asyncio.run(run())
+    
+def test_fastapi_offloads_app_lookups(fastapi_service):
+    """test a blocking registry lookup does not stall the fastapi event loop"""
+    import asyncio
+    import threading
+    httpx = pytest.importorskip("httpx")
+    app_id = fastapi_service.app_manager.create_app_instance("data_analyzer")
+    
+    release = threading.Event()
+    get_app = fastapi_service.app_manager.get_app
+    
+    def slow_get_app(app_id):
+        release.wait(5)
+        return get_app(app_id)
+    fastapi_service.app_manager.get_app = slow_get_app
+    
+    async def run():
+        transport = httpx.ASGITransport(app=fastapi_service.fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            slow = asyncio.create_task(client.get(f"/api/apps/{app_id}/report"))
+            missing = asyncio.create_task(client.get("/api/apps/missing/status"))
+            await asyncio.sleep(0.1)
+            response = await asyncio.wait_for(client.get("/api/apps/types"), timeout=2)
+            assert response.status_code == 200
+            assert not slow.done()
+            release.set()
+            assert (await slow).status_code == 200
+            assert (await missing).status_code == 404
+    asyncio.run(run())
+    
+def test_shared_registry(test_runtime_dir):
+    """test two workers sharing a sqlite registry see each other's applications"""
+    import threading
+    import time
+    from app.core.registry import SQLiteRegistry, RemoteApp
+    
+    registry_path = os.path.join(test_runtime_dir, "registry.sqlite3")
+    workers = []
+    for _ in range(2):
+        manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1, registry=SQLiteRegistry(registry_path))
+        service = FlaskWebService(app_manager=manager)
+        service.app_manager.register_app_type("data_analyzer", DataAnalyzer)
+        workers.append((manager, service.flask_app.test_client()))
+    (manager_a, client_a), (manager_b, client_b) = workers
+    
+    def wait_for(client, app_id, condition):
+        for _ in range(100):
+            status = client.get(f"/api/apps/{app_id}/status").get_json()
+            if condition(status):
+                return status
+            time.sleep(0.05)
+        raise AssertionError(f"timed out waiting for {app_id}: {status}")
+    
+    try:
+        app_id = client_a.post("/api/apps", json={"app_type": "data_analyzer"}).get_json()["app_id"]
+        assert app_id in client_b.get("/api/apps").get_json()["apps"]
+        client_a.post(f"/api/apps/{app_id}/config/default", json={
+            "data": {"values": [1.0, 2.0, 3.0, 4.0, 5.0]},
+            "analysis": {"metrics": ["mean", "median", "histogram"]}
+        })
+        
+        # while the run is queued on worker A, worker B cannot change the application
+        release = threading.Event()
+        manager_a.executor.submit(release.wait, 5)
+        assert client_a.post(f"/api/apps/{app_id}/start").status_code == 200
+        wait_for(client_b, app_id, lambda status: status["is_running"] and status["progress"] < 100)
+        assert client_b.post(f"/api/apps/{app_id}/stop").status_code == 409
+        assert client_b.delete(f"/api/apps/{app_id}").status_code == 409
+        release.set()
+        
+        # worker B serves status, report and files of the run worker A completed
+        status = wait_for(client_b, app_id, lambda status: status["progress"] == 100)
+        assert "plot_url" in status
+        response = client_b.get(f"/api/apps/{app_id}/report")
+        assert response.get_json()["analysis_results"]["median"] == 3.0
+        assert client_b.get(f"/api/apps/{app_id}/report", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+        assert client_b.get(status["plot_url"]).status_code == 200
+        
+        # changing a finished application moves it to the worker handling the request
+        assert client_b.post(f"/api/apps/{app_id}/stop").status_code == 200
+        client_b.post(f"/api/apps/{app_id}/config/default", json={"data": {"values": [1.0]}})
+        assert not isinstance(manager_b.get_app(app_id), RemoteApp)
+        assert isinstance(manager_a.get_app(app_id), RemoteApp)
+        assert manager_b.get_app(app_id).get_config("default") == {"data": {"values": [1.0]}}
+        
+        assert client_a.delete(f"/api/apps/{app_id}").status_code == 200
+        assert manager_b.get_app(app_id) is None
+    finally:
+        manager_a.shutdown()
+        manager_b.shutdown()
+    
+def test_event_stream_from_other_worker(test_runtime_dir):
+    """test an event stream follows an application that another worker runs and deletes"""
+    from app.core.registry import SQLiteRegistry
+    
+    registry_path = os.path.join(test_runtime_dir, "registry.sqlite3")
+    manager_a = AppManager(runtime_dir=test_runtime_dir, registry=SQLiteRegistry(registry_path))
+    manager_a.register_app_type("data_analyzer", DataAnalyzer)
+    service_b = FlaskWebService(app_manager=AppManager(runtime_dir=test_runtime_dir,
+                                                       registry=SQLiteRegistry(registry_path)))
+    service_b.app_manager.register_app_type("data_analyzer", DataAnalyzer)
+    service_b.sse_keepalive = 0.1
+    try:
+        app_id = manager_a.create_app_instance("data_analyzer")
+        response = service_b.flask_app.test_client().get(f"/api/apps/{app_id}/events", buffered=False)
+        _check_event_stream(response.response, manager_a, app_id)
+        response.close()
+    finally:
+        manager_a.shutdown()
+        service_b.app_manager.shutdown()
+    
+def test_restart_recovers_apps(test_runtime_dir):
+    """test a restarted manager serves earlier applications from their manifests"""
+    import json
+    from app.core.registry import RemoteApp
+    
+    manager = AppManager(runtime_dir=test_runtime_dir)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    app_id = manager.create_app_instance("data_analyzer")
+    app = manager.get_app(app_id)
+    app.upload_config("default", {
+        "data": {"values": [1.0, 2.0, 3.0, 4.0, 5.0]},
+        "analysis": {"metrics": ["mean", "median"]}
+    })
+    app.start()
+    app.analysis_future.result(timeout=10)
+    interrupted_id = manager.create_app_instance("data_analyzer")
+    manager.shutdown()
+    
+    # simulate a crash in the middle of a run
+    manifest_path = os.path.join(test_runtime_dir, interrupted_id, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.update({"is_running": True, "busy": True, "progress": 40})
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    
+    manager = AppManager(runtime_dir=test_runtime_dir)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    try:
+        assert manager.apps == {}
+        assert set(manager.get_all_apps()) == {app_id, interrupted_id}
+        
+        # completed reports are served from the manifest without loading the app
+        recovered = manager.get_app(app_id)
+        assert isinstance(recovered, RemoteApp)
+        assert recovered.get_status()["progress"] == 100
+        assert recovered.get_report()["analysis_results"]["median"] == 3.0
+        
+        status = manager.get_app(interrupted_id).get_status()
+        assert status["progress"] == -1
+        assert status["is_running"] is False
+        
+        # changing a recovered application loads it from its configs
+        app = manager.acquire_app(app_id)
+        assert isinstance(app, DataAnalyzer)
+        app.start()
+        app.analysis_future.result(timeout=10)
+        assert app.get_report()["analysis_results"]["mean"] == 3.0
+    finally:
+        manager.shutdown()
+    
+def test_registry_sync_writes(test_runtime_dir):
+    """test progress ticks skip manifest writes and completed reports are built once per run"""
+    import time
+    
+    manager = AppManager(runtime_dir=test_runtime_dir)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    try:
+        app_id = manager.create_app_instance("data_analyzer")
+        app = manager.get_app(app_id)
+        written = []
+        write_manifest = manager._write_manifest
+        manager._write_manifest = lambda app_id, record: (written.append(record["busy"]),
+                                                          write_manifest(app_id, record))
+        reports = []
+        get_report = app.get_report
+        app.get_report = lambda: reports.append(1) or get_report()
+        
+        app.upload_config("default", {
+            "data": {"values": [1.0, 2.0, 3.0, 4.0, 5.0]},
+            "analysis": {"metrics": ["mean", "median", "histogram"]}
+        })
+        app.validate_configs()
+        app.start()
+        app.analysis_future.result(timeout=10)
+        for _ in range(100):
+            if manager.registry.get(app_id)["progress"] == 100:
+                break
+            time.sleep(0.01)
+        manager._sync_app(app_id)
+        manager._sync_app(app_id)
+        
+        # one manifest while the run is in flight at most, then one for its completion
+        assert written.count(True) <= 1
+        assert written[-1] is False
+        assert len(reports) == 1
+        assert manager.registry.get(app_id)["report"]["analysis_results"]["mean"] == 3.0
+        
+        # trimming files changes the report
+        app.remove_intermediate_files()
+        manager._sync_app(app_id)
+        assert len(reports) == 2
+    finally:
+        manager.shutdown()
+    
+def test_restart_removes_orphan_batches(test_runtime_dir):
+    """test batch directories left by a worker that has exited are removed by the next scan"""
+    import json
+    
+    manager = AppManager(runtime_dir=test_runtime_dir)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    config = {"data": {"values": [1.0, 2.0, 3.0]}, "analysis": {"metrics": ["mean"]}}
+    orphan = manager.get_batch(manager.create_batch("data_analyzer", [config]))
+    for item in orphan.items:
+        item.analysis_future.result(timeout=10)
+    live = manager.get_batch(manager.create_batch("data_analyzer", [config], start=False))
+    manager.shutdown()
+    
+    # simulate the exit of the worker that created the first batch
+    manifest_path = os.path.join(orphan.batch_dir, "batch.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest["batch_id"] == orphan.batch_id
+    manifest["owner"] = "999999999-exited"
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    
+    manager = AppManager(runtime_dir=test_runtime_dir)
+    try:
+        assert manager.get_all_apps() == {}
+        assert not os.path.exists(orphan.batch_dir)
+        # a batch of a worker that is still running is left alone
+        assert os.path.isdir(live.batch_dir)
+    finally:
+        manager.shutdown()
+    
+def test_janitor_retention(test_runtime_dir):
+    """test the janitor trims and evicts idle applications and batches using per-app disk accounting"""
+    import threading
+    import time
+    from app.core.janitor import Janitor, RetentionPolicy
+    
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1)
+    manager.register_app_type("data_analyzer", DataAnalyzer)
+    
+    config = {"data": {"values": [1.0, 2.0, 3.0, 4.0, 5.0]}, "analysis": {"metrics": ["mean", "median"]}}
+    
+    def run_app(last_used):
+        app_id = manager.create_app_instance("data_analyzer")
+        app = manager.get_app(app_id)
+        app.upload_config("default", config)
+        app.start()
+        app.analysis_future.result(timeout=10)
+        app.last_used = time.time() - last_used
+        return app_id, app
+        
+    def run_batch(last_used):
+        batch = manager.get_batch(manager.create_batch("data_analyzer", [config, config]))
+        for item in batch.items:
+            item.analysis_future.result(timeout=10)
+            item.last_used = time.time() - last_used
+        return batch
+    
+    def walk_size(app):
+        total = 0
+        for directory in ("config", "input", "intermediate", "output"):
+            for entry in os.scandir(os.path.join(app.app_dir, directory)):
+                total += entry.stat().st_size
+        return total
+    
+    try:
+        old_id, old_app = run_app(200)
+        new_id, new_app = run_app(100)
+        expired_id, _ = run_app(10000)
+        expired_batch = run_batch(10000)
+        batch = run_batch(0)
+        assert old_app.disk_usage == walk_size(old_app)
+        assert old_app.intermediate_usage > 0
+        
+        # an application that has not run yet is not expired
+        unstarted_id = manager.create_app_instance("data_analyzer")
+        manager.get_app(unstarted_id).upload_config("default", config)
+        manager.get_app(unstarted_id).last_used = time.time() - 10000
+        
+        # a run in flight is never touched
+        release = threading.Event()
+        manager.executor.submit(release.wait, 5)
+        busy_id = manager.create_app_instance("data_analyzer")
+        busy_app = manager.get_app(busy_id)
+        busy_app.upload_config("default", {"data": {"values": [1.0]}, "analysis": {"metrics": ["mean"]}})
+        busy_app.start()
+        busy_app.last_used = time.time() - 10000
+        
+        janitor = Janitor(manager, RetentionPolicy(ttl=5000, keep_final_only=True))
+        result = janitor.run_once()
+        assert result["evicted"] == 2
+        assert manager.get_app(expired_id) is None
+        assert manager.get_batch(expired_batch.batch_id) is None
+        assert not os.path.exists(expired_batch.batch_dir)
+        assert manager.get_app(unstarted_id) is not None
+        assert manager.get_app(busy_id) is busy_app
+        assert old_app.intermediate_usage == 0
+        assert os.listdir(old_app.intermediate_dir) == []
+        assert old_app.disk_usage == walk_size(old_app)
+        assert old_app.get_report()["analysis_results"]["mean"] == 3.0
+        
+        # over quota, the least recently used application that has run goes first; batches count too
+        unstarted_batch = manager.get_batch(manager.create_batch("data_analyzer", [config], start=False))
+        unstarted_usage = manager.get_app(unstarted_id).disk_usage + unstarted_batch.disk_usage
+        old_app.last_used, new_app.last_used = time.time() - 200, time.time() - 100
+        janitor.policy = RetentionPolicy(
+            max_bytes=new_app.disk_usage + busy_app.disk_usage + batch.disk_usage + unstarted_usage)
+        result = janitor.run_once()
+        assert result == {"evicted": 1, "trimmed": 0, "freed_bytes": result["freed_bytes"]}
+        assert manager.get_app(old_id) is None
+        assert manager.get_app(new_id) is new_app
+        assert not os.path.exists(os.path.join(test_runtime_dir, old_id))
+        
+        # whatever the quota, applications and batches that have not run yet are kept
+        release.set()
+        busy_app.analysis_future.result(timeout=10)
+        janitor.policy = RetentionPolicy(max_bytes=10)
+        janitor.run_once()
+        assert manager.get_app(new_id) is None
+        assert manager.get_batch(batch.batch_id) is None
+        assert manager.get_app(unstarted_id) is not None
+        assert manager.get_batch(unstarted_batch.batch_id) is unstarted_batch
+    finally:
+        manager.shutdown()
+    
+def test_data_analyzer_binary_storage(flask_service):
+    """test raw data is stored as .npy, read memory-mapped, and accepted as an uploaded file"""
+    manager = flask_service.app_manager
+    app_id = manager.create_app_instance("data_analyzer")
+    app = manager.get_app(app_id)
+    values = np.arange(1000, dtype=np.float64)
+    app.upload_config("default", {"data": {"values": values.tolist()}, "analysis": {"metrics": ["mean", "median"]}})
+    app.start()
+    app.analysis_future.result(timeout=10)
+    
+    # the inline values are released once saved
+    assert "default" not in app.configs
+    raw = np.load(os.path.join(app.intermediate_dir, "raw_data.npy"), mmap_mode="r")
+    assert np.array_equal(raw, values)
+    report = app.get_report()
+    assert report["output_files"]["data"] == "raw_data.npy"
+    assert report["analysis_results"]["median"] == 499.5
+    app.stop()
+    
+    # a second run re-reads the config from disk
+    app.start()
+    app.analysis_future.result(timeout=10)
+    assert app.get_report()["analysis_results"]["mean"] == 499.5
+    app.stop()
+    
+    # an uploaded .npy array is analyzed in place
+    buffer = BytesIO()
+    np.save(buffer, values * 2)
+    buffer.seek(0)
+    app.save_input_file("values.npy", buffer)
+    app.upload_config("default", {"data": {"file": "values.npy"}, "analysis": {"metrics": ["mean", "std"]}})
+    app.start()
+    app.analysis_future.result(timeout=10)
+    report = app.get_report()
+    assert report["analysis_results"]["mean"] == 999.0
+    assert report["output_files"]["data"] == "values.npy"
+    assert report["data_info"]["sample_size"] == 1000
+    app.stop()
+    
+def test_data_analyzer_streaming(flask_service, tmp_path):
+    """test uploaded CSV, binary and NDJSON datasets are analyzed in bounded chunks"""
+    import json
+    from app.core.datasets import iter_chunks
+    from app.core.statistics import RunningStats, StreamingHistogram, ReservoirSample
+    
+    rng = np.random.default_rng(1)
+    values = rng.normal(10, 2, 300_000)
+    
+    # one-pass accumulators agree with numpy
+    stats, histogram, sample = RunningStats(), StreamingHistogram(bins=30), ReservoirSample(size=50_000)
+    for chunk in np.array_split(values.astype(np.float32), 37):
+        stats.update(chunk)
+        histogram.update(chunk)
+        sample.update(chunk)
+    assert stats.count == values.size
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-6)
+    assert stats.std == pytest.approx(values.std(), rel=1e-5)
+    counts, edges = histogram.result()
+    assert counts.sum() == values.size
+    assert edges[0] <= stats.min and edges[-1] >= stats.max
+    assert not sample.exact
+    assert sample.quantile(0.5) == pytest.approx(np.median(values), abs=0.05)
+    
+    # every format yields the same values and reports the bytes consumed
+    path = tmp_path / "values.f32"
+    values[:1000].astype("<f4").tofile(path)
+    chunks = list(iter_chunks(str(path), "f32", chunk_size=1000))
+    assert len(chunks) == 4
+    assert chunks[-1][1] == os.path.getsize(path)
+    assert np.array_equal(np.concatenate([chunk for chunk, _ in chunks]), values[:1000].astype(np.float32))
+    
+    manager = flask_service.app_manager
+    app_id = manager.create_app_instance("data_analyzer")
+    app = manager.get_app(app_id)
+    small = np.round(values[:20_000], 6)
+    csv_data = "id,reading\n" + "".join(f"{i},{v}\n" for i, v in enumerate(small))
+    ndjson_data = "".join(json.dumps({"reading": v}) + "\n" for v in small)
+    inputs = {
+        "readings.csv": (csv_data.encode(), {"column": "reading"}),
+        "readings.ndjson": (ndjson_data.encode(), {"column": "reading"}),
+        "readings.f64": (small.astype("<f8").tobytes(), {})
+    }
+    for filename, (content, options) in inputs.items():
+        app.save_input_file(filename, BytesIO(content))
+        app.upload_config("default", {
+            "data": {"file": filename, "chunk_size": 64 * 1024, **options},
+            "analysis": {"metrics": ["mean", "median", "std", "histogram"]}
+        })
+        app.start()
+        app.analysis_future.result(timeout=30)
+        report = app.get_report()
+        assert report["data_info"]["sample_size"] == small.size
+        assert report["data_info"]["bytes"] == len(content)
+        assert "approximate" not in report["data_info"]
+        assert report["analysis_results"]["mean"] == pytest.approx(small.mean())
+        assert report["analysis_results"]["median"] == pytest.approx(np.median(small))
+        assert report["analysis_results"]["std"] == pytest.approx(small.std())
+        assert "ingest" in report["stage_timings"]
+        assert app.resolve_file("histogram.png") is not None
+        app.stop()
+
+def test_data_analyzer_fused_statistics(flask_service):
+    """test the fused statistics engine matches numpy, including float32 data and new metrics"""
+    from app.core.statistics import describe
+    
+    values = np.random.default_rng(2).normal(5, 3, 100_001).astype(np.float32)
+    metrics = ["mean", "median", "std", "variance", "min", "max", "percentiles", "histogram"]
+    results, (counts, edges), stats = describe(values, metrics, percentiles=[1, 50, 99.5], block_size=4096)
+    assert results["mean"] == pytest.approx(values.mean(dtype=np.float64))
+    assert results["std"] == pytest.approx(values.std(dtype=np.float64))
+    assert results["variance"] == pytest.approx(values.var(dtype=np.float64))
+    assert results["min"] == values.min() and results["max"] == values.max()
+    assert results["median"] == pytest.approx(float(np.median(values)))
+    assert [results["percentiles"][p] for p in ("1", "50", "99.5")] == pytest.approx(
+        np.percentile(values, [1, 50, 99.5]).tolist()
+    )
+    expected_counts, expected_edges = np.histogram(values, bins=30)
+    assert np.array_equal(counts, expected_counts)
+    assert np.allclose(edges, expected_edges)
+    assert stats.count == values.size
+    
+    manager = flask_service.app_manager
+    app_id = manager.create_app_instance("data_analyzer")
+    app = manager.get_app(app_id)
+    app.upload_config("default", {
+        "data": {"values": [1, 2, 3, 4, 5, 6, 7, 8], "dtype": "float32"},
+        "analysis": {"metrics": metrics, "percentiles": [25, 90]}
+    })
+    app.start()
+    app.analysis_future.result(timeout=30)
+    report = app.get_report()
+    assert report["data_info"]["dtype"] == "float32"
+    assert report["analysis_results"]["variance"] == pytest.approx(5.25)
+    assert report["analysis_results"]["min"] == 1.0 and report["analysis_results"]["max"] == 8.0
+    assert report["analysis_results"]["percentiles"] == pytest.approx({"25": 2.75, "90": 7.3})
+    assert "statistics" in report["stage_timings"]
+    assert np.load(app.resolve_file("raw_data.npy")).dtype == np.float32
+    app.stop()
+    
+    app.upload_config("default", {"data": {"values": [1, 2]}, "analysis": {"metrics": ["percentiles"], "percentiles": [101]}})
+    assert not app.validate_configs()
+
+def test_histogram_renderers(flask_service):
+    """test the Figure and direct PNG histogram renderers produce valid images"""
+    from app.core.rendering import HISTOGRAM_RENDERERS, render_histogram
+    
+    counts, edges = np.histogram(np.random.default_rng(3).normal(size=10_000), bins=30)
+    for renderer in HISTOGRAM_RENDERERS:
+        image = Image.open(BytesIO(render_histogram(counts, edges, renderer, "Histogram", "Value", "Frequency")))
+        image.load()
+        assert image.format == "PNG"
+        assert image.width > 0 and image.height > 0
+    pixels = np.asarray(Image.open(BytesIO(render_histogram(counts, edges, "png"))))
+    assert pixels.shape == (480, 800, 3)
+    # the tallest bar reaches the top of the plot area
+    assert (pixels[20] == 0).all(axis=1).any() and (pixels[21, :, 2] == 180).any()
+    
+    manager = flask_service.app_manager
+    app_id = manager.create_app_instance("data_analyzer")
+    app = manager.get_app(app_id)
+    app.upload_config("default", {
+        "data": {"values": [1, 2, 2, 3, 3, 3]},
+        "analysis": {"metrics": ["histogram"], "renderer": "png"}
+    })
+    app.start()
+    app.analysis_future.result(timeout=30)
+    assert Image.open(app.resolve_file("histogram.png")).size == (800, 480)
+    app.stop()
+    
+    app.upload_config("default", {"data": {"values": [1]}, "analysis": {"metrics": ["histogram"], "renderer": "svg"}})
+    assert not app.validate_configs()
+
+def test_lazy_imports(tmp_path):
+    """test startup imports neither the unused framework nor the dependencies of app types"""
+    import subprocess
+    import sys
+    
+    script = (
+        "import sys\n"
+        "from app.main import create_app\n"
+        "heavy = ('PIL', 'numpy', 'matplotlib', 'flask', 'fastapi')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        f"service = create_app('flask', runtime_dir={str(tmp_path)!r})\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        "service.app_manager.create_app_instance('image_processor')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        "service.app_manager.shutdown()\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.splitlines() == ["[]", "['flask']", "['PIL', 'flask']"]
 
+def test_image_enhancement_matches_image_enhance():
+    """test the lookup table enhancements produce exactly the output of the ImageEnhance chain"""
+    from PIL import ImageEnhance
+    from app.core.imaging import enhance
+    
+    rng = np.random.default_rng(4)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (37, 53, 3), dtype=np.uint8), "RGB"),
+        Image.fromarray(rng.integers(0, 256, (37, 53, 4), dtype=np.uint8), "RGBA"),
+        Image.fromarray(rng.integers(0, 256, (37, 53), dtype=np.uint8), "L")
+    ]
+    for image in images:
+        for brightness, contrast, sharpness in [(1.2, 1.1, 1.3), (0.4, 2.5, 0.0), (1.0, 0.7, 1.0), (3.0, 1.0, 2.0)]:
+            expected = ImageEnhance.Brightness(image).enhance(brightness)
+            expected = ImageEnhance.Contrast(expected).enhance(contrast)
+            expected = ImageEnhance.Sharpness(expected).enhance(sharpness)
+            result = enhance(image, brightness, contrast, sharpness)
+            assert result.mode == expected.mode
+            assert result.tobytes() == expected.tobytes()
+
+def test_image_artifact_policies(test_runtime_dir):
+    """test runs keep only the artifacts their policy asks for and report what exists"""
+    from app.core.imaging import adjust_brightness, adjust_contrast
+    
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1, artifact_policy="final-only")
+    try:
+        manager.register_app_type("image_processor", ImageProcessor)
+        app_id = manager.create_app_instance("image_processor")
+        app = manager.get_app(app_id)
+        enhancement = {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+        
+        def run(artifacts=None):
+            config = {"input": {"image_base64": create_test_image()}, "enhancement": enhancement}
+            if artifacts is not None:
+                config["artifacts"] = artifacts
+            app.upload_config("default", config)
+            app.start()
+            app.processing_future.result(timeout=10)
+            report = app.get_report()
+            app.stop()
+            return report
+        
+        # the service default: only the final result, with brightness and contrast as one tone stage
+        report = run()
+        assert report["artifacts"] == "final-only"
+        assert report["output_files"] == {"final_result": "final_result.jpg", "intermediate_files": []}
+        assert set(report["stage_timings"]) == {"decode", "tone", "sharpness", "save_result"}
+        assert os.listdir(app.intermediate_dir) == []
+        
+        report = run("none")
+        assert report["output_files"] == {"final_result": None, "intermediate_files": []}
+        assert "processed_image_url" not in report
+        assert app.resolve_file("final_result.jpg") is None
+        
+        report = run("thumbnails")
+        assert report["output_files"]["intermediate_files"] == [
+            "brightness_adjusted_thumb.jpg", "contrast_adjusted_thumb.jpg", "original_thumb.jpg", "sharpness_adjusted_thumb.jpg"
+        ]
+        assert max(Image.open(app.resolve_file("original_thumb.jpg")).size) <= 200
+        
+        report = run("lossless-on-demand")
+        assert report["output_files"]["intermediate_files"] == ["original.jpg"]
+        assert report["output_files"]["on_demand_files"] == [
+            "brightness_adjusted.png", "contrast_adjusted.png", "sharpness_adjusted.png"
+        ]
+        # rendered losslessly on first request, from the kept original
+        path = app.resolve_file("contrast_adjusted.png")
+        original = Image.open(os.path.join(app.intermediate_dir, "original.jpg"))
+        expected = adjust_contrast(adjust_brightness(original, 1.2), 1.1)
+        assert Image.open(path).tobytes() == expected.tobytes()
+        assert app.file_sizes[os.path.join("intermediate", "contrast_adjusted.png")] == os.path.getsize(path)
+        
+        report = run("all")
+        assert len(report["output_files"]["intermediate_files"]) == 4
+        
+        app.upload_config("default", {"input": {"image_base64": create_test_image()}, "enhancement": enhancement,
+                                      "artifacts": "some"})
+        assert not app.validate_configs()
+        with pytest.raises(ValueError):
+            AppManager(runtime_dir=test_runtime_dir, artifact_policy="some")
+    finally:
+        manager.shutdown()
+
+def test_on_demand_render_changes_report_etag(flask_service):
+    """test rendering an on-demand file invalidates the cached report"""
+    client = flask_service.flask_app.test_client()
+    app_id = flask_service.app_manager.create_app_instance("image_processor")
+    app = flask_service.app_manager.get_app(app_id)
+    app.upload_config("default", {
+        "input": {"image_base64": create_test_image()},
+        "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3},
+        "artifacts": "lossless-on-demand"
+    })
+    app.start()
+    app.processing_future.result(timeout=10)
+    
+    response = client.get(f"/api/apps/{app_id}/report")
+    assert response.get_json()["output_files"]["intermediate_files"] == ["original.jpg"]
+    etag = response.headers["ETag"]
+    assert client.get(f"/api/apps/{app_id}/files/brightness_adjusted.png").status_code == 200
+    
+    response = client.get(f"/api/apps/{app_id}/report", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "brightness_adjusted.png" in response.get_json()["output_files"]["intermediate_files"]
+    app.stop()
+
+def test_write_behind_artifacts(test_runtime_dir):
+    """test files saved through the write-behind queue land atomically before completion and reports"""
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=2, write_behind=True)
+    try:
+        manager.register_app_type("image_processor", ImageProcessor)
+        manager.register_app_type("data_analyzer", DataAnalyzer)
+        image_app = manager.get_app(manager.create_app_instance("image_processor"))
+        image_app.upload_config("default", {
+            "input": {"image_base64": create_test_image()},
+            "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+        })
+        data_app = manager.get_app(manager.create_app_instance("data_analyzer"))
+        data_app.upload_config("default", {
+            "data": {"values": [1, 2, 3, 4, 5]},
+            "analysis": {"metrics": ["mean", "histogram"]}
+        })
+        for app, future in ((image_app, "processing_future"), (data_app, "analysis_future")):
+            app.start()
+            getattr(app, future).result(timeout=30)
+            assert not app._pending_writes or all(f.done() for f in app._pending_writes)
+        
+        report = image_app.get_report()
+        assert len(report["output_files"]["intermediate_files"]) == 4
+        Image.open(image_app.resolve_file("final_result.jpg")).load()
+        assert data_app.get_report()["analysis_results"]["mean"] == 3.0
+        for app in (image_app, data_app):
+            for directory in (app.intermediate_dir, app.output_dir):
+                assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+                for name in os.listdir(directory):
+                    path = os.path.join(directory, name)
+                    assert app.file_sizes[os.path.relpath(path, app.app_dir)] == os.path.getsize(path)
+        assert manager.artifact_writer.stats["written"] >= 7
+        assert manager.artifact_writer.stats["failed"] == 0
+        
+        # a failed write surfaces at the barrier
+        image_app.save_output_file(os.path.join("missing", "result.json"), {"a": 1})
+        with pytest.raises(FileNotFoundError):
+            image_app.flush()
+        image_app.flush()
+    finally:
+        manager.shutdown()
+
+def test_batch_api(test_runtime_dir, flask_service, fastapi_client):
+    """test a batch runs many inputs under one directory tree with aggregated status and report"""
+    import time
+    
+    client = flask_service.flask_app.test_client()
+    image = create_test_image()
+    items = [
+        {"input": {"image_base64": image}, "enhancement": {"brightness": b, "contrast": 1.1, "sharpness": 1.3}}
+        for b in (0.8, 1.0, 1.2)
+    ]
+    
+    # an invalid item rejects the whole batch before anything is created
+    response = client.post("/api/batches", json={"app_type": "image_processor", "items": items + [{"input": {}}]})
+    assert response.status_code == 400
+    assert "[3]" in response.get_json()["error"]
+    assert os.listdir(test_runtime_dir) == []
+    
+    response = client.post("/api/batches", json={"app_type": "image_processor", "items": items})
+    assert response.status_code == 200
+    batch_id = response.get_json()["batch_id"]
+    item_ids = response.get_json()["items"]
+    assert item_ids == [f"{batch_id}.{index}" for index in range(3)]
+    
+    deadline = time.time() + 30
+    while not client.get(f"/api/batches/{batch_id}/status").get_json()["done"]:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    response = client.get(f"/api/batches/{batch_id}/status")
+    status = response.get_json()
+    assert (status["total"], status["completed"], status["failed"], status["progress"]) == (3, 3, 0, 100)
+    assert client.get(f"/api/batches/{batch_id}/status",
+                      headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    
+    report = client.get(f"/api/batches/{batch_id}/report").get_json()
+    assert report["completed"] == 3
+    assert [item["index"] for item in report["items"]] == [0, 1, 2]
+    assert report["items"][2]["report"]["enhancement_params"]["brightness"] == 1.2
+    assert client.get(report["items"][0]["report"]["processed_image_url"]).status_code == 200
+    
+    # items share the batch's directory tree and are not listed or changed as standalone apps
+    assert os.listdir(test_runtime_dir) == [batch_id]
+    assert sorted(os.listdir(os.path.join(test_runtime_dir, batch_id, "items"))) == ["0", "1", "2"]
+    assert client.get("/api/apps").get_json()["apps"] == {}
+    assert client.get(f"/api/apps/{item_ids[0]}/status").get_json()["progress"] == 100
+    assert client.delete(f"/api/apps/{item_ids[0]}").status_code == 409
+    
+    assert client.delete(f"/api/batches/{batch_id}").status_code == 200
+    assert not os.path.exists(os.path.join(test_runtime_dir, batch_id))
+    assert client.get(f"/api/batches/{batch_id}/status").status_code == 404
+    
+    response = fastapi_client.post("/api/batches", json={
+        "app_type": "data_analyzer",
+        "items": [{"data": {"values": values}, "analysis": {"metrics": ["mean"]}} for values in ([1, 2], [3, 5])]
+    })
+    assert response.status_code == 200
+    batch_id = response.json()["batch_id"]
+    deadline = time.time() + 30
+    while not fastapi_client.get(f"/api/batches/{batch_id}/status").json()["done"]:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    report = fastapi_client.get(f"/api/batches/{batch_id}/report").json()
+    assert [item["report"]["analysis_results"]["mean"] for item in report["items"]] == [1.5, 4.0]
+    assert fastapi_client.delete(f"/api/batches/{batch_id}").status_code == 200
+
+def test_result_cache(test_runtime_dir):
+    """test runs with the same inputs and parameters complete from cached results, within a size bound"""
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=2, result_cache_bytes=10 * 1024 * 1024)
+    try:
+        manager.register_app_type("image_processor", ImageProcessor)
+        manager.register_app_type("data_analyzer", DataAnalyzer)
+        
+        def run(app_type, config):
+            app = manager.get_app(manager.create_app_instance(app_type))
+            app.upload_config("default", config)
+            app.start()
+            (app.processing_future if app_type == "image_processor" else app.analysis_future).result(timeout=30)
+            assert app.progress == 100
+            return app
+            
+        image = create_test_image()
+        config = {"input": {"image_base64": image}, "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}}
+        first = run("image_processor", config)
+        second = run("image_processor", config)
+        assert "sharpness" in first.stage_timings
+        assert set(second.stage_timings) == {"cache"}
+        assert manager.get_cache_stats()["hits"] == 1
+        report = second.get_report()
+        assert report["output_files"]["intermediate_files"] == first.get_report()["output_files"]["intermediate_files"]
+        final_results = []
+        for app in (first, second):
+            with open(app.resolve_file("final_result.jpg"), "rb") as f:
+                final_results.append(f.read())
+        assert final_results[0] == final_results[1]
+        assert second.get_status()["preview"] == first.preview
+        
+        # the image is addressed by content, whether inline or uploaded
+        uploaded = manager.get_app(manager.create_app_instance("image_processor"))
+        uploaded.save_input_file("photo.jpg", BytesIO(base64.b64decode(image)))
+        uploaded.upload_config("default", {**config, "input": {"image_file": "photo.jpg"}})
+        uploaded.start()
+        uploaded.processing_future.result(timeout=30)
+        assert set(uploaded.stage_timings) == {"cache"}
+        
+        # a changed parameter misses
+        third = run("image_processor", {**config, "enhancement": {**config["enhancement"], "sharpness": 1.0}})
+        assert "sharpness" in third.stage_timings
+        
+        analysis = {"metrics": ["mean", "median", "histogram"]}
+        data = run("data_analyzer", {"data": {"values": [1, 2, 3, 4]}, "analysis": analysis})
+        cached = run("data_analyzer", {"data": {"values": [1.0, 2.0, 3.0, 4.0]}, "analysis": analysis})
+        assert set(cached.stage_timings) == {"cache"}
+        assert cached.get_report()["analysis_results"] == data.get_report()["analysis_results"]
+        assert cached.resolve_file("histogram.png") is not None
+        
+        # re-running with other values replaces the linked files instead of changing the cached ones
+        data.upload_config("default", {"data": {"values": [5, 6]}, "analysis": analysis})
+        data.stop()
+        data.start()
+        data.analysis_future.result(timeout=30)
+        assert data.get_report()["analysis_results"]["mean"] == 5.5
+        again = run("data_analyzer", {"data": {"values": [1, 2, 3, 4]}, "analysis": analysis})
+        assert again.get_report()["analysis_results"]["mean"] == 2.5
+        assert np.load(os.path.join(again.intermediate_dir, "raw_data.npy")).tolist() == [1, 2, 3, 4]
+        
+        stats = manager.get_cache_stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (4, 4, 4)
+        assert 0 < stats["bytes"] <= stats["max_bytes"]
+        
+        # least recently used runs are evicted to stay within the size bound
+        manager.result_cache.max_bytes = stats["bytes"] - 1
+        run("image_processor", {**config, "enhancement": {**config["enhancement"], "contrast": 1.0}})
+        stats = manager.get_cache_stats()
+        assert stats["evictions"] >= 1 and stats["bytes"] <= stats["max_bytes"]
+        assert run("image_processor", config).stage_timings.keys() != {"cache"}
+    finally:
+        manager.shutdown()
+    assert not os.listdir(os.path.join(test_runtime_dir, ".result-cache"))
+    
+    service = FlaskWebService(runtime_dir=test_runtime_dir)
+    try:
+        assert service.flask_app.test_client().get("/api/cache").get_json() == {"enabled": False}
+    finally:
+        service.app_manager.shutdown()
+
+def test_image_incremental_rerun(flask_service, monkeypatch):
+    """test a re-run only recomputes the stages after the first changed parameter"""
+    from app.apps import image_processor
+    app_manager = flask_service.app_manager
+    image = create_test_image()
+    
+    def run(app, enhancement, artifacts="all"):
+        if app.is_running:
+            app.stop()
+        app.upload_config("default", {"input": {"image_base64": image}, "enhancement": enhancement,
+                                      "artifacts": artifacts})
+        app.start()
+        app.processing_future.result(timeout=30)
+        assert app.progress == 100
+        with open(app.resolve_file("final_result.jpg"), "rb") as f:
+            return set(app.stage_timings), f.read()
+        
+    def inode(app, filename):
+        return os.stat(os.path.join(app.intermediate_dir, filename)).st_ino
+        
+    app = app_manager.get_app(app_manager.create_app_instance("image_processor"))
+    fresh = app_manager.get_app(app_manager.create_app_instance("image_processor"))
+    enhancement = {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}
+    assert run(app, enhancement)[0] == {"decode", "brightness", "contrast", "sharpness", "save_result"}
+    kept = {name: inode(app, name) for name in ("original.jpg", "brightness_adjusted.jpg", "contrast_adjusted.jpg")}
+    
+    # only sharpness changed: the earlier stages and their files are reused
+    enhancement = {**enhancement, "sharpness": 2.0}
+    stages, result = run(app, enhancement)
+    assert stages == {"sharpness", "save_result"}
+    assert {name: inode(app, name) for name in kept} == kept
+    assert result == run(fresh, enhancement)[1]
+    assert len(app.get_report()["output_files"]["intermediate_files"]) == 4
+    
+    enhancement = {**enhancement, "contrast": 0.9}
+    assert run(app, enhancement)[0] == {"contrast", "sharpness", "save_result"}
+    assert run(app, enhancement)[0] == set()
+    
+    # stages whose files were removed are recomputed, and their memoized images are released
+    app.remove_intermediate_files()
+    assert app.stage_outputs == {}
+    assert run(app, enhancement)[0] == {"decode", "brightness", "contrast", "sharpness", "save_result"}
+    
+    # memoized images are bounded in size: only the leading stages that fit are kept
+    monkeypatch.setattr(image_processor, "MEMO_MAX_BYTES", 2.5 * 256 * 256 * 3)
+    app.remove_intermediate_files()
+    run(app, enhancement)
+    assert set(app.stage_outputs) == {"decode", "brightness"}
+    assert run(app, {**enhancement, "sharpness": 1.5})[0] == {"contrast", "sharpness", "save_result"}
+    monkeypatch.undo()
+    
+    # a changed artifact policy starts over; the tone stage is memoized like the others
+    assert run(app, enhancement, "lossless-on-demand")[0] == {"decode", "tone", "sharpness", "save_result"}
+    assert app.resolve_file("contrast_adjusted.png") is not None
+    enhancement = {**enhancement, "brightness": 0.8}
+    stages, result = run(app, enhancement, "lossless-on-demand")
+    assert stages == {"tone", "sharpness", "save_result"}
+    assert result == run(fresh, enhancement, "lossless-on-demand")[1]
+    assert app.get_report()["output_files"]["on_demand_files"] == [
+        "brightness_adjusted.png", "contrast_adjusted.png", "sharpness_adjusted.png"
+    ]
+
+def test_image_memo_budget(test_runtime_dir):
+    """test the memos of idle apps are released least recently used first beyond the manager's budget"""
+    image = create_test_image()
+    memo_bytes = 3 * 256 * 256 * 3
+    manager = AppManager(runtime_dir=test_runtime_dir, max_workers=1, memo_budget_bytes=memo_bytes + 1000)
+    
+    def run(app):
+        if app.is_running:
+            app.stop()
+        app.upload_config("default", {"input": {"image_base64": image},
+                                      "enhancement": {"brightness": 1.2, "contrast": 1.1, "sharpness": 1.3}})
+        app.start()
+        app.processing_future.result(timeout=30)
+        return set(app.stage_timings)
+        
+    try:
+        manager.register_app_type("image_processor", ImageProcessor)
+        first = manager.get_app(manager.create_app_instance("image_processor"))
+        second = manager.get_app(manager.create_app_instance("image_processor"))
+        run(first)
+        assert manager.memo_budget.get_stats()["bytes"] == memo_bytes
+        
+        # the second app's memo does not fit beside the first's, which is released
+        run(second)
+        assert first.stage_outputs == {}
+        assert len(second.stage_outputs) == 4
+        assert manager.memo_budget.get_stats()["releases"] == 1
+        assert run(second) == set()
+        assert run(first) == {"decode", "brightness", "contrast", "sharpness", "save_result"}
+        assert second.stage_outputs == {}
+        
+        # a deleted app's memo no longer counts
+        manager.delete_app(first.app_id)
+        assert manager.memo_budget.get_stats()["bytes"] == 0
+        assert _parse_metrics(manager.metrics.render())["memo_releases_total"] == 2
+    finally:
+        manager.shutdown()
+
+def _parse_metrics(text):
+    """Samples of a text exposition by name and label string"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+    
+def test_metrics_registry():
+    """test histograms count values into cumulative buckets and render in the text exposition format"""
+    from app.core.metrics import MetricsRegistry
+    
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, route='/a"b')
+    registry.counter("events_total", "Events").inc(3)
+    registry.add_collector(lambda: [("depth", "gauge", "Depth", [({"queue": "x"}, 2)])])
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    samples = _parse_metrics(text)
+    assert samples['latency_seconds_bucket{route="/a\\"b",le="0.1"}'] == 2
+    assert samples['latency_seconds_bucket{route="/a\\"b",le="1.0"}'] == 3
+    assert samples['latency_seconds_bucket{route="/a\\"b",le="+Inf"}'] == 4
+    assert samples['latency_seconds_count{route="/a\\"b"}'] == 4
+    assert samples['latency_seconds_sum{route="/a\\"b"}'] == pytest.approx(2.65)
+    assert samples["events_total"] == 3
+    assert samples['depth{queue="x"}'] == 2
+    with pytest.raises(ValueError):
+        registry.counter("events_total", "Events")
+    
+def _check_metrics_endpoint(client, app_manager, route):
+    """Shared checks for the metrics endpoint"""
+    app_id = _json(client.post("/api/apps", json={"app_type": "data_analyzer"}))["app_id"]
+    app = app_manager.get_app(app_id)
+    app.upload_config("default", {"data": {"values": [1, 2, 3]}, "analysis": {"metrics": ["mean", "histogram"]}})
+    client.post(f"/api/apps/{app_id}/start")
+    app.analysis_future.result(timeout=30)
+    for _ in range(3):
+        client.get(f"/api/apps/{app_id}/status")
+    client.get("/api/missing")
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _parse_metrics(_body(response).decode())
+    assert samples[f'http_request_duration_seconds_count{{method="GET",route="{route}",status="200"}}'] == 3
+    assert samples['http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}'] == 1
+    for stage in ("load_data", "statistics", "histogram", "save_results"):
+        assert samples[f'app_stage_duration_seconds_count{{app="DataAnalyzer",stage="{stage}",outcome="ok"}}'] == 1
+        assert samples[f'app_stages_in_progress{{app="DataAnalyzer",stage="{stage}"}}'] == 0
+    written = sum(value for name, value in samples.items() if name.startswith("runtime_write_size_bytes_sum"))
+    assert written == app.disk_usage
+    assert samples['apps_loaded{state="idle"}'] == 1
+    assert samples["executor_queued_work_items"] == 0
+    
+def test_flask_metrics_endpoint(flask_service):
+    """test request, stage and write metrics served by flask"""
+    _check_metrics_endpoint(flask_service.flask_app.test_client(), flask_service.app_manager,
+                            "/api/apps/<app_id>/status")
+    
+def test_fastapi_metrics_endpoint(fastapi_service, fastapi_client):
+    """test request, stage and write metrics served by fastapi"""
+    _check_metrics_endpoint(fastapi_client, fastapi_service.app_manager, "/api/apps/{app_id}/status")